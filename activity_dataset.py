@@ -0,0 +1,203 @@
+"""
+Recorded Reddit activity, for regenerating personas without Reddit.
+
+With ``ACTIVITY_RECORD_PATH`` set, every scrape (``scrape_user_data`` and
+``track_evolution``) appends one JSON line to that file:
+
+    {"username": ..., "scraped_at": ..., "source": ..., "posts": [...], "comments": [...]}
+
+``source`` tells the scrapes apart: ``"scrape"`` for a persona's recent
+items, ``"evolution"`` for ``track_evolution``'s months-long window.
+Later lines for the same user and source supersede earlier ones.
+
+A path ending in ``.gz`` is written as a gzip stream (one member per
+append), which shrinks typical activity about 5x. Appends take an
+exclusive ``flock`` on the file, so several worker processes can share
+one dataset; a member left torn by a killed writer is skipped on read.
+
+``main.py --replay FILE``, ``track_evolution.py --replay FILE`` and
+``replay.py`` (bulk, parallel, resumable) read the activity back instead
+of calling the Reddit API, so a prompt or parser change can be evaluated on
+thousands of users in one batch. Their personas go to a separate store
+(``use_replay_store``), never the production one.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Sequence
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within a process
+    fcntl = None
+
+from env_loader import load_env
+
+load_env()  # the settings below may come from .env
+
+RECORD_PATH = os.getenv("ACTIVITY_RECORD_PATH")
+# Where replayed personas go unless --store says otherwise; by default a
+# ``<dataset>.personas`` directory next to the dataset.
+REPLAY_STORE = os.getenv("REPLAY_STORE")
+
+SCRAPE = "scrape"
+EVOLUTION = "evolution"
+
+_write_lock = threading.Lock()
+_GZIP_MAGIC = b"\x1f\x8b\x08"
+_READ_CHUNK = 1 << 20
+
+
+def record(
+    username: str, posts: List[Dict], comments: List[Dict], path: str | None = None, source: str = SCRAPE
+) -> None:
+    """Append one user's scraped activity to the dataset (``ACTIVITY_RECORD_PATH`` by default)."""
+    path = path or RECORD_PATH
+    if not path:
+        return
+    line = json.dumps(
+        {"username": username, "scraped_at": time.time(), "source": source, "posts": posts, "comments": comments},
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    data = (line + "\n").encode("utf-8")
+    if path.endswith(".gz"):
+        data = gzip.compress(data)  # one complete member per record
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # One locked write per record, so concurrent scrapes (threads or
+    # processes) never interleave lines or gzip members.
+    with _write_lock, open(path, "ab") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)  # released when the file is closed
+        f.write(data)
+
+
+def _gzip_lines(path: str) -> Iterator[str]:
+    """
+    Lines of a multi-member gzip file, decoded one member at a time.
+
+    A torn or corrupt member is dropped and decoding resumes at the next
+    member header, instead of failing (or silently ending) the whole file.
+    A torn member does not always fail to decode: the members appended
+    after it may read as more of its compressed data until the file ends,
+    so an unfinished member at the end is searched for headers as well.
+    """
+    member, raw, text = zlib.decompressobj(wbits=31), b"", b""
+    with open(path, "rb") as f:
+        pending = f.read(_READ_CHUNK)
+        while pending:
+            try:
+                text += member.decompress(pending)
+                raw += pending
+                pending = b""
+            except zlib.error:
+                data = raw + pending
+                start = data.find(_GZIP_MAGIC, 1)
+                while start < 0:
+                    more = f.read(_READ_CHUNK)
+                    if not more:
+                        return
+                    # Keep a short tail: the next header may span two reads.
+                    data = data[-(len(_GZIP_MAGIC) - 1):] + more
+                    start = data.find(_GZIP_MAGIC)
+                member, raw, text, pending = zlib.decompressobj(wbits=31), b"", b"", data[start:]
+                continue
+            if member.eof:
+                # Not splitlines(): it also splits on U+2028 and friends inside strings.
+                yield from text.decode("utf-8", errors="replace").split("\n")
+                pending = member.unused_data
+                member, raw, text = zlib.decompressobj(wbits=31), b"", b""
+            if not pending:
+                pending = f.read(_READ_CHUNK)
+            if not pending and raw:
+                # End of file inside a member: it was torn, and anything
+                # after its first bytes may be later, intact members.
+                start = raw.find(_GZIP_MAGIC, 1)
+                if start >= 0:
+                    member, text, pending = zlib.decompressobj(wbits=31), b"", raw[start:]
+                    raw = b""
+    # Anything left is a member whose writer never finished it.
+
+
+def _lines(path: str) -> Iterator[str]:
+    if path.endswith(".gz"):
+        yield from _gzip_lines(path)
+        return
+    with open(path, encoding="utf-8", errors="replace") as f:
+        yield from f
+
+
+def iter_records(path: str) -> Iterator[Dict]:
+    """Every record in file order (torn lines and gzip members are skipped)."""
+    for line in _lines(path):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            continue
+
+
+def _source(entry: Dict) -> str:
+    # Records from before ``source`` existed were persona scrapes.
+    return entry.get("source", SCRAPE)
+
+
+def _pick(sources_seen: Dict[str, int], sources: Sequence[str]) -> Optional[int]:
+    for source in sources:
+        if source in sources_seen:
+            return sources_seen[source]
+    return None
+
+
+def iter_latest(path: str, sources: Sequence[str] = (SCRAPE,)) -> Iterator[Dict]:
+    """
+    The newest record per user, in file order of those records.
+
+    Only records from ``sources`` count; when a user has several, the first
+    source in ``sources`` wins. Two passes over the file: the first only
+    remembers where each user's last records are, so memory stays flat
+    however large the dataset is.
+    """
+    last: Dict[str, Dict[str, int]] = {}
+    for position, entry in enumerate(iter_records(path)):
+        if _source(entry) in sources:
+            last.setdefault(entry["username"].lower(), {})[_source(entry)] = position
+    chosen = {_pick(seen, sources) for seen in last.values()}
+    for position, entry in enumerate(iter_records(path)):
+        if position in chosen:
+            yield entry
+
+
+def find(path: str, username: str, sources: Sequence[str] = (SCRAPE,)) -> Optional[Dict]:
+    """The user's newest record (``posts``, ``comments``, ``scraped_at``) from ``sources``, or ``None``."""
+    found: Dict[str, Dict] = {}
+    for entry in iter_records(path):
+        if entry["username"].lower() == username.lower() and _source(entry) in sources:
+            found[_source(entry)] = entry
+    for source in sources:
+        if source in found:
+            return found[source]
+    return None
+
+
+def use_replay_store(dataset: str, location: str | None = None) -> str:
+    """
+    Send this process's persona saves to the replay store for ``dataset``.
+
+    ``location`` (a directory or ``s3://`` URL, e.g. from ``--store``), else
+    ``REPLAY_STORE``, else ``<dataset>.personas``. Returns the location.
+    """
+    import artifact_store
+
+    location = location or REPLAY_STORE or f"{dataset}.personas"
+    artifact_store.set_store(artifact_store.open_store(location))
+    return location
@@ -0,0 +1,279 @@
+"""
+Where persona artifacts (.txt, .md, compressed .json) and raw activity live.
+
+``save_persona`` used to drop three files per user into the working
+directory, each JSON carrying a full copy of the scraped posts and comments.
+Artifacts now go through an ``ArtifactStore``:
+
+* ``LocalArtifactStore`` writes under ``PERSONA_STORE_DIR`` (default
+  ``personas/``) with a two-level sharded layout, ``ab/cd/<username>/``,
+  keyed by a hash of the username, so no directory grows past a few hundred
+  entries even with 100k users. Writes go to a temp file in the target
+  directory and are ``os.replace``d into place, so readers never see a
+  partial file.
+* ``S3ArtifactStore`` puts the same keys into a bucket (``PERSONA_STORE_URL=
+  s3://bucket/prefix``; needs the optional ``boto3`` package).
+
+JSON is stored compact and compressed: gzip by default, zstd when
+``PERSONA_STORE_CODEC=zstd`` and the optional ``zstandard`` package is
+installed. Raw activity is stored once under ``raw/`` keyed by the SHA-256
+of its canonical JSON, and personas reference it as ``raw_data_ref``
+(``"sha256:<hex>"``); identical scrapes are never written twice.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from typing import Dict, List, Tuple
+
+from env_loader import load_env
+
+load_env()  # the settings below may come from .env
+
+STORE_DIR = os.getenv("PERSONA_STORE_DIR", "personas")
+STORE_URL = os.getenv("PERSONA_STORE_URL", "")
+CODEC = os.getenv("PERSONA_STORE_CODEC", "gzip")
+
+_EXTENSIONS = {"gzip": ".json.gz", "zstd": ".json.zst"}
+
+
+class ArtifactStore(ABC):
+    """Minimal key/value interface over bytes; keys are ``/``-separated."""
+
+    @abstractmethod
+    def put(self, key: str, data: bytes) -> str:
+        """Store ``data`` under ``key`` and return its location (path or URL)."""
+
+    @abstractmethod
+    def get(self, key: str) -> bytes:
+        """Bytes stored under ``key``."""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """Whether anything is stored under ``key``."""
+
+    @abstractmethod
+    def location(self, key: str) -> str:
+        """Path or URL ``key`` is (or would be) stored at."""
+
+    def local_path(self, key: str) -> str | None:
+        """Filesystem path ``key`` can be written to directly, if any."""
+        return None
+
+
+class LocalArtifactStore(ArtifactStore):
+    """Artifacts as files under ``root``; every write is atomic."""
+
+    def __init__(self, root: str = STORE_DIR):
+        self.root = root
+
+    def location(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def local_path(self, key: str) -> str:
+        path = self.location(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def put(self, key: str, data: bytes) -> str:
+        path = self.local_path(key)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return path
+
+    def get(self, key: str) -> bytes:
+        with open(self.location(key), "rb") as handle:
+            return handle.read()
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self.location(key))
+
+
+class S3ArtifactStore(ArtifactStore):
+    """Artifacts as objects in an S3 (or S3-compatible) bucket."""
+
+    def __init__(self, bucket: str, prefix: str = "", client=None):
+        if client is None:
+            try:
+                import boto3
+            except ImportError as e:
+                raise ImportError("S3ArtifactStore needs the 'boto3' package") from e
+            client = boto3.client("s3", endpoint_url=os.getenv("PERSONA_STORE_ENDPOINT") or None)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def location(self, key: str) -> str:
+        return f"s3://{self.bucket}/{self._key(key)}"
+
+    def put(self, key: str, data: bytes) -> str:
+        # A single PUT is atomic: readers see the old object or the new one.
+        self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+        return self.location(key)
+
+    def get(self, key: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(key))["Body"].read()
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+
+def _split_s3_url(url: str) -> Tuple[str, str]:
+    bucket, _, prefix = url[len("s3://"):].partition("/")
+    return bucket, prefix
+
+
+_store: ArtifactStore | None = None
+
+
+def open_store(location: str) -> ArtifactStore:
+    """The store at ``location``: an ``s3://bucket/prefix`` URL or a local directory."""
+    if location.startswith("s3://"):
+        return S3ArtifactStore(*_split_s3_url(location))
+    return LocalArtifactStore(location)
+
+
+def get_store() -> ArtifactStore:
+    """The process-wide store configured by ``PERSONA_STORE_URL``/``PERSONA_STORE_DIR``."""
+    global _store
+    if _store is None:
+        _store = open_store(STORE_URL or STORE_DIR)
+    return _store
+
+
+def set_store(store: ArtifactStore) -> None:
+    """Send every later save in this process to ``store`` (e.g. a replay run's own store)."""
+    global _store
+    _store = store
+
+
+# --------------------------------------------------------------------------- #
+# Layout
+# --------------------------------------------------------------------------- #
+
+def _shard(name: str) -> str:
+    digest = hashlib.sha256(name.lower().encode("utf-8")).hexdigest()
+    return f"{digest[:2]}/{digest[2:4]}"
+
+
+def persona_key(username: str, filename: str) -> str:
+    """Key of one of ``username``'s persona artifacts, e.g. ``persona.txt``."""
+    return f"{_shard(username)}/{username}/{filename}"
+
+
+def json_extension() -> str:
+    return _EXTENSIONS[_codec()]
+
+
+# --------------------------------------------------------------------------- #
+# Compressed JSON
+# --------------------------------------------------------------------------- #
+
+def _codec() -> str:
+    if CODEC == "zstd":
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            return "gzip"
+        return "zstd"
+    return "gzip"
+
+
+def encode_json(obj) -> bytes:
+    """Compact JSON compressed with the configured codec."""
+    raw = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if _codec() == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=3).compress(raw)
+    return gzip.compress(raw, compresslevel=6)
+
+
+def decode_json(data: bytes, name: str):
+    """Inverse of ``encode_json``; the codec is taken from ``name``'s extension."""
+    if name.endswith(".zst"):
+        import zstandard
+
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif name.endswith(".gz"):
+        data = gzip.decompress(data)
+    return json.loads(data.decode("utf-8"))
+
+
+def put_json(key: str, obj, store: ArtifactStore | None = None) -> str:
+    """Store ``obj`` compressed under ``key`` (which carries the extension)."""
+    return (store or get_store()).put(key, encode_json(obj))
+
+
+def read_location(location: str) -> bytes:
+    """Bytes of an artifact given the location ``put`` returned (path or ``s3://`` URL)."""
+    if location.startswith("s3://"):
+        bucket, key = _split_s3_url(location)
+        return S3ArtifactStore(bucket).get(key)
+    with open(location, "rb") as handle:
+        return handle.read()
+
+
+def load_json(location: str):
+    """
+    Read a JSON artifact from a local path or ``s3://`` URL.
+
+    Plain ``.json`` files (personas written before the store existed) are
+    read as-is.
+    """
+    return decode_json(read_location(location), location)
+
+
+# --------------------------------------------------------------------------- #
+# Content-addressed raw activity
+# --------------------------------------------------------------------------- #
+
+def _raw_key(digest: str) -> str:
+    return f"raw/{digest[:2]}/{digest[2:4]}/{digest}{json_extension()}"
+
+
+def put_raw_activity(
+    posts: List[Dict], comments: List[Dict], store: ArtifactStore | None = None
+) -> str:
+    """Store scraped activity once and return its ``sha256:<hex>`` reference."""
+    store = store or get_store()
+    activity = {"posts": posts, "comments": comments}
+    canonical = json.dumps(activity, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    digest = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    key = _raw_key(digest)
+    if not store.exists(key):
+        store.put(key, encode_json(activity))
+    return f"sha256:{digest}"
+
+
+def load_raw_activity(ref: str, store: ArtifactStore | None = None) -> Dict[str, List[Dict]]:
+    """``{"posts", "comments"}`` for a ``raw_data_ref`` written by ``put_raw_activity``."""
+    store = store or get_store()
+    digest = ref.split(":", 1)[1]
+    for extension in _EXTENSIONS.values():
+        key = f"raw/{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+        if store.exists(key):
+            return decode_json(store.get(key), key)
+    raise KeyError(f"raw activity {ref} not found")
@@ -0,0 +1,167 @@
+"""
+Contention benchmark for the username queue claim.
+
+Runs N workers against a local Postgres, each looping "claim a batch →
+pretend to process → mark processed" until the queue is empty, and reports
+throughput plus how many rows were handed to more than one worker.
+
+    $ DATABASE_URL=postgresql://localhost/redditmindmap \\
+        python -m benchmarks.claim_contention --workers 16 --rows 5000
+
+``--mode naive`` runs the old SELECT-then-UPDATE claim for comparison, and
+``--check-leases`` verifies that rows from a "crashed" worker (claimed but
+never released) are reclaimed once their lease expires.
+
+Requires ``psycopg`` (v3). The schema and RPC functions are loaded from
+``sql/claim_usernames.sql`` into the target database; the
+``reddit_usernames`` table is truncated first, so never point this at a
+production database.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+import psycopg
+
+SQL_PATH = Path(__file__).resolve().parent.parent / "sql" / "claim_usernames.sql"
+
+
+def setup(dsn: str, rows: int) -> None:
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        conn.execute(SQL_PATH.read_text(encoding="utf-8"))
+        conn.execute("truncate reddit_usernames restart identity")
+        with conn.cursor() as cur:
+            cur.executemany(
+                "insert into reddit_usernames (username) values (%s)",
+                [(f"user_{i}",) for i in range(rows)],
+            )
+
+
+def claim_atomic(conn, lock_id: str, batch: int, lease: int) -> list[int]:
+    rows = conn.execute(
+        "select id from claim_reddit_usernames(%s, %s, %s)", (lock_id, batch, lease)
+    ).fetchall()
+    return [r[0] for r in rows]
+
+
+def claim_naive(conn, lock_id: str, batch: int, lease: int) -> list[int]:
+    # What worker.fetch_usernames + lock_user used to do.
+    rows = conn.execute(
+        "select id from reddit_usernames where processed = false and locked = false limit %s",
+        (batch,),
+    ).fetchall()
+    ids = [r[0] for r in rows]
+    for row_id in ids:
+        conn.execute(
+            "update reddit_usernames set locked = true, lock_id = %s where id = %s",
+            (lock_id, row_id),
+        )
+    return ids
+
+
+def run_worker(dsn, claim, batch, lease, work_seconds, claimed: list[int], stats: dict) -> None:
+    lock_id = str(uuid.uuid4())
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        while True:
+            started = time.perf_counter()
+            ids = claim(conn, lock_id, batch, lease)
+            stats["claim_seconds"].append(time.perf_counter() - started)
+            if not ids:
+                return
+            claimed.extend(ids)
+            if work_seconds:
+                time.sleep(work_seconds)
+            conn.execute(
+                "update reddit_usernames set processed = true, locked = false,"
+                " lock_id = null, lease_expires_at = null"
+                " where id = any(%s) and lock_id = %s",
+                (ids, lock_id),
+            )
+
+
+def contention(dsn: str, args) -> None:
+    setup(dsn, args.rows)
+    claim = claim_atomic if args.mode == "atomic" else claim_naive
+    claimed: list[int] = []
+    stats = {"claim_seconds": []}
+    threads = [
+        threading.Thread(
+            target=run_worker,
+            args=(dsn, claim, args.batch, args.lease, args.work, claimed, stats),
+        )
+        for _ in range(args.workers)
+    ]
+
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    counts = Counter(claimed)
+    duplicates = sum(1 for c in counts.values() if c > 1)
+    latencies = sorted(stats["claim_seconds"])
+    p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0.0
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0
+
+    print(f"mode={args.mode} workers={args.workers} batch={args.batch} rows={args.rows}")
+    print(f"  elapsed          : {elapsed:.2f}s")
+    print(f"  rows/sec         : {args.rows / elapsed:,.0f}")
+    print(f"  claim calls      : {len(latencies)} (p50 {p50:.2f} ms, p99 {p99:.2f} ms)")
+    print(f"  rows claimed     : {len(counts)} / {args.rows}")
+    print(f"  double-claimed   : {duplicates}")
+
+
+def check_leases(dsn: str, lease: int = 1) -> None:
+    setup(dsn, 4)
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        crashed = claim_atomic(conn, "crashed-worker", 4, lease)
+        early = claim_atomic(conn, "rescuer", 4, lease)
+        time.sleep(lease + 0.5)
+        renewed = conn.execute(
+            "select renew_reddit_username_leases(%s, %s)", ("nobody", lease)
+        ).fetchone()[0]
+        rescued = claim_atomic(conn, "rescuer", 4, lease)
+
+    print(f"claimed by crashed worker : {sorted(crashed)}")
+    print(f"claimable before expiry   : {sorted(early)}")
+    print(f"claimable after expiry    : {sorted(rescued)}")
+    print(f"renewals for unknown lock : {renewed}")
+    ok = not early and sorted(rescued) == sorted(crashed) and renewed == 0
+    print("lease expiry OK" if ok else "lease expiry FAILED")
+    if not ok:
+        sys.exit(1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=2)
+    parser.add_argument("--lease", type=int, default=600)
+    parser.add_argument("--work", type=float, default=0.0, help="seconds of fake work per batch")
+    parser.add_argument("--mode", choices=("atomic", "naive"), default="atomic")
+    parser.add_argument("--check-leases", action="store_true")
+    args = parser.parse_args()
+
+    if not args.dsn:
+        parser.error("set DATABASE_URL or pass --dsn")
+
+    if args.check_leases:
+        check_leases(args.dsn)
+    else:
+        contention(args.dsn, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+"""
+Local stand-ins for the external services the pipeline talks to.
+
+- ``FakeRedditServer``: an HTTP server speaking enough of the Reddit OAuth
+  API (token endpoint, ``/user/<name>/submitted`` and ``/comments``
+  listings with ``after`` paging and ``X-Ratelimit-*`` headers) for a real
+  ``praw.Reddit`` pointed at it via ``oauth_url``/``reddit_url``.
+- ``StubGeminiModel`` / ``stub_embed_content``: drop-in replacements for
+  ``genai.GenerativeModel`` and ``genai.embed_content``.
+- ``SQLiteQueue`` / ``PostgresQueue``: the username queue with the same
+  lease-based claim as ``sql/claim_usernames.sql``.
+
+Every fake takes a latency (seconds) and an error rate (0..1) so
+concurrency and caching changes can be measured under realistic waits.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import random
+import sqlite3
+import threading
+import time
+import types
+from contextlib import closing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+WORDS = (
+    "python rust keyboard coffee climbing linux game music travel cooking "
+    "startup design data model football guitar movie book science history "
+    "privacy camera garden bike chess anime finance budget career remote"
+).split()
+SUBREDDITS = (
+    "python", "rust", "MechanicalKeyboards", "Coffee", "climbing", "linux",
+    "gaming", "Music", "travel", "Cooking", "startups", "datascience",
+)
+
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + rng.choice(".?!")
+
+
+class FakeReddit:
+    """Deterministic synthetic activity for any username."""
+
+    def __init__(self, items_per_listing: int = 120, seed: int = 0):
+        self.items_per_listing = items_per_listing
+        self.seed = seed
+        self._listings: dict[tuple[str, str], list[dict]] = {}
+        self._lock = threading.Lock()
+
+    def listing(self, username: str, kind: str) -> list[dict]:
+        key = (username.lower(), kind)
+        with self._lock:
+            if key not in self._listings:
+                self._listings[key] = self._generate(username, kind)
+            return self._listings[key]
+
+    def _generate(self, username: str, kind: str) -> list[dict]:
+        rng = random.Random(f"{self.seed}:{username.lower()}:{kind}")
+        now = time.time()
+        created = now - rng.uniform(0, 3600)
+        items = []
+        for i in range(self.items_per_listing):
+            created -= rng.uniform(600, 86400)
+            item_id = f"{kind[0]}{rng.getrandbits(40):x}"
+            subreddit = rng.choice(SUBREDDITS)
+            data = {
+                "id": item_id,
+                "created_utc": round(created),
+                "subreddit": subreddit,
+                "score": int(rng.paretovariate(1.2)),
+                "author": username,
+            }
+            if kind == "submitted":
+                data.update({
+                    "name": f"t3_{item_id}",
+                    "title": _sentence(rng, rng.randint(4, 12)),
+                    "selftext": " ".join(_sentence(rng, rng.randint(6, 20)) for _ in range(rng.randint(0, 6))),
+                    "permalink": f"/r/{subreddit}/comments/{item_id}/",
+                    "num_comments": rng.randint(0, 200),
+                })
+                items.append({"kind": "t3", "data": data})
+            else:
+                data.update({
+                    "name": f"t1_{item_id}",
+                    "body": " ".join(_sentence(rng, rng.randint(4, 25)) for _ in range(rng.randint(1, 4))),
+                    "permalink": f"/r/{subreddit}/comments/x/_/{item_id}/",
+                    "link_id": "t3_x",
+                    "parent_id": "t3_x",
+                })
+                items.append({"kind": "t1", "data": data})
+        return items
+
+    def add_item(self, username: str, kind: str) -> None:
+        """Prepend one brand-new item (for incremental-refresh experiments)."""
+        listing = self.listing(username, kind)
+        template = dict(listing[0]["data"])
+        template["id"] = template["id"] + "n"
+        template["name"] = f"{template['name']}n"
+        template["created_utc"] = round(time.time())
+        listing.insert(0, {"kind": listing[0]["kind"], "data": template})
+
+
+class FakeRedditServer:
+    """
+    Threaded HTTP server for ``praw.Reddit(oauth_url=..., reddit_url=...)``.
+
+    ``pages_served`` counts listing requests; ``ratelimit`` is the budget
+    advertised per client ID through ``X-Ratelimit-*`` headers (it resets
+    every ``ratelimit_window`` seconds) and requests beyond it get a 429.
+    """
+
+    def __init__(
+        self,
+        reddit: FakeReddit | None = None,
+        latency: float = 0.05,
+        error_rate: float = 0.0,
+        ratelimit: int = 1000,
+        ratelimit_window: float = 600.0,
+    ):
+        self.reddit = reddit or FakeReddit()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.ratelimit = ratelimit
+        self.ratelimit_window = ratelimit_window
+        self.pages_served = 0
+        self._used: dict[str, int] = {}
+        self._window_start = time.monotonic()
+        self._lock = threading.Lock()
+        self._rng = random.Random(1)
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def praw_kwargs(self, client_id: str = "bench", client_secret: str = "bench") -> dict:
+        return {
+            "client_id": client_id,
+            "client_secret": client_secret,
+            "user_agent": "persona-generator-benchmark",
+            "oauth_url": self.url,
+            "reddit_url": self.url,
+        }
+
+    def _charge(self, client: str) -> tuple[int, int, float]:
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= self.ratelimit_window:
+                self._window_start = now
+                self._used.clear()
+            used = self._used.get(client, 0) + 1
+            self._used[client] = used
+            reset = self.ratelimit_window - (now - self._window_start)
+            self.pages_served += 1
+            return used, max(0, self.ratelimit - used), reset
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, payload: dict, headers: dict | None = None):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                # The bearer token is the client ID, so listings can be
+                # rate limited per credential.
+                client = "anonymous"
+                auth = self.headers.get("Authorization", "")
+                if auth.startswith("Basic "):
+                    client = base64.b64decode(auth[6:]).decode().split(":", 1)[0]
+                self._send(200, {"access_token": client, "token_type": "bearer", "expires_in": 3600, "scope": "*"})
+
+            def do_GET(self):
+                time.sleep(fake.latency)
+                client = self.headers.get("Authorization", "bearer anonymous").split(" ", 1)[-1]
+                used, remaining, reset = fake._charge(client)
+                headers = {
+                    "x-ratelimit-used": str(used),
+                    "x-ratelimit-remaining": f"{remaining:.1f}",
+                    "x-ratelimit-reset": str(int(reset)),
+                }
+                if used > fake.ratelimit:
+                    self._send(429, {"message": "Too Many Requests"}, headers)
+                    return
+                if fake.error_rate and fake._rng.random() < fake.error_rate:
+                    self._send(503, {"message": "Service Unavailable"}, headers)
+                    return
+
+                url = urlparse(self.path)
+                parts = [p for p in url.path.split("/") if p]
+                if len(parts) < 3 or parts[0] != "user" or parts[2] not in ("submitted", "comments"):
+                    self._send(404, {"message": "Not Found"}, headers)
+                    return
+                query = parse_qs(url.query)
+                limit = min(int(query.get("limit", ["25"])[0]), 100)
+                after = query.get("after", [None])[0]
+
+                items = fake.reddit.listing(parts[1], parts[2])
+                start = 0
+                if after:
+                    names = [item["data"]["name"] for item in items]
+                    start = names.index(after) + 1 if after in names else len(items)
+                page = items[start:start + limit]
+                next_after = page[-1]["data"]["name"] if page and start + limit < len(items) else None
+                self._send(200, {"kind": "Listing", "data": {"after": next_after, "children": page}}, headers)
+
+        return Handler
+
+
+class StubGeminiModel:
+    """Stands in for ``genai.GenerativeModel`` with a fixed latency."""
+
+    def __init__(self, latency: float = 1.0, error_rate: float = 0.0, tokens_per_second: float = 0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.tokens_per_second = tokens_per_second
+        self.calls = 0
+        self._rng = random.Random(2)
+        self._lock = threading.Lock()
+
+    def _check(self, prompt: str) -> None:
+        with self._lock:
+            self.calls += 1
+            failed = self.error_rate and self._rng.random() < self.error_rate
+        time.sleep(self.latency)
+        if failed:
+            raise RuntimeError("503 stub model overloaded")
+
+    def _response_text(self, prompt: str, generation_config) -> str:
+        urls = [line.split("Source:", 1)[1].strip() for line in prompt.splitlines() if "Source:" in line]
+        big_five = {
+            "openness": 0.71, "conscientiousness": 0.52, "extraversion": 0.33,
+            "agreeableness": 0.64, "neuroticism": 0.41,
+        }
+        if generation_config:
+            keys = ("interests", "personality_traits", "tone_of_writing", "humor_or_style", "limitations")
+            sections = [
+                {"key": key, "insights": [
+                    {"text": f"Observation {i} about {key.replace('_', ' ')}.", "source": url}
+                    for i, url in enumerate(urls[j::len(keys)][:3])
+                ]}
+                for j, key in enumerate(keys)
+            ]
+            return json.dumps({"sections": sections, "MBTI": "INTP", "BigFive": big_five})
+        if "psychological frameworks" in prompt:
+            return json.dumps({"MBTI": "INTP", "BigFive": big_five})
+        blocks = []
+        for emoji, title in (("🎯", "Interests"), ("🤔", "Personality Traits"), ("🗣️", "Tone of Writing"),
+                             ("😂", "Humor or Style"), ("🚫", "Limitations")):
+            lines = [f"{emoji} {title}", "-" * 20]
+            for url in urls[:3]:
+                lines.append(f"• Observation about {title.lower()}.")
+                lines.append(f"  Source: {url}")
+            blocks.append("\n".join(lines))
+        return "\n\n".join(blocks)
+
+    def generate_content(self, prompt, generation_config=None, stream: bool = False):
+        self._check(prompt)
+        text = self._response_text(prompt, generation_config)
+        usage = types.SimpleNamespace(
+            prompt_token_count=len(prompt) // 4, candidates_token_count=len(text) // 4
+        )
+        if not stream:
+            return types.SimpleNamespace(text=text, usage_metadata=usage)
+
+        def chunks(size: int = 200):
+            delay = (size / 4) / self.tokens_per_second if self.tokens_per_second else 0.0
+            for start in range(0, len(text), size):
+                time.sleep(delay)
+                yield types.SimpleNamespace(text=text[start:start + size], usage_metadata=usage)
+
+        return chunks()
+
+
+def stub_embed_content(latency: float = 0.1, dimension: int = 768):
+    """Return a replacement for ``genai.embed_content`` producing random unit-ish vectors."""
+
+    def embed_content(model, content, task_type=None, title=None):
+        time.sleep(latency)
+        texts = content if isinstance(content, list) else [content]
+        vectors = []
+        for text in texts:
+            rng = random.Random(text)
+            vectors.append([rng.gauss(0, 1) for _ in range(dimension)])
+        return {"embedding": vectors if isinstance(content, list) else vectors[0]}
+
+    return embed_content
+
+
+class SQLiteQueue:
+    """The username queue with lease-based claims, in a local SQLite file."""
+
+    def __init__(self, path: str | Path, usernames: list[str]):
+        self.path = str(path)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(
+                """
+                drop table if exists reddit_usernames;
+                create table reddit_usernames (
+                    id integer primary key,
+                    username text not null unique,
+                    processed integer not null default 0,
+                    locked integer not null default 0,
+                    lock_id text,
+                    lease_expires_at real
+                );
+                """
+            )
+            conn.executemany("insert into reddit_usernames (username) values (?)", [(u,) for u in usernames])
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def claim(self, lock_id: str, batch_size: int, lease_seconds: int = 600) -> list[dict]:
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("begin immediate")
+            rows = conn.execute(
+                "select id, username from reddit_usernames where processed = 0"
+                " and (locked = 0 or lease_expires_at is null or lease_expires_at < ?)"
+                " order by id limit ?",
+                (now, batch_size),
+            ).fetchall()
+            conn.executemany(
+                "update reddit_usernames set locked = 1, lock_id = ?, lease_expires_at = ? where id = ?",
+                [(lock_id, now + lease_seconds, row_id) for row_id, _ in rows],
+            )
+            conn.execute("commit")
+        return [{"id": row_id, "username": username} for row_id, username in rows]
+
+    def finish(self, user: dict, lock_id: str, processed: bool) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "update reddit_usernames set processed = ?, locked = 0, lock_id = null,"
+                " lease_expires_at = null where id = ? and lock_id = ?",
+                (1 if processed else 0, user["id"], lock_id),
+            )
+
+    def depth(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("select count(*) from reddit_usernames where processed = 0").fetchone()[0]
+
+
+class PostgresQueue:
+    """The real claim RPCs from ``sql/claim_usernames.sql`` on a local Postgres."""
+
+    def __init__(self, dsn: str, usernames: list[str]):
+        import psycopg
+
+        self._psycopg = psycopg
+        self.dsn = dsn
+        sql = (Path(__file__).resolve().parent.parent / "sql" / "claim_usernames.sql").read_text(encoding="utf-8")
+        with psycopg.connect(dsn, autocommit=True) as conn:
+            conn.execute(sql)
+            conn.execute("truncate reddit_usernames restart identity")
+            with conn.cursor() as cur:
+                cur.executemany("insert into reddit_usernames (username) values (%s)", [(u,) for u in usernames])
+
+    def claim(self, lock_id: str, batch_size: int, lease_seconds: int = 600) -> list[dict]:
+        with self._psycopg.connect(self.dsn, autocommit=True) as conn:
+            rows = conn.execute(
+                "select id, username from claim_reddit_usernames(%s, %s, %s)",
+                (lock_id, batch_size, lease_seconds),
+            ).fetchall()
+        return [{"id": row_id, "username": username} for row_id, username in rows]
+
+    def finish(self, user: dict, lock_id: str, processed: bool) -> None:
+        with self._psycopg.connect(self.dsn, autocommit=True) as conn:
+            conn.execute(
+                "update reddit_usernames set processed = %s, locked = false, lock_id = null,"
+                " lease_expires_at = null where id = %s and lock_id = %s",
+                (processed, user["id"], lock_id),
+            )
+
+    def depth(self) -> int:
+        with self._psycopg.connect(self.dsn, autocommit=True) as conn:
+            return conn.execute("select count(*) from reddit_usernames where processed = false").fetchone()[0]
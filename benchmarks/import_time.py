@@ -0,0 +1,120 @@
+"""
+Startup cost of the project's entry-point modules.
+
+Each module is imported in a fresh interpreter under ``python -X importtime``;
+the report shows the best wall time over ``--repeat`` runs (interpreter
+startup included), the module's cumulative import time, and the heaviest
+top-level imports it pulled in.
+
+    $ python -m benchmarks.import_time
+    $ python -m benchmarks.import_time compare_personas main --repeat 10
+
+Runs with dummy credentials in the environment, so a missing ``.env`` does
+not change what gets imported.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_MODULES = (
+    "compare_personas",
+    "main",
+    "track_evolution",
+    "persona_utils",
+    "supabase_utils",
+    "vector_db",
+    "worker",
+)
+
+_DUMMY_ENV = {
+    "REDDIT_CLIENT_ID": "bench",
+    "REDDIT_CLIENT_SECRET": "bench",
+    "GOOGLE_API_KEY": "bench",
+    "SUPABASE_URL": "http://localhost:54321",
+    "SUPABASE_KEY": "bench",
+    "PYTHONWARNINGS": "ignore",
+}
+
+
+def parse_importtime(stderr: str) -> list[tuple[int, int, int, str]]:
+    """``(depth, self_us, cumulative_us, name)`` for each ``-X importtime`` line."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2  # top level is 0
+        rows.append((depth, int(self_us), int(cumulative_us), name.strip()))
+    return rows
+
+
+def measure(module: str, repeat: int) -> dict:
+    env = {**os.environ, **_DUMMY_ENV}
+    code = f"import {module}" if module else "pass"
+    best, stderr = float("inf"), ""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=REPO_ROOT, env=env, capture_output=True, text=True,
+        )
+        elapsed = time.perf_counter() - started
+        if result.returncode != 0:
+            return {"module": module, "error": result.stderr.strip().splitlines()[-1]}
+        if elapsed < best:
+            best, stderr = elapsed, result.stderr
+
+    rows = parse_importtime(stderr)
+    own_index = next((i for i, row in enumerate(rows) if row[0] == 0 and row[3] == module), None)
+    own = rows[own_index] if own_index is not None else None
+    # A module's imports are listed just before it, one level deeper.
+    deps = []
+    for row in reversed(rows[:own_index] if own_index is not None else []):
+        if row[0] == 0:
+            break
+        if row[0] == 1:
+            deps.append(row)
+    deps.sort(key=lambda row: -row[2])
+    return {
+        "module": module,
+        "wall_ms": best * 1000,
+        "import_ms": own[2] / 1000 if own else 0.0,
+        "heaviest": [(name, cumulative / 1000) for _, _, cumulative, name in deps[:5]],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure import/startup time of entry-point modules.")
+    parser.add_argument("modules", nargs="*", default=list(DEFAULT_MODULES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    baseline = measure("", args.repeat)
+    print(f"Bare interpreter: {baseline['wall_ms']:.0f} ms\n")
+    print(f"{'module':<20}{'wall ms':>10}{'import ms':>11}  heaviest imports (cumulative ms)")
+    results = []
+    for module in args.modules:
+        row = measure(module, args.repeat)
+        results.append(row)
+        if "error" in row:
+            print(f"{module:<20}  failed: {row['error']}")
+            continue
+        heaviest = ", ".join(f"{name} {ms:.0f}" for name, ms in row["heaviest"])
+        print(f"{module:<20}{row['wall_ms']:>10.0f}{row['import_ms']:>11.0f}  {heaviest}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"baseline": baseline, "modules": results}, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+End-to-end throughput benchmark for the persona pipeline.
+
+Runs the same stages as ``worker.process_user`` (scrape → generate →
+frameworks → save → GitHub → vector push) for a queue of synthetic users,
+entirely against local stand-ins from ``benchmarks/fakes.py``: a fake
+Reddit API server that real PRAW talks to, a stub Gemini model, a SQLite
+(or Postgres) queue with lease claims, a local bare Git repository for the
+batched GitHub commits, and the in-memory vector index.
+
+    $ python -m benchmarks.pipeline --users 200 --concurrency 16 \\
+        --reddit-latency 0.2 --llm-latency 2 --llm-error-rate 0.02
+
+Reddit requests go through ``reddit_scheduler``; ``--reddit-credentials``,
+``--ratelimit`` and ``--ratelimit-window`` size the credential pool and the
+per-credential budget the fake server enforces.
+
+Reports users/sec, p50/p99 latency per stage and peak memory. Use
+``--rounds 2`` to re-run the same users with warm caches, and
+``--legacy`` to measure the two-call (text + frameworks) persona path.
+All files are written to a temporary directory.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+from benchmarks import fakes
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class StageTimer:
+    """Collects wall-clock durations per stage from many threads."""
+
+    def __init__(self):
+        self.durations: dict[str, list[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def __call__(self, stage: str, fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.durations[stage].append(elapsed)
+
+
+def configure_environment(workdir: Path, args) -> None:
+    """Point every cache and backend at the temp dir before the modules load."""
+    os.environ.update({
+        "SCRAPE_CACHE_PATH": str(workdir / "scrape_cache.sqlite3"),
+        "LLM_CACHE_PATH": str(workdir / "llm_cache.sqlite3"),
+        "EVOLUTION_CACHE_DIR": str(workdir / "evolution"),
+        "PERSONA_STORE_DIR": str(workdir / "personas"),
+        "GITHUB_REPO": str(workdir / "publish.git"),
+        "VECTOR_BACKEND": "memory",
+        "COLLECTION_NAME": "benchmark",
+        "PERSONA_STRUCTURED": "0" if args.legacy else "1",
+        "REDDIT_CLIENT_ID": "bench",
+        "REDDIT_CLIENT_SECRET": "bench",
+    })
+    if args.no_cache:
+        os.environ["SCRAPE_CACHE_DISABLED"] = "1"
+        os.environ["LLM_CACHE_DISABLED"] = "1"
+    if str(REPO_ROOT) not in sys.path:
+        sys.path.insert(0, str(REPO_ROOT))
+
+
+def install_fakes(server: fakes.FakeRedditServer, model: fakes.StubGeminiModel, args):
+    import clients
+    from reddit_scheduler import Credential, RedditScheduler
+
+    # The fake rate limits per client ID, so each credential has its own budget.
+    pool = [Credential(f"bench{i}", "bench") for i in range(args.reddit_credentials)]
+    scheduler = RedditScheduler(pool, oauth_url=server.url, reddit_url=server.url, user_agent="persona-generator-benchmark")
+    clients.set_client("reddit_scheduler", scheduler)
+    clients.set_client("gemini", model)
+    clients.set_client("genai", types.SimpleNamespace(embed_content=fakes.stub_embed_content(args.embed_latency)))
+
+
+def process_user(username: str, timer: StageTimer, legacy: bool, limit: int) -> None:
+    import github_utils
+    import persona_utils
+    import vector_db
+
+    posts, comments = timer("scrape", persona_utils.scrape_user_data, username, limit)
+    if legacy:
+        persona = timer("generate", persona_utils.generate_persona, posts, comments)
+        frameworks = timer("frameworks", persona_utils.map_to_frameworks, persona)
+    else:
+        persona, frameworks = timer("generate", persona_utils.build_persona, posts, comments)
+    files = timer("save", persona_utils.save_persona, username, persona, posts, comments, frameworks=frameworks)
+    timer("github", github_utils.push_to_github, files, username, os.environ["GITHUB_REPO"], None)
+    metadata = vector_db.persona_payload(frameworks, posts, comments)
+    timer("push", vector_db.push_to_vector_db, username, persona, metadata)
+
+
+def run_round(queue, args, timer: StageTimer) -> dict:
+    attempts: dict[str, int] = defaultdict(int)
+    outcome = {"processed": 0, "failed": 0, "errors": defaultdict(int)}
+    lock = threading.Lock()
+
+    def worker():
+        lock_id = str(uuid.uuid4())
+        while True:
+            users = queue.claim(lock_id, 1, args.lease)
+            if not users:
+                return
+            user = users[0]
+            try:
+                process_user(user["username"], timer, args.legacy, args.limit)
+                queue.finish(user, lock_id, processed=True)
+                with lock:
+                    outcome["processed"] += 1
+            except Exception as e:
+                with lock:
+                    attempts[user["username"]] += 1
+                    gave_up = attempts[user["username"]] >= args.max_attempts
+                    outcome["errors"][type(e).__name__] += 1
+                    if gave_up:
+                        outcome["failed"] += 1
+                # After max_attempts, mark it done so the round terminates.
+                queue.finish(user, lock_id, processed=gave_up)
+
+    import github_utils
+    import vector_db
+
+    committer = github_utils.get_committer(os.environ["GITHUB_REPO"], None)
+    commits_before = committer.commits
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    timer("flush", vector_db.get_writer().flush)
+    timer("git_flush", committer.flush)
+    outcome["commits"] = committer.commits - commits_before
+    outcome["elapsed"] = time.perf_counter() - started
+    return outcome
+
+
+def report(round_no: int, outcome: dict, timer: StageTimer, server, model, args) -> dict:
+    import clients
+
+    elapsed = outcome["elapsed"]
+    stages = {
+        stage: {
+            "count": len(values),
+            "p50_ms": percentile(values, 50) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "mean_ms": sum(values) / len(values) * 1000 if values else 0.0,
+        }
+        for stage, values in timer.durations.items()
+    }
+    result = {
+        "round": round_no,
+        "users": args.users,
+        "processed": outcome["processed"],
+        "failed": outcome["failed"],
+        "errors": dict(outcome["errors"]),
+        "elapsed_s": elapsed,
+        "users_per_s": outcome["processed"] / elapsed if elapsed else 0.0,
+        "reddit_pages": server.pages_served,
+        "llm_calls": model.calls,
+        "git_commits": outcome["commits"],
+        "reddit_scheduler": clients.get_reddit_scheduler().stats(),
+        "stages": stages,
+    }
+
+    print(f"\nRound {round_no}: {outcome['processed']}/{args.users} users in {elapsed:.2f}s "
+          f"→ {result['users_per_s']:.2f} users/s (failed {outcome['failed']}, errors {dict(outcome['errors'])})")
+    print(f"  Reddit pages: {server.pages_served}   LLM calls: {model.calls}   Git commits: {outcome['commits']}")
+    queueing = result["reddit_scheduler"]
+    print(f"  Reddit queueing over {len(queueing['credentials'])} credential(s): {queueing['requests']} requests, "
+          f"wait mean {queueing['wait_mean_s'] * 1000:.0f} ms  p50 {queueing['wait_p50_s'] * 1000:.0f} ms  "
+          f"p99 {queueing['wait_p99_s'] * 1000:.0f} ms  max {queueing['wait_max_s'] * 1000:.0f} ms")
+    print(f"  {'stage':<12}{'count':>7}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+    for stage, row in stages.items():
+        print(f"  {stage:<12}{row['count']:>7}{row['p50_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['mean_ms']:>10.1f}")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="End-to-end persona pipeline benchmark on local fakes.")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=1, help="re-run the same users (warm caches)")
+    parser.add_argument("--limit", type=int, default=30, help="posts/comments scraped per user")
+    parser.add_argument("--items", type=int, default=120, help="items per fake Reddit listing")
+    parser.add_argument("--reddit-latency", type=float, default=0.1)
+    parser.add_argument("--reddit-error-rate", type=float, default=0.0)
+    parser.add_argument("--reddit-credentials", type=int, default=1, help="size of the Reddit credential pool")
+    parser.add_argument("--ratelimit", type=int, default=1000, help="fake Reddit requests per window per credential")
+    parser.add_argument("--ratelimit-window", type=float, default=600.0, help="fake Reddit rate-limit window (s)")
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--embed-latency", type=float, default=0.1)
+    parser.add_argument("--legacy", action="store_true", help="free-text persona + separate frameworks call")
+    parser.add_argument("--no-cache", action="store_true", help="disable scrape and LLM caches")
+    parser.add_argument("--queue", choices=("sqlite", "postgres"), default="sqlite")
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"), help="Postgres DSN for --queue postgres")
+    parser.add_argument("--lease", type=int, default=600)
+    parser.add_argument("--max-attempts", type=int, default=2)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    json_path = Path(args.json).resolve() if args.json else None
+    workdir = Path(tempfile.mkdtemp(prefix="redditmindmap-bench-"))
+    configure_environment(workdir, args)
+    os.chdir(workdir)  # keep any stray relative paths inside the temp dir
+
+    reddit = fakes.FakeReddit(items_per_listing=args.items)
+    model = fakes.StubGeminiModel(latency=args.llm_latency, error_rate=args.llm_error_rate)
+    usernames = [f"bench_user_{i}" for i in range(args.users)]
+
+    tracemalloc.start()
+    results = []
+    with fakes.FakeRedditServer(
+        reddit,
+        latency=args.reddit_latency,
+        error_rate=args.reddit_error_rate,
+        ratelimit=args.ratelimit,
+        ratelimit_window=args.ratelimit_window,
+    ) as server:
+        install_fakes(server, model, args)
+        print(f"Benchmark dir: {workdir}")
+        for round_no in range(1, args.rounds + 1):
+            if args.queue == "postgres":
+                if not args.dsn:
+                    parser.error("--queue postgres needs --dsn or DATABASE_URL")
+                queue = fakes.PostgresQueue(args.dsn, usernames)
+            else:
+                queue = fakes.SQLiteQueue(workdir / "queue.sqlite3", usernames)
+            timer = StageTimer()
+            server.pages_served, model.calls = 0, 0
+            with contextlib.redirect_stdout(io.StringIO()):
+                outcome = run_round(queue, args, timer)
+            results.append(report(round_no, outcome, timer, server, model, args))
+
+    _, peak = tracemalloc.get_traced_memory()
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\nPeak traced Python memory: {peak / 1024 / 1024:.1f} MiB   max RSS: {max_rss_mb:.1f} MiB")
+
+    if json_path:
+        summary = {"args": vars(args), "rounds": results, "peak_traced_mib": peak / 1024 / 1024, "max_rss_mib": max_rss_mb}
+        json_path.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
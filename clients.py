@@ -0,0 +1,114 @@
+"""
+Shared, lazily built API clients.
+
+Nothing here imports an SDK or opens a connection until a client is first
+requested, so modules that only read files (``compare_personas``, the
+parser, the artifact store) start without paying for Gemini, PRAW,
+Supabase or Qdrant. Each factory builds its client once per process and
+returns the same instance afterwards; missing credentials only fail the
+call that actually needs them. Settings are read when a client is built,
+after ``load_env()``, so values that only live in ``.env`` apply too.
+
+Tests and benchmarks inject stand-ins with ``set_client``:
+
+    clients.set_client("reddit_scheduler", RedditScheduler(pool, oauth_url=server.url, reddit_url=server.url))
+    clients.set_client("gemini", StubGeminiModel())
+"""
+
+import os
+import threading
+
+from env_loader import load_env
+
+DEFAULT_GEMINI_MODEL = "models/gemini-1.5-flash"
+
+_clients = {}
+_lock = threading.RLock()
+
+
+def _get(name: str, factory):
+    with _lock:
+        if name not in _clients:
+            load_env()
+            _clients[name] = factory()
+        return _clients[name]
+
+
+def set_client(name: str, client) -> None:
+    """Use ``client`` for ``name`` ("genai", "gemini", "reddit", "reddit_scheduler", "supabase", "qdrant")."""
+    with _lock:
+        _clients[name] = client
+
+
+def reset() -> None:
+    """Forget every built or injected client."""
+    with _lock:
+        _clients.clear()
+
+
+def _build_genai():
+    import google.generativeai as genai
+
+    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+    return genai
+
+
+def get_genai():
+    """The ``google.generativeai`` module, configured with ``GOOGLE_API_KEY``."""
+    return _get("genai", _build_genai)
+
+
+def gemini_model_name() -> str:
+    """``GEMINI_MODEL`` from the environment or ``.env``."""
+    load_env()
+    return os.getenv("GEMINI_MODEL", DEFAULT_GEMINI_MODEL)
+
+
+def get_gemini_model():
+    """The ``GenerativeModel`` used for persona generation (``GEMINI_MODEL``)."""
+    return _get("gemini", lambda: get_genai().GenerativeModel(gemini_model_name()))
+
+
+def _build_reddit():
+    import praw
+
+    return praw.Reddit(
+        client_id=os.getenv("REDDIT_CLIENT_ID"),
+        client_secret=os.getenv("REDDIT_CLIENT_SECRET"),
+        user_agent="persona-generator-script",
+    )
+
+
+def get_reddit():
+    return _get("reddit", _build_reddit)
+
+
+def _build_reddit_scheduler():
+    from reddit_scheduler import RedditScheduler
+
+    return RedditScheduler()
+
+
+def get_reddit_scheduler():
+    """Credential pool used for scraping (``REDDIT_CREDENTIALS``; see ``reddit_scheduler``)."""
+    return _get("reddit_scheduler", _build_reddit_scheduler)
+
+
+def _build_supabase():
+    from supabase import create_client
+
+    return create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+
+
+def get_supabase():
+    return _get("supabase", _build_supabase)
+
+
+def _build_qdrant():
+    from qdrant_client import QdrantClient
+
+    return QdrantClient(host=os.getenv("QDRANT_HOST", "localhost"), port=int(os.getenv("QDRANT_PORT", "6333")))
+
+
+def get_qdrant():
+    return _get("qdrant", _build_qdrant)
@@ -1,15 +1,41 @@
-import json
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from artifact_store import load_json
+from persona_parser import BIG_FIVE_TRAITS, PERSONA_SECTIONS
+
+SECTION_KEYS = [key for key, _, _ in PERSONA_SECTIONS]
+# MBTI letter pairs; each position becomes one 0/1 column.
+MBTI_AXES = ("EI", "SN", "TF", "JP")
+# Rows per block in bulk mode: a block's distances to every persona are
+# BLOCK_ROWS x N float32, so memory stays flat however many personas there are.
+BLOCK_ROWS = 1024
+
 def load_persona(path: str) -> dict:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    """Load a persona JSON: plain ``.json``, or compressed ``.json.gz``/``.json.zst``."""
+    return load_json(path)
+
+def resolve_persona_path(path_or_username: str) -> str:
+    """A file path as-is, or the saved JSON of an indexed username."""
+    if Path(path_or_username).is_file():
+        return path_or_username
+    from persona_index import INDEX_PATH, PersonaIndex
+
+    if Path(INDEX_PATH).is_file():
+        row = PersonaIndex(INDEX_PATH).get(path_or_username)
+        if row and row["location"]:
+            return row["location"]
+    return path_or_username
+
+def section(persona: dict, key: str) -> dict:
+    """A persona section; sections live under ``"persona"`` in saved JSON."""
+    return persona.get("persona", persona).get(key, {})
 
 def compare_big_five(a: dict, b: dict) -> dict:
-    keys = ["openness", "conscientiousness", "extraversion", "agreeableness", "neuroticism"]
     diffs = {}
-    for k in keys:
+    for k in BIG_FIVE_TRAITS:
         diffs[k] = round(abs(a.get(k, 0) - b.get(k, 0)), 2)
     return diffs
 
@@ -31,8 +57,8 @@ def print_comparison(persona_a, persona_b, name_a, name_b):
     print("\n🎯 Section Confidence Comparison")
     keys = ["interests", "personality_traits", "tone_of_writing", "goals_and_needs"]
     for key in keys:
-        conf_a = persona_a.get(key, {}).get("confidence", 0)
-        conf_b = persona_b.get(key, {}).get("confidence", 0)
+        conf_a = section(persona_a, key).get("confidence", 0)
+        conf_b = section(persona_b, key).get("confidence", 0)
         print(f"  {key.replace('_', ' ').title():<25}: {name_a}: {conf_a:.2f} | {name_b}: {conf_b:.2f}")
     print("\n📄 Full Persona Text Comparison")
     export_comparison_to_md(persona_a, persona_b, name_a, name_b, keys)
@@ -41,10 +67,10 @@ def print_comparison(persona_a, persona_b, name_a, name_b):
     # for key in keys:
     #     print(f"\n🔹 {key.replace('_', ' ').title()}")
     #     print(f"{name_a}:")
-    #     print(persona_a.get(key, {}).get("value", "[No data]").strip())
+    #     print(section(persona_a, key).get("value", "[No data]").strip())
     #     print()
     #     print(f"{name_b}:")
-    #     print(persona_b.get(key, {}).get("value", "[No data]").strip())
+    #     print(section(persona_b, key).get("value", "[No data]").strip())
     #     print("-" * 50)
 
 def export_comparison_to_md(persona_a, persona_b, name_a, name_b, keys):
@@ -65,20 +91,249 @@ def export_comparison_to_md(persona_a, persona_b, name_a, name_b, keys):
 
         f.write("\n## Section Confidence Comparison\n")
         for key in keys:
-            conf_a = persona_a.get(key, {}).get("confidence", 0)
-            conf_b = persona_b.get(key, {}).get("confidence", 0)
+            conf_a = section(persona_a, key).get("confidence", 0)
+            conf_b = section(persona_b, key).get("confidence", 0)
             f.write(f"- **{key.replace('_', ' ').title()}**: {name_a}: {conf_a:.2f}, {name_b}: {conf_b:.2f}\n")
 
         f.write("\n## Full Persona Text Comparison\n")
         for key in keys:
             f.write(f"\n### {key.replace('_', ' ').title()}\n")
-            f.write(f"**{name_a}:**\n\n{persona_a.get(key, {}).get('value', '').strip()}\n\n")
-            f.write(f"**{name_b}:**\n\n{persona_b.get(key, {}).get('value', '').strip()}\n\n")
+            f.write(f"**{name_a}:**\n\n{section(persona_a, key).get('value', '').strip()}\n\n")
+            f.write(f"**{name_b}:**\n\n{section(persona_b, key).get('value', '').strip()}\n\n")
 
     print(f"\n📝 Comparison saved to `{filename}`")
 
 
+# --------------------------------------------------------------------------- #
+# Bulk mode: every persona in a directory at once
+# --------------------------------------------------------------------------- #
+
+def find_persona_files(directory: str) -> list[Path]:
+    """Persona JSON files under ``directory`` (any depth), skipping the raw activity store."""
+    files = []
+    for parent, dirs, names in os.walk(directory):
+        if parent == directory and "raw" in dirs:
+            dirs.remove("raw")
+        files.extend(Path(parent, name) for name in names if name.endswith((".json", ".json.gz", ".json.zst")))
+    return sorted(files)
+
+def load_personas(paths: list[Path]) -> list[dict]:
+    # Reading and decompressing is I/O and zlib, both of which release the GIL.
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        loaded = list(pool.map(lambda path: load_persona(str(path)), paths))
+    # Monthly snapshots (track_evolution) would pair each user with themselves.
+    return [persona for persona in loaded if "personality_frameworks" in persona and not persona.get("snapshot")]
+
+def persona_matrices(personas: list[dict]) -> dict:
+    """
+    Stack loaded persona JSON into the columns ``persona_index.load_columns`` returns.
+
+    ``big_five`` (N x 5) and ``confidence`` (N x 9) are float32; missing
+    values are 0, as in pair mode.
+    """
+    import numpy as np
+
+    n = len(personas)
+    big_five = np.zeros((n, len(BIG_FIVE_TRAITS)), dtype=np.float32)
+    confidence = np.zeros((n, len(SECTION_KEYS)), dtype=np.float32)
+    for row, persona in enumerate(personas):
+        traits = (persona.get("personality_frameworks") or {}).get("BigFive") or {}
+        big_five[row] = [float(traits.get(key) or 0) for key in BIG_FIVE_TRAITS]
+        confidence[row] = [float(section(persona, key).get("confidence", 0)) for key in SECTION_KEYS]
+    return {
+        "usernames": [persona.get("username", f"#{row}") for row, persona in enumerate(personas)],
+        "mbti": [(persona.get("personality_frameworks") or {}).get("MBTI") or "Unknown" for persona in personas],
+        "big_five": big_five,
+        "confidence": confidence,
+    }
+
+def mbti_matrix(types: list[str]):
+    """N x 4 0/1 letter matrix for MBTI strings, and a mask of the valid ones."""
+    import numpy as np
+
+    mbti = np.zeros((len(types), len(MBTI_AXES)), dtype=np.float32)
+    known = np.zeros(len(types), dtype=bool)
+    for row, letters in enumerate(types):
+        letters = str(letters or "").upper()
+        if len(letters) == 4 and all(letter in axis for letter, axis in zip(letters, MBTI_AXES)):
+            mbti[row] = [axis.index(letter) for letter, axis in zip(letters, MBTI_AXES)]
+            known[row] = True
+    return mbti, known
+
+def _pairwise_distances(block, everyone, everyone_sq):
+    """Euclidean distances between every row of ``block`` and of ``everyone``."""
+    import numpy as np
+
+    block_sq = np.einsum("ij,ij->i", block, block)
+    squared = block_sq[:, None] + everyone_sq[None, :] - 2.0 * (block @ everyone.T)
+    return np.sqrt(np.maximum(squared, 0.0, out=squared), out=squared)
+
+def _mean_abs_pair_diff(column) -> float:
+    """Mean |x_i - x_j| over all pairs i < j, in O(N log N) via the sorted column."""
+    import numpy as np
+
+    n = len(column)
+    if n < 2:
+        return 0.0
+    ordered = np.sort(column.astype(np.float64))
+    weights = 2 * np.arange(n) - n + 1
+    return float(ordered @ weights) / (n * (n - 1) / 2)
+
+def bulk_compare(columns: dict, top_k: int = 5, block_rows: int = BLOCK_ROWS) -> dict:
+    """
+    Compare every persona with every other one in vectorized blocks.
+
+    ``columns`` comes from ``persona_matrices`` (loaded JSON) or
+    ``persona_index.PersonaIndex.load_columns`` (the summary index).
+
+    Big Five and section-confidence distances are Euclidean; MBTI agreement
+    counts matching letters (personas without a valid type are left out).
+    Only aggregates and each persona's ``top_k`` nearest neighbours by Big
+    Five distance are kept, never the full N x N matrices.
+    """
+    import numpy as np
+
+    big_five, confidence = columns["big_five"], columns["confidence"]
+    mbti, mbti_known = mbti_matrix(columns["mbti"])
+    n = len(big_five)
+    k = max(0, min(top_k, n - 1))
+    big_five_sq = np.einsum("ij,ij->i", big_five, big_five)
+    confidence_sq = np.einsum("ij,ij->i", confidence, confidence)
+    known = np.flatnonzero(mbti_known)
+    mbti_zeros = 1 - mbti
+
+    neighbours = np.zeros((n, k), dtype=np.int64)
+    neighbour_big_five = np.zeros((n, k), dtype=np.float32)
+    neighbour_confidence = np.zeros((n, k), dtype=np.float32)
+    neighbour_letters = np.full((n, k), -1, dtype=np.int8)
+    big_five_sum = confidence_sum = 0.0
+    letters_histogram = np.zeros(len(MBTI_AXES) + 1, dtype=np.int64)
+
+    for start in range(0, n, block_rows):
+        rows = np.arange(start, min(start + block_rows, n))
+        distances = _pairwise_distances(big_five[rows], big_five, big_five_sq)
+        conf_distances = _pairwise_distances(confidence[rows], confidence, confidence_sq)
+        # Distances are symmetric with a zero diagonal, so summing whole
+        # blocks counts every pair twice; halved below.
+        big_five_sum += float(distances.sum(dtype=np.float64))
+        confidence_sum += float(conf_distances.sum(dtype=np.float64))
+
+        # Shared MBTI letters = 1-bits agreeing + 0-bits agreeing.
+        shared = (mbti[rows] @ mbti.T + mbti_zeros[rows] @ mbti_zeros.T).astype(np.int8)
+        known_rows = mbti_known[rows]
+        letters_histogram += np.bincount(
+            shared[known_rows][:, mbti_known].ravel(), minlength=len(MBTI_AXES) + 1
+        )
+
+        if k:
+            distances[np.arange(len(rows)), rows] = np.inf  # never your own neighbour
+            top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            order = np.take_along_axis(distances, top, axis=1).argsort(axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            neighbours[rows] = top
+            neighbour_big_five[rows] = np.take_along_axis(distances, top, axis=1)
+            neighbour_confidence[rows] = np.take_along_axis(conf_distances, top, axis=1)
+            letters = np.take_along_axis(shared, top, axis=1)
+            both_known = known_rows[:, None] & mbti_known[top]
+            neighbour_letters[rows] = np.where(both_known, letters, -1)
+
+    pairs = n * (n - 1) / 2
+    known_pairs = len(known) * (len(known) - 1) / 2
+    big_five_sum, confidence_sum = big_five_sum / 2, confidence_sum / 2
+    # Drop each persona paired with itself (all letters shared), then halve.
+    letters_histogram[-1] -= len(known)
+    letters_histogram //= 2
+    return {
+        "usernames": columns["usernames"],
+        "mbti": columns["mbti"],
+        "pairs": int(pairs),
+        "mean_big_five_distance": big_five_sum / pairs if pairs else 0.0,
+        "mean_confidence_distance": confidence_sum / pairs if pairs else 0.0,
+        "mean_trait_difference": {
+            key: _mean_abs_pair_diff(big_five[:, col]) for col, key in enumerate(BIG_FIVE_TRAITS)
+        },
+        "mbti_known": len(known),
+        "mbti_exact_match_rate": letters_histogram[-1] / known_pairs if known_pairs else 0.0,
+        "mbti_mean_shared_letters": (
+            float(letters_histogram @ np.arange(len(MBTI_AXES) + 1)) / known_pairs if known_pairs else 0.0
+        ),
+        "mbti_shared_letters_histogram": letters_histogram.tolist(),
+        "neighbours": neighbours,
+        "neighbour_big_five": neighbour_big_five,
+        "neighbour_confidence": neighbour_confidence,
+        "neighbour_letters": neighbour_letters,
+    }
+
+def export_bulk_report(result: dict, filename: str = "persona_comparison_report.md") -> str:
+    usernames, mbti = result["usernames"], result["mbti"]
+    lines = [
+        f"# Persona Comparison: {len(usernames)} personas\n",
+        f"- **Pairs compared**: {result['pairs']}",
+        f"- **Mean Big Five distance**: {result['mean_big_five_distance']:.3f}",
+        f"- **Mean section-confidence distance**: {result['mean_confidence_distance']:.3f}",
+        f"- **Personas with an MBTI type**: {result['mbti_known']}",
+        f"- **MBTI exact match rate**: {result['mbti_exact_match_rate']:.1%}",
+        f"- **MBTI mean shared letters**: {result['mbti_mean_shared_letters']:.2f} / {len(MBTI_AXES)}",
+        "",
+        "## Big Five Trait Comparison (mean absolute difference over all pairs)\n",
+    ]
+    lines += [f"- **{trait.title()}**: Δ {diff:.3f}" for trait, diff in result["mean_trait_difference"].items()]
+    lines += ["", "## MBTI Shared Letters\n", "| Shared letters | Pairs |", "| --- | --- |"]
+    lines += [f"| {count} | {pairs} |" for count, pairs in enumerate(result["mbti_shared_letters_histogram"])]
+    lines += [
+        "", "## Nearest Neighbours (by Big Five distance)\n",
+        "| User | MBTI | Neighbour | MBTI | Big Five Δ | Confidence Δ | Shared MBTI letters |",
+        "| --- | --- | --- | --- | --- | --- | --- |",
+    ]
+    for row, name in enumerate(usernames):
+        for col, other in enumerate(result["neighbours"][row]):
+            letters = result["neighbour_letters"][row, col]
+            lines.append(
+                f"| {name} | {mbti[row]} | {usernames[other]} | {mbti[other]} "
+                f"| {result['neighbour_big_five'][row, col]:.3f} | {result['neighbour_confidence'][row, col]:.3f} "
+                f"| {letters if letters >= 0 else '-'} |"
+            )
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    print(f"\n📝 Comparison report saved to `{filename}`")
+    return filename
+
+def compare_directory(directory: str, top_k: int = 5) -> dict:
+    columns = persona_matrices(load_personas(find_persona_files(directory)))
+    return _compare_columns(columns, directory, top_k)
+
+def compare_index(path: str | None = None, top_k: int = 5) -> dict:
+    """Bulk comparison straight from the summary index; no persona JSON is read."""
+    from persona_index import INDEX_PATH, PersonaIndex
+
+    path = path or INDEX_PATH
+    if not Path(path).is_file():
+        print(f"❌ No persona index at {path}. Build one with `python persona_index.py rebuild <dir>`.")
+        sys.exit(1)
+    return _compare_columns(PersonaIndex(path).load_columns(), path, top_k)
+
+def _compare_columns(columns: dict, source: str, top_k: int) -> dict:
+    count = len(columns["usernames"])
+    if count < 2:
+        print(f"❌ Found {count} persona(s) in {source}; need at least two.")
+        sys.exit(1)
+    print(f"📊 Comparing {count} personas from {source} (top {top_k} neighbours each)\n")
+    result = bulk_compare(columns, top_k=top_k)
+    print(f"  Mean Big Five distance: {result['mean_big_five_distance']:.3f}")
+    print(f"  MBTI exact match rate:  {result['mbti_exact_match_rate']:.1%}")
+    export_bulk_report(result)
+    return result
+
+
 if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "--dir":
+        # python compare_personas.py --dir personas/ [top_k]
+        compare_directory(sys.argv[2], top_k=int(sys.argv[3]) if len(sys.argv) >= 4 else 5)
+        sys.exit(0)
+    if len(sys.argv) >= 2 and sys.argv[1] == "--index":
+        # python compare_personas.py --index [index.sqlite3] [top_k]
+        compare_index(sys.argv[2] if len(sys.argv) >= 3 else None, top_k=int(sys.argv[3]) if len(sys.argv) >= 4 else 5)
+        sys.exit(0)
     if len(sys.argv) == 3:
         file_a, file_b = sys.argv[1], sys.argv[2]
     else:
@@ -86,15 +341,16 @@ if __name__ == "__main__":
         file_a = input("Enter path to first persona JSON file: ").strip()
         file_b = input("Enter path to second persona JSON file: ").strip()
         # print(f"📥 Comparing {file_a} vs {file_b}\n")
+    file_a, file_b = resolve_persona_path(file_a), resolve_persona_path(file_b)
     if not Path(file_a).is_file() or not Path(file_b).is_file():
         print("❌ One or both files do not exist. Please check the paths.")
         sys.exit(1)
 
-    name_a = Path(file_a).stem.replace("_persona", "")
-    name_b = Path(file_b).stem.replace("_persona", "")
-    print(f"📊 Comparing personas: {name_a} vs {name_b}\n")
     persona_a = load_persona(file_a)
     persona_b = load_persona(file_b)
+    name_a = persona_a.get("username") or Path(file_a).stem.replace("_persona", "")
+    name_b = persona_b.get("username") or Path(file_b).stem.replace("_persona", "")
+    print(f"📊 Comparing personas: {name_a} vs {name_b}\n")
 
     print_comparison(persona_a, persona_b, name_a, name_b)
     print("\n📄 Full Persona Text Comparison")
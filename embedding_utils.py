@@ -1,26 +1,124 @@
+import hashlib
 import os
-import google.generativeai as genai
+import threading
+from collections import OrderedDict
 
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+import clients
+from env_loader import load_env
 
-def get_embedding(text: str) -> list[float]:
+load_env()  # the settings below may come from .env
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "models/embedding-001")
+# BatchEmbedContents accepts at most 100 texts per request.
+MAX_BATCH_SIZE = 100
+CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+
+# Output size of the Gemini embedding models we use.
+_KNOWN_DIMENSIONS = {
+    "models/embedding-001": 768,
+    "models/text-embedding-004": 768,
+}
+
+_cache: "OrderedDict[str, list[float]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class EmbeddingError(RuntimeError):
+    """Raised when the embedding API fails or returns unusable vectors."""
+
+
+def _cache_key(text: str, task_type: str) -> str:
+    return hashlib.sha256(f"{EMBEDDING_MODEL}\0{task_type}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _cache_get(key: str):
+    with _cache_lock:
+        vector = _cache.get(key)
+        if vector is not None:
+            _cache.move_to_end(key)
+        return vector
+
+
+def _cache_put(key: str, vector: list[float]) -> None:
+    with _cache_lock:
+        _cache[key] = vector
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def get_embeddings(texts: list[str], task_type: str = "RETRIEVAL_DOCUMENT") -> list[list[float]]:
     """
-    Use Gemini's embedding-001 model to convert text into a vector.
+    Embed many texts with as few API requests as possible.
+
+    Texts already embedded in this process are served from an LRU cache keyed
+    by a hash of the text; the rest are sent in batches of up to
+    ``MAX_BATCH_SIZE``.
+
+    Returns
+    -------
+    list[list[float]]
+        One vector per input text, in input order.
+
+    Raises
+    ------
+    EmbeddingError
+        If a request fails or the API returns missing/empty vectors.
+    """
+    keys = [_cache_key(text, task_type) for text in texts]
+    vectors = [_cache_get(key) for key in keys]
+
+    # Embed each distinct uncached text once.
+    pending: dict[str, str] = {}
+    for key, text, vector in zip(keys, texts, vectors):
+        if vector is None:
+            pending.setdefault(key, text)
+
+    fresh: dict[str, list[float]] = {}
+    pending_items = list(pending.items())
+    for start in range(0, len(pending_items), MAX_BATCH_SIZE):
+        batch = pending_items[start:start + MAX_BATCH_SIZE]
+        try:
+            result = clients.get_genai().embed_content(
+                model=EMBEDDING_MODEL,
+                content=[text for _, text in batch],
+                task_type=task_type,
+            )
+        except Exception as e:
+            raise EmbeddingError(f"Embedding request failed for {len(batch)} texts: {e}") from e
+
+        embeddings = result.get("embedding") or []
+        usable = sum(1 for vector in embeddings if vector)
+        if len(embeddings) != len(batch) or usable != len(batch):
+            raise EmbeddingError(
+                f"Embedding API returned {usable} usable vectors for {len(batch)} texts"
+            )
+        for (key, _), vector in zip(batch, embeddings):
+            fresh[key] = list(vector)
+            _cache_put(key, fresh[key])
+
+    return [vector if vector is not None else fresh[key] for key, vector in zip(keys, vectors)]
+
+
+def get_embedding(text: str, task_type: str = "RETRIEVAL_DOCUMENT") -> list[float]:
+    """
+    Use Gemini's embedding model to convert text into a vector.
 
     Returns
     -------
     list[float]
-        A 1536-dimensional embedding vector.
+        A ``embedding_dimension()``-sized embedding vector.
+
+    Raises
+    ------
+    EmbeddingError
+        Instead of returning an empty vector when embedding fails.
     """
-    model = genai.EmbeddingModel(model_name="models/embedding-001")
-
-    try:
-        result = model.embed_content(
-            content=text,
-            task_type="RETRIEVAL_QUERY",  # or "RETRIEVAL_DOCUMENT"
-            title="Reddit Persona"
-        )
-        return result["embedding"]
-    except Exception as e:
-        print("[!] Error generating embedding:", e)
-        return []
+    return get_embeddings([text], task_type=task_type)[0]
+
+
+def embedding_dimension() -> int:
+    """Vector size produced by ``EMBEDDING_MODEL``."""
+    if EMBEDDING_MODEL in _KNOWN_DIMENSIONS:
+        return _KNOWN_DIMENSIONS[EMBEDDING_MODEL]
+    return len(get_embedding("dimension probe"))
@@ -0,0 +1,34 @@
+"""
+Load ``.env`` once and expose the settings the worker needs.
+
+``load_env()`` is cheap to call repeatedly: the file is read on the first
+call only, and variables already set in the environment win over ``.env``.
+"""
+
+import os
+import threading
+
+ENV_KEYS = (
+    "GOOGLE_API_KEY",
+    "REDDIT_CLIENT_ID",
+    "REDDIT_CLIENT_SECRET",
+    "SUPABASE_URL",
+    "SUPABASE_KEY",
+    "GITHUB_REPO",
+    "GITHUB_TOKEN",
+)
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def load_env() -> dict:
+    """Read ``.env`` (first call only) and return ``ENV_KEYS`` mapped to their values (``None`` if unset)."""
+    global _loaded
+    with _lock:
+        if not _loaded:
+            from dotenv import load_dotenv
+
+            load_dotenv()
+            _loaded = True
+    return {key: os.getenv(key) for key in ENV_KEYS}
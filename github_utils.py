@@ -0,0 +1,373 @@
+"""
+Publishing persona files to a Git repository in batched commits.
+
+``push_to_github`` used to mean one commit per user, which caps throughput
+at GitHub's rate limits after a few hundred users an hour. It now queues
+the files with a ``BatchCommitter`` that writes many users' files as one
+commit, flushing once ``GITHUB_FLUSH_FILES`` files or
+``GITHUB_FLUSH_BYTES`` bytes are queued, every ``GITHUB_FLUSH_SECONDS``,
+and at process exit.
+
+Two backends build the commit:
+
+* ``GitHubBackend`` uses the Git Data API: blobs for binary files (text goes
+  inline in the tree), one tree on top of the branch head, one commit, then
+  a non-forced ref update. If another writer moved the branch meanwhile the
+  update is rejected and the commit is rebuilt on the new head.
+* ``LocalGitBackend`` does the same with git plumbing in a local bare
+  repository (``GITHUB_REPO=/path/to/repo.git`` or ``file://...``), for
+  tests and benchmarks. ``update-ref`` is given the expected old head, so
+  concurrent committers conflict and retry instead of losing commits.
+
+A flush retries rate limits, server errors and branch conflicts up to
+``GITHUB_MAX_ATTEMPTS`` times. Files from a failed flush stay queued for the
+next one; after ``GITHUB_MAX_FAILED_FLUSHES`` failed flushes in a row, or
+when more than ``GITHUB_MAX_PENDING_FILES`` files are waiting, the oldest
+are dropped with an error naming their users.
+
+Files land under ``GITHUB_PATH_PREFIX`` (default ``personas``) using the
+artifact store's sharded layout, e.g. ``personas/3f/a2/kojied/persona.md``.
+"""
+
+from __future__ import annotations
+
+import atexit
+import base64
+import hashlib
+import os
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Dict, Tuple
+
+import artifact_store
+from env_loader import load_env
+
+load_env()  # the settings below may come from .env
+
+GITHUB_BRANCH = os.getenv("GITHUB_BRANCH", "main")
+GITHUB_PATH_PREFIX = os.getenv("GITHUB_PATH_PREFIX", "personas")
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+FLUSH_FILES = int(os.getenv("GITHUB_FLUSH_FILES", "300"))
+FLUSH_BYTES = int(os.getenv("GITHUB_FLUSH_BYTES", str(20 * 1024 * 1024)))
+FLUSH_SECONDS = float(os.getenv("GITHUB_FLUSH_SECONDS", "60"))
+MAX_ATTEMPTS = int(os.getenv("GITHUB_MAX_ATTEMPTS", "5"))
+MAX_FAILED_FLUSHES = int(os.getenv("GITHUB_MAX_FAILED_FLUSHES", "5"))
+MAX_PENDING_FILES = int(os.getenv("GITHUB_MAX_PENDING_FILES", str(10 * FLUSH_FILES)))
+
+_EMPTY_SHA = "0" * 40
+
+
+class CommitConflict(Exception):
+    """The branch moved while a commit was being built; rebuild and retry."""
+
+
+class RetryableError(Exception):
+    """Rate limited or a server error; worth retrying after ``retry_after`` seconds."""
+
+    def __init__(self, status: int, retry_after: float, body: str):
+        super().__init__(f"GitHub API returned {status}: {body[:200]}")
+        self.retry_after = retry_after
+
+
+class GitHubBackend:
+    """Commits through the GitHub Git Data API (blobs, trees, commits, refs)."""
+
+    def __init__(self, repo: str, token: str, branch: str = GITHUB_BRANCH, session=None):
+        if session is None:
+            import requests
+
+            session = requests.Session()
+        session.headers.update({
+            "Authorization": f"Bearer {token}",
+            "Accept": "application/vnd.github+json",
+            "X-GitHub-Api-Version": "2022-11-28",
+        })
+        self.session = session
+        self.base = f"{GITHUB_API_URL}/repos/{repo}"
+        self.branch = branch
+        self._blob_shas: Dict[str, str] = {}  # content sha256 -> blob sha, reused across retries
+
+    def _request(self, method: str, path: str, **kwargs) -> dict:
+        response = self.session.request(method, f"{self.base}{path}", timeout=30, **kwargs)
+        if response.status_code == 422 and method == "PATCH":
+            raise CommitConflict(response.text)
+        if response.status_code == 429 or response.status_code >= 500 or self._rate_limited(response):
+            raise RetryableError(response.status_code, self._retry_after(response), response.text)
+        # Anything else, including a 403 for a bad token or missing
+        # permission, will not get better by retrying.
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def _rate_limited(response) -> bool:
+        """A 403 is a rate limit only with ``Retry-After`` or an exhausted quota."""
+        return response.status_code == 403 and (
+            "Retry-After" in response.headers or response.headers.get("X-RateLimit-Remaining") == "0"
+        )
+
+    @staticmethod
+    def _retry_after(response) -> float:
+        if "Retry-After" in response.headers:
+            return float(response.headers["Retry-After"] or 0)
+        reset = response.headers.get("X-RateLimit-Reset")
+        if response.headers.get("X-RateLimit-Remaining") == "0" and reset:
+            return max(0.0, float(reset) - time.time())
+        return 0.0
+
+    def _blob(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        if digest not in self._blob_shas:
+            blob = self._request("POST", "/git/blobs", json={
+                "content": base64.b64encode(data).decode("ascii"),
+                "encoding": "base64",
+            })
+            self._blob_shas[digest] = blob["sha"]
+        return self._blob_shas[digest]
+
+    def commit(self, files: Dict[str, bytes], message: str) -> str:
+        head = self._request("GET", f"/git/ref/heads/{self.branch}")["object"]["sha"]
+        base_tree = self._request("GET", f"/git/commits/{head}")["tree"]["sha"]
+
+        entries = []
+        for path, data in files.items():
+            entry = {"path": path, "mode": "100644", "type": "blob"}
+            try:
+                entry["content"] = data.decode("utf-8")
+            except UnicodeDecodeError:
+                entry["sha"] = self._blob(data)
+            entries.append(entry)
+
+        tree = self._request("POST", "/git/trees", json={"base_tree": base_tree, "tree": entries})
+        commit = self._request("POST", "/git/commits", json={
+            "message": message, "tree": tree["sha"], "parents": [head],
+        })
+        self._request("PATCH", f"/git/refs/heads/{self.branch}", json={"sha": commit["sha"], "force": False})
+        # The memo only saves re-uploads while one batch is retried.
+        self._blob_shas.clear()
+        return commit["sha"]
+
+
+class LocalGitBackend:
+    """Commits into a local bare repository with git plumbing commands."""
+
+    def __init__(self, path: str, branch: str = GITHUB_BRANCH):
+        self.path = path
+        self.branch = branch
+        if not os.path.isdir(path):
+            subprocess.run(["git", "init", "--bare", "-q", path], check=True)
+
+    def _git(self, *args: str, input: bytes | None = None, env: dict | None = None) -> str:
+        result = subprocess.run(
+            ["git", "--git-dir", self.path, *args],
+            input=input, capture_output=True, check=True,
+            env={**os.environ, **(env or {})},
+        )
+        return result.stdout.decode("utf-8").strip()
+
+    def commit(self, files: Dict[str, bytes], message: str) -> str:
+        ref = f"refs/heads/{self.branch}"
+        try:
+            head = self._git("rev-parse", "--verify", "-q", ref)
+        except subprocess.CalledProcessError:
+            head = ""
+
+        # One hash-object call for the whole batch instead of one per file.
+        with tempfile.TemporaryDirectory() as scratch:
+            sources = []
+            for n, data in enumerate(files.values()):
+                sources.append(os.path.join(scratch, str(n)))
+                with open(sources[-1], "wb") as handle:
+                    handle.write(data)
+            shas = self._git("hash-object", "-w", "--no-filters", "--stdin-paths", input="\n".join(sources).encode("utf-8")).split()
+        index_lines = [f"100644 {sha}\t{path}" for path, sha in zip(files, shas)]
+
+        index_file = os.path.join(self.path, f"index-{threading.get_ident()}-{os.getpid()}")
+        env = {
+            "GIT_INDEX_FILE": index_file,
+            "GIT_AUTHOR_NAME": os.getenv("GIT_AUTHOR_NAME", "RedditMindMap"),
+            "GIT_AUTHOR_EMAIL": os.getenv("GIT_AUTHOR_EMAIL", "redditmindmap@localhost"),
+            "GIT_COMMITTER_NAME": os.getenv("GIT_COMMITTER_NAME", "RedditMindMap"),
+            "GIT_COMMITTER_EMAIL": os.getenv("GIT_COMMITTER_EMAIL", "redditmindmap@localhost"),
+        }
+        try:
+            if head:
+                self._git("read-tree", head, env=env)
+            else:
+                self._git("read-tree", "--empty", env=env)
+            self._git("update-index", "--add", "--index-info",
+                      input="\n".join(index_lines).encode("utf-8"), env=env)
+            tree = self._git("write-tree", env=env)
+        finally:
+            if os.path.exists(index_file):
+                os.unlink(index_file)
+
+        parents = ["-p", head] if head else []
+        commit = self._git("commit-tree", tree, *parents, "-m", message, env=env)
+        try:
+            # Compare-and-swap: fails if the branch is no longer at ``head``.
+            self._git("update-ref", ref, commit, head or _EMPTY_SHA)
+        except subprocess.CalledProcessError as e:
+            raise CommitConflict(e.stderr.decode("utf-8", "replace")) from e
+        return commit
+
+
+class BatchCommitter:
+    """
+    Queues files from many users and writes them as one commit per flush.
+
+    Re-queuing a path before a flush replaces the earlier content. Failed
+    flushes keep their files queued (newer content for the same path wins)
+    and are retried on the next flush, up to ``max_failed_flushes`` times
+    and ``max_pending_files`` files; beyond that files are dropped loudly.
+    """
+
+    def __init__(
+        self,
+        backend,
+        flush_files: int = FLUSH_FILES,
+        flush_bytes: int = FLUSH_BYTES,
+        flush_seconds: float = FLUSH_SECONDS,
+        max_failed_flushes: int = MAX_FAILED_FLUSHES,
+        max_pending_files: int = MAX_PENDING_FILES,
+    ):
+        self.backend = backend
+        self.flush_files = flush_files
+        self.flush_bytes = flush_bytes
+        self.flush_seconds = flush_seconds
+        self.max_failed_flushes = max_failed_flushes
+        self.max_pending_files = max_pending_files
+        self.commits = 0
+        self.dropped = 0
+        self._pending: Dict[str, Tuple[str, bytes]] = {}  # repo path -> (username, content)
+        self._pending_bytes = 0
+        self._failures: Dict[str, int] = {}  # repo path -> failed flushes of the queued content
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._stop = threading.Event()
+        self._timer = threading.Thread(target=self._run_timer, daemon=True, name="github-flush")
+        self._timer.start()
+        atexit.register(self.close)
+
+    def add(self, username: str, files: Dict[str, bytes]) -> None:
+        with self._lock:
+            for path, data in files.items():
+                previous = self._pending.get(path)
+                self._pending_bytes += len(data) - (len(previous[1]) if previous else 0)
+                self._pending[path] = (username, data)
+                self._failures.pop(path, None)
+            full = len(self._pending) >= self.flush_files or self._pending_bytes >= self.flush_bytes
+        if full:
+            self.flush()
+
+    def _run_timer(self) -> None:
+        while not self._stop.wait(min(1.0, self.flush_seconds)):
+            if time.monotonic() - self._last_flush >= self.flush_seconds:
+                self.flush()
+
+    def _commit_with_retries(self, files: Dict[str, bytes], message: str) -> str:
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                return self.backend.commit(files, message)
+            except (CommitConflict, RetryableError) as e:
+                if attempt == MAX_ATTEMPTS:
+                    raise
+                # Jittered so committers racing for the same branch spread out.
+                backoff = min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0)
+                time.sleep(getattr(e, "retry_after", 0) or backoff)
+
+    def flush(self) -> int:
+        """Commit everything queued so far; returns the number of files written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending, self._pending_bytes = self._pending, {}, 0
+            self._last_flush = time.monotonic()
+            if not batch:
+                return 0
+
+            usernames = sorted({username for username, _ in batch.values()})
+            message = f"Add personas for {len(usernames)} users\n\n" + "\n".join(usernames)
+            files = {path: data for path, (_, data) in batch.items()}
+            try:
+                self._commit_with_retries(files, message)
+                self.commits += 1
+                with self._lock:
+                    for path in batch:
+                        self._failures.pop(path, None)
+                print(f"[✓] Committed {len(files)} files for {len(usernames)} users to GitHub")
+                return len(files)
+            except Exception as e:
+                print(f"[X] Failed to commit {len(files)} files to GitHub ({len(usernames)} users), will retry:", e)
+                self._requeue(batch)
+                return 0
+
+    def _requeue(self, batch: Dict[str, Tuple[str, bytes]]) -> None:
+        """Put a failed batch back, newer queued content first, within the retry and size caps."""
+        dropped = []
+        with self._lock:
+            for path, entry in batch.items():
+                if path in self._pending:
+                    continue  # newer content was queued meanwhile
+                attempts = self._failures.pop(path, 0) + 1
+                if attempts >= self.max_failed_flushes or len(self._pending) >= self.max_pending_files:
+                    dropped.append(entry[0])
+                    continue
+                self._failures[path] = attempts
+                self._pending[path] = entry
+                self._pending_bytes += len(entry[1])
+            self.dropped += len(dropped)
+        if dropped:
+            users = sorted(set(dropped))
+            print(
+                f"[X] Dropped {len(dropped)} files for {len(users)} users after repeated GitHub failures"
+                f" (max {self.max_failed_flushes} flushes, {self.max_pending_files} queued files): {', '.join(users)}"
+            )
+
+    def close(self) -> None:
+        self._stop.set()
+        self.flush()
+
+
+def repo_path(username: str, location: str) -> str:
+    """Path inside the repository for one of ``username``'s stored artifacts."""
+    filename = location.rstrip("/").rsplit("/", 1)[-1].rsplit(os.sep, 1)[-1]
+    return f"{GITHUB_PATH_PREFIX}/{artifact_store.persona_key(username, filename)}"
+
+
+def _is_local_repo(repo: str) -> bool:
+    return repo.startswith(("file://", "/", "."))
+
+
+_committers: Dict[Tuple[str, str], BatchCommitter] = {}
+_committers_lock = threading.Lock()
+
+
+def get_committer(repo: str, token: str | None) -> BatchCommitter:
+    """Process-wide committer for ``repo`` (``owner/name`` or a local bare repo path)."""
+    with _committers_lock:
+        key = (repo, GITHUB_BRANCH)
+        if key not in _committers:
+            if _is_local_repo(repo):
+                backend = LocalGitBackend(repo[len("file://"):] if repo.startswith("file://") else repo)
+            else:
+                backend = GitHubBackend(repo, token)
+            _committers[key] = BatchCommitter(backend)
+        return _committers[key]
+
+
+def push_to_github(persona_files: Dict[str, str], username: str, repo: str, token: str | None) -> None:
+    """
+    Queue a user's persona files for the next batched commit.
+
+    ``persona_files`` is what ``save_persona`` returns: locations keyed by
+    format. The files are read now, so later overwrites do not leak into
+    the commit.
+    """
+    files = {
+        repo_path(username, location): artifact_store.read_location(location)
+        for location in persona_files.values()
+    }
+    get_committer(repo, token).add(username, files)
@@ -0,0 +1,154 @@
+"""
+Persistent cache of LLM responses, keyed by model and prompt.
+
+Identical prompts come up constantly: a user retried after
+``worker.reschedule_failed``, a rerun of ``main.py``, or a refresh of someone whose
+activity has not changed all rebuild exactly the same prompt. Caching the
+response by ``sha256(model, prompt)`` makes those calls free.
+
+Entries live in a SQLite file (``LLM_CACHE_PATH``, default
+``.cache/llm_cache.sqlite3``) and are bounded two ways:
+
+- ``LLM_CACHE_TTL_SECONDS`` (default 30 days): older entries are ignored and
+  purged.
+- ``LLM_CACHE_MAX_BYTES`` (default 256 MiB): least recently used entries are
+  evicted once the stored responses exceed this size. "Recently used" is
+  tracked to ``LLM_CACHE_TOUCH_SECONDS`` (default 10 minutes), so most
+  lookups are plain reads and do not queue for the SQLite write lock.
+
+Set ``LLM_CACHE_DISABLED=1`` to bypass the cache entirely.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Dict, Optional
+
+from env_loader import load_env
+
+load_env()  # the settings below may come from .env
+
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_cache.sqlite3"))
+TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+ENABLED = os.getenv("LLM_CACHE_DISABLED", "") != "1"
+TOUCH_SECONDS = int(os.getenv("LLM_CACHE_TOUCH_SECONDS", "600"))
+
+_SCHEMA = """
+create table if not exists responses (
+    key        text primary key,
+    model      text not null,
+    response   text not null,
+    size       integer not null,
+    created_at real not null,
+    last_used  real not null
+);
+create index if not exists responses_lru on responses (last_used);
+"""
+
+
+def cache_key(model: str, prompt: str, extra: str = "") -> str:
+    """Content address for a request: the model, the prompt and any options."""
+    digest = hashlib.sha256()
+    for part in (model, prompt, extra):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class LLMCache:
+    """Size-bounded, TTL-expiring LRU cache of LLM responses."""
+
+    def __init__(
+        self,
+        path: str = CACHE_PATH,
+        ttl_seconds: int = TTL_SECONDS,
+        max_bytes: int = MAX_BYTES,
+        touch_seconds: int = TOUCH_SECONDS,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.touch_seconds = touch_seconds
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("pragma journal_mode=wal")
+        return conn
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += n
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for ``key``, or ``None`` on a miss."""
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            # fetchall() finishes the read before any write below, so the
+            # write starts its own transaction (and waits for the busy
+            # timeout) instead of upgrading a read snapshot, which fails
+            # at once under concurrent writers.
+            rows = conn.execute(
+                "select response, created_at, last_used from responses where key = ?", (key,)
+            ).fetchall()
+            if not rows:
+                self._count("misses")
+                return None
+            response, created_at, last_used = rows[0]
+            if now - created_at > self.ttl_seconds:
+                conn.execute("delete from responses where key = ?", (key,))
+                self._count("expired")
+                self._count("misses")
+                return None
+            if now - last_used >= self.touch_seconds:
+                conn.execute("update responses set last_used = ? where key = ?", (now, key))
+        self._count("hits")
+        return response
+
+    def put(self, key: str, model: str, response: str) -> None:
+        """Store a response and evict least recently used entries over budget."""
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "insert or replace into responses (key, model, response, size, created_at, last_used)"
+                " values (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now),
+            )
+            conn.execute("delete from responses where created_at < ?", (now - self.ttl_seconds,))
+            total = conn.execute("select coalesce(sum(size), 0) from responses").fetchone()[0]
+            if total > self.max_bytes:
+                evicted = 0
+                rows = conn.execute("select key, size from responses order by last_used").fetchall()
+                for old_key, old_size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute("delete from responses where key = ?", (old_key,))
+                    total -= old_size
+                    evicted += 1
+                self._count("evictions", evicted)
+
+    def delete(self, key: str) -> None:
+        """Drop one entry, e.g. a response that turned out to be unusable."""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("delete from responses where key = ?", (key,))
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters for this process, plus the current hit ratio."""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
@@ -8,30 +8,51 @@ Run either of these:
 2) VS Code / no‑arg execution:
    $ python main.py
    ▶︎ (the script will then ask for the URL interactively)
+
+3) Offline, from activity recorded with ACTIVITY_RECORD_PATH (saved to a
+   separate replay store, see ``activity_dataset.use_replay_store``):
+   $ python main.py https://www.reddit.com/user/example/ --replay activity.jsonl.gz
 """
 
 from __future__ import annotations
+import argparse
 import sys
 
-
-from supabase_utils import fetch_usernames, mark_username_processed
+import activity_dataset
 from persona_utils import (
     extract_username,
     scrape_user_data,
-    generate_persona,
+    build_persona,
     save_persona,
+    save_persona_streaming,
+    stream_persona,
 )
 
-
-def get_profile_url() -> str:
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Command-line options (``sys.argv`` by default)."""
+    parser = argparse.ArgumentParser(description="Generate a Reddit user persona from a profile URL.")
+    parser.add_argument("profile_url", nargs="?", help="Reddit profile URL (asked for when omitted)")
+    parser.add_argument("--stream", action="store_true", help="print sections as Gemini writes them")
+    # Take the activity from a recorded dataset (activity_dataset) instead
+    # of scraping Reddit.
+    parser.add_argument("--replay", metavar="FILE", help="recorded activity to use instead of Reddit")
+    parser.add_argument("--store", metavar="DIR_OR_URL",
+                        help="where replayed personas go (default: REPLAY_STORE or FILE.personas)")
+    args = parser.parse_args(argv)
+    if args.store and not args.replay:
+        parser.error("--store only applies with --replay")
+    return args
+
+
+def get_profile_url(args: argparse.Namespace) -> str:
     """
     Return a Reddit profile URL from argv or interactive prompt.
 
-    If the script is executed without exactly one CLI argument,
-    the user is prompted to paste a URL or plain username.
+    If the script is executed without a URL argument, the user is
+    prompted to paste a URL or plain username.
     """
-    if len(sys.argv) == 2:
-        return sys.argv[1]
+    if args.profile_url:
+        return args.profile_url
 
     # Interactive fallback
     # print("No URL supplied on the command line.")
@@ -45,31 +66,59 @@ def get_profile_url() -> str:
 
 
 def main() -> None:
-    """Generate a Reddit user persona and save it to <username>_persona.txt."""
-    profile_url = get_profile_url()
+    """Generate a Reddit user persona and save it to the artifact store (see ``artifact_store``)."""
+    args = parse_args()
+    profile_url = get_profile_url(args)
     username = extract_username(profile_url)
 
     if username is None:
         print("❌  Could not parse a username from that input. Exiting.")
         sys.exit(1)
 
-    try:
-        posts, comments = scrape_user_data(username)
-    except Exception as exc:  # pragma: no cover
-        print(f"❌  Failed to scrape data: {exc}")
-        sys.exit(1)
-
-    persona = generate_persona(posts, comments)
+    if args.replay:
+        entry = activity_dataset.find(args.replay, username)
+        if entry is None:
+            print(f"❌  {username} is not in {args.replay}. Exiting.")
+            sys.exit(1)
+        posts, comments = entry["posts"], entry["comments"]
+        # Replayed personas are snapshots in their own store: the production
+        # files, persona index and subreddit norms stay as they were.
+        print(f"🗂️  Saving to {activity_dataset.use_replay_store(args.replay, args.store)}")
+    else:
+        try:
+            posts, comments = scrape_user_data(username)
+        except Exception as exc:  # pragma: no cover
+            print(f"❌  Failed to scrape data: {exc}")
+            sys.exit(1)
+
+    snapshot = bool(args.replay)
+    if args.stream:
+        # Sections are printed and appended to the .txt/.md as they arrive;
+        # the framework mapping needs the full text, so it runs afterwards.
+        persona, files = save_persona_streaming(
+            username,
+            stream_persona(posts, comments),
+            posts,
+            comments,
+            on_section=lambda key, text: print(f"\n{text}", flush=True),
+            snapshot=snapshot,
+        )
+        if not persona:
+            print("❌  Failed to generate a persona. Exiting.")
+            sys.exit(1)
+        print(f"✅  Persona generated → {', '.join(files.values())}")
+        return
+
+    persona, frameworks = build_persona(posts, comments)
     if not persona:
         print("❌  Failed to generate a persona. Exiting.")
         sys.exit(1)
-    
-    # Save the persona to a text file
-    # The function also saves it to .md and .json formats
-    # so we don't need to call those functions separately.
-    save_persona(username, persona, posts, comments)
 
-    print(f"✅  Persona generated → {username}_persona.txt")
+    # Writes .txt, .md and .json to the artifact store and returns where
+    # they went (sharded local paths, or s3:// URLs).
+    files = save_persona(username, persona, posts, comments, frameworks=frameworks, snapshot=snapshot)
+
+    print(f"✅  Persona generated → {', '.join(files.values())}")
 
 
 if __name__ == "__main__":
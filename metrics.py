@@ -0,0 +1,295 @@
+"""
+Worker instrumentation: Prometheus-format metrics and a per-user trace.
+
+Counters, gauges and histograms live in this process and are served as
+Prometheus text on ``http://METRICS_HOST:METRICS_PORT/metrics`` once
+``start_http_server()`` is called (the worker does this at startup;
+``METRICS_PORT=0`` turns it off). No client library is needed.
+
+    $ curl -s localhost:9108/metrics | grep persona_stage_seconds
+
+With ``METRICS_TRACE_PATH`` set, every ``trace_user`` block appends one JSON
+line with the user's stage timings, Gemini token counts, outcome and error,
+so a slow or failed user can be looked up after the fact.
+"""
+
+from __future__ import annotations
+
+import abc
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from env_loader import load_env
+
+load_env()  # the settings below may come from .env
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+TRACE_PATH = os.getenv("METRICS_TRACE_PATH")
+
+# Stage latencies run from a cached Reddit refresh (~10 ms) to a slow
+# Gemini call with retries (minutes).
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> _LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: _LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[_LabelKey, object] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    @abc.abstractmethod
+    def _samples(self) -> List[str]:
+        """Sample lines, without the ``# HELP`` / ``# TYPE`` header."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonic count, optionally split by labels: ``pages.inc(kind="posts")``."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    """
+    Value that goes up and down.
+
+    ``function`` makes the gauge read its (unlabelled) value at scrape time,
+    e.g. the age of the oldest lease held.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, function: Optional[Callable[[], float]] = None):
+        super().__init__(name, help)
+        self.function = function
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def _samples(self) -> List[str]:
+        if self.function is not None:
+            try:
+                self.set(self.function())
+            except Exception:
+                pass
+        return super()._samples()
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram with ``_sum`` and ``_count``."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = STAGE_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in items:
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                running += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', _format_value(bound)),))} {running}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {running}")
+        return lines
+
+
+_registry: List[_Metric] = []
+
+
+def render() -> str:
+    """Every metric in Prometheus text exposition format."""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+# --------------------------------------------------------------------------- #
+# Pipeline metrics
+# --------------------------------------------------------------------------- #
+
+STAGE_SECONDS = Histogram("persona_stage_seconds", "Wall time of each pipeline stage per user.")
+USERS = Counter("persona_users_total", "Users finished by the worker, by outcome (processed/failed).")
+REFRESH_SKIPS = Counter(
+    "persona_refresh_skipped_total", "Refreshes that skipped Gemini, by reason (probe/fingerprint)."
+)
+GEMINI_TOKENS = Counter("gemini_tokens_total", "Gemini tokens reported in usage_metadata, by kind (prompt/response).")
+GEMINI_REQUESTS = Counter("gemini_requests_total", "Gemini generate_content calls.")
+REDDIT_PAGES = Counter("reddit_pages_total", "Reddit API requests (listing pages), by HTTP status.")
+REDDIT_WAIT_SECONDS = Histogram(
+    "reddit_ratelimit_wait_seconds", "Time Reddit requests queued for a rate-limit token.",
+    buckets=(0.001, 0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+VECTOR_DROPPED = Counter(
+    "vector_points_dropped_total", "Persona points given up on after VECTOR_MAX_ATTEMPTS failed vector DB flushes."
+)
+QUEUE_DEPTH = Gauge("persona_queue_depth", "Unprocessed users in the queue table at the last poll.")
+IN_FLIGHT = Gauge("worker_users_in_flight", "Users claimed by this worker and not yet finished.")
+LOCK_AGE = Gauge("worker_oldest_lock_age_seconds", "Seconds since this worker claimed its oldest in-flight user.")
+
+
+# --------------------------------------------------------------------------- #
+# Per-user trace
+# --------------------------------------------------------------------------- #
+
+_local = threading.local()
+_trace_lock = threading.Lock()
+
+
+def _current_trace() -> Optional[dict]:
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def trace_user(username: str) -> Iterator[dict]:
+    """
+    Collect one user's stage timings and token counts on this thread.
+
+    Counts the user as processed, or as failed if the block raises, and
+    appends the trace to ``METRICS_TRACE_PATH`` when set.
+    """
+    trace = {"username": username, "started_at": time.time(), "stages": {}, "gemini_tokens": {}}
+    _local.trace = trace
+    started = time.perf_counter()
+    try:
+        yield trace
+        trace["status"] = "processed"
+    except BaseException as e:
+        trace["status"] = "failed"
+        trace["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _local.trace = None
+        trace["seconds"] = round(time.perf_counter() - started, 4)
+        USERS.inc(status=trace["status"])
+        if TRACE_PATH:
+            line = json.dumps(trace, ensure_ascii=False)
+            with _trace_lock, open(TRACE_PATH, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a pipeline stage into ``persona_stage_seconds`` and the current trace."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        trace = _current_trace()
+        if trace is not None:
+            trace["stages"][name] = round(trace["stages"].get(name, 0.0) + elapsed, 4)
+
+
+def record_gemini_usage(response) -> None:
+    """Count a Gemini response's ``usage_metadata`` tokens (missing metadata is ignored)."""
+    GEMINI_REQUESTS.inc()
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    trace = _current_trace()
+    for kind, attribute in (("prompt", "prompt_token_count"), ("response", "candidates_token_count")):
+        tokens = getattr(usage, attribute, None) or 0
+        GEMINI_TOKENS.inc(tokens, kind=kind)
+        if trace is not None:
+            trace["gemini_tokens"][kind] = trace["gemini_tokens"].get(kind, 0) + tokens
+
+
+# --------------------------------------------------------------------------- #
+# HTTP endpoint
+# --------------------------------------------------------------------------- #
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_http_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> Optional[ThreadingHTTPServer]:
+    """Serve ``/metrics`` from a daemon thread; returns ``None`` when ``port`` is 0."""
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+    return server
@@ -0,0 +1,192 @@
+"""
+Compact summary index of every saved persona.
+
+A persona's JSON carries its full section text, so analytics that only want
+MBTI, the Big Five scores and section confidences should not have to load
+and decompress one file per user. ``save_persona`` also upserts a one-row
+summary per user into a SQLite table (``PERSONA_INDEX_PATH``, default
+``index.sqlite3`` inside the persona store). Reading everyone's summary is
+one query, and ``load_columns`` hands it back as NumPy columns whose size
+depends only on the number of users.
+
+    $ python persona_index.py rebuild personas/   # index personas saved before the index existed
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import closing
+from typing import Dict, Iterable, List, Optional
+
+from artifact_store import STORE_DIR, load_json
+from env_loader import load_env
+from persona_parser import BIG_FIVE_TRAITS, PERSONA_SECTIONS
+
+load_env()  # the settings below may come from .env
+
+INDEX_PATH = os.getenv("PERSONA_INDEX_PATH", os.path.join(STORE_DIR, "index.sqlite3"))
+
+SECTION_KEYS = tuple(key for key, _, _ in PERSONA_SECTIONS)
+
+_COLUMNS = (
+    ("username", "text primary key"),
+    ("generated_at", "text"),
+    ("mbti", "text"),
+    *((trait, "real") for trait in BIG_FIVE_TRAITS),
+    *((f"conf_{key}", "real") for key in SECTION_KEYS),
+    ("location", "text"),
+)
+_NAMES = tuple(name for name, _ in _COLUMNS)
+_SCHEMA = (
+    "create table if not exists personas (\n    "
+    + ",\n    ".join(f"{name} {kind}" for name, kind in _COLUMNS)
+    + "\n);\ncreate index if not exists personas_mbti on personas (mbti);\n"
+)
+
+
+def summarize(persona: dict, location: str | None = None) -> Dict[str, object]:
+    """The index row for a persona JSON document (as written by ``save_persona``)."""
+    frameworks = persona.get("personality_frameworks") or {}
+    traits = frameworks.get("BigFive") or {}
+    sections = persona.get("persona") or {}
+    row = {
+        "username": persona["username"],
+        "generated_at": persona.get("generated_at"),
+        "mbti": (str(frameworks.get("MBTI") or "").upper() or None),
+        "location": location,
+    }
+    for trait in BIG_FIVE_TRAITS:
+        value = traits.get(trait)
+        row[trait] = float(value) if isinstance(value, (int, float)) else None
+    for key in SECTION_KEYS:
+        row[f"conf_{key}"] = (sections.get(key) or {}).get("confidence")
+    return row
+
+
+class PersonaIndex:
+    """SQLite table with one summary row per username; the latest save wins."""
+
+    def __init__(self, path: str = INDEX_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("pragma journal_mode=wal")
+        return conn
+
+    def upsert(self, rows: Iterable[Dict[str, object]]) -> int:
+        rows = [tuple(row.get(name) for name in _NAMES) for row in rows]
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                f"insert or replace into personas ({', '.join(_NAMES)})"
+                f" values ({', '.join('?' for _ in _NAMES)})",
+                rows,
+            )
+        return len(rows)
+
+    def add(self, persona: dict, location: str | None = None) -> None:
+        self.upsert([summarize(persona, location)])
+
+    def get(self, username: str) -> Optional[Dict[str, object]]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                f"select {', '.join(_NAMES)} from personas where username = ?", (username,)
+            ).fetchone()
+        return dict(zip(_NAMES, row)) if row else None
+
+    def find(self, mbti: str | None = None, **trait_ranges) -> List[str]:
+        """
+        Usernames matching an MBTI type and/or Big Five ranges.
+
+        ``find(mbti="INTJ", openness=(0.7, None))``: each range is
+        ``(min, max)`` with ``None`` for an open end.
+        """
+        clauses, params = [], []
+        if mbti:
+            clauses.append("mbti = ?")
+            params.append(mbti.upper())
+        for trait, (low, high) in trait_ranges.items():
+            if trait not in BIG_FIVE_TRAITS:
+                raise ValueError(f"Unknown trait {trait!r}; expected one of {BIG_FIVE_TRAITS}")
+            if low is not None:
+                clauses.append(f"{trait} >= ?")
+                params.append(low)
+            if high is not None:
+                clauses.append(f"{trait} <= ?")
+                params.append(high)
+        where = f" where {' and '.join(clauses)}" if clauses else ""
+        with closing(self._connect()) as conn:
+            return [name for (name,) in conn.execute(f"select username from personas{where} order by username", params)]
+
+    def load_columns(self) -> Dict[str, object]:
+        """
+        Every summary as columns.
+
+        Returns ``usernames``, ``generated_at`` and ``mbti`` lists plus
+        ``big_five`` (N x 5) and ``confidence`` (N x 9) float32 arrays;
+        missing values are 0.
+        """
+        import numpy as np
+
+        numeric = BIG_FIVE_TRAITS + tuple(f"conf_{key}" for key in SECTION_KEYS)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"select username, generated_at, mbti, {', '.join(f'coalesce({name}, 0)' for name in numeric)}"
+                " from personas order by username"
+            ).fetchall()
+        values = np.array([row[3:] for row in rows], dtype=np.float32).reshape(len(rows), len(numeric))
+        return {
+            "usernames": [row[0] for row in rows],
+            "generated_at": [row[1] for row in rows],
+            "mbti": [row[2] or "Unknown" for row in rows],
+            "big_five": values[:, :len(BIG_FIVE_TRAITS)],
+            "confidence": values[:, len(BIG_FIVE_TRAITS):],
+        }
+
+    def __len__(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("select count(*) from personas").fetchone()[0]
+
+
+_index: PersonaIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> PersonaIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = PersonaIndex()
+        return _index
+
+
+def rebuild(directory: str, index: PersonaIndex | None = None) -> int:
+    """Index every non-snapshot persona JSON under ``directory`` (e.g. saved before the index existed)."""
+    index = index if index is not None else get_index()
+    rows = []
+    for parent, dirs, names in os.walk(directory):
+        if parent == directory and "raw" in dirs:
+            dirs.remove("raw")
+        for name in names:
+            if name.endswith((".json", ".json.gz", ".json.zst")):
+                location = os.path.join(parent, name)
+                persona = load_json(location)
+                if "personality_frameworks" in persona and "username" in persona and not persona.get("snapshot"):
+                    rows.append(summarize(persona, location))
+    return index.upsert(rows)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "rebuild":
+        directory = sys.argv[2] if len(sys.argv) >= 3 else STORE_DIR
+        print(f"✅ Indexed {rebuild(directory)} personas from {directory} into {get_index().path}")
+    else:
+        print(f"{len(get_index())} personas indexed in {get_index().path}")
@@ -0,0 +1,140 @@
+"""
+Single-pass parser for plain-text persona reports.
+
+``parse_persona`` walks the report once, classifying each line with one
+precompiled regex (section header, ``Source:`` citation, or body text), and
+builds a small tree of sections with their citations. Confidence is
+computed during the same pass. The .txt, .md and .json outputs are then
+rendered from that tree instead of rescanning the text for every format.
+
+Confidence heuristic: each section starts at 0.5 and every ``Source:``
+citation line adds 0.1, capped at 1.0.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# (key, emoji, title) for every persona section, in report order.
+PERSONA_SECTIONS = (
+    ("interests", "🎯", "Interests"),
+    ("personality_traits", "🤔", "Personality Traits"),
+    ("tone_of_writing", "🗣️", "Tone of Writing"),
+    ("profession_or_education", "👨‍🎓", "Profession or Education"),
+    ("humor_or_style", "😂", "Humor or Style"),
+    ("political_or_social_leanings", "🌎", "Political/Social Leanings"),
+    ("limitations", "🚫", "Limitations"),
+    ("representative_quote", "💬", "Representative Quote"),
+    ("goals_and_needs", "✅", "Goals & Needs"),
+)
+
+# Big Five traits, in the order every table, vector and prompt lists them.
+BIG_FIVE_TRAITS = ("openness", "conscientiousness", "extraversion", "agreeableness", "neuroticism")
+
+# The model sometimes drops the emoji variation selector (U+FE0F) or keeps
+# the "1." numbering from the prompt; both still count as headers.
+_KEY_BY_BARE_EMOJI = {emoji.replace("\ufe0f", ""): key for key, emoji, _ in PERSONA_SECTIONS}
+_EMOJI_PATTERN = "|".join(
+    re.escape(emoji) + "\ufe0f?" for emoji in sorted(_KEY_BY_BARE_EMOJI, key=len, reverse=True)
+)
+_LINE_RE = re.compile(
+    rf"^\s*(?:\d+[.)]\s*)?(?P<emoji>{_EMOJI_PATTERN})"
+    r"|(?P<before>.*?)Source:(?P<url>.*)$"
+)
+
+BASE_CONFIDENCE = 0.5
+CONFIDENCE_PER_CITATION = 0.1
+
+
+def _key_for(emoji: str) -> str:
+    return _KEY_BY_BARE_EMOJI[emoji.replace("\ufe0f", "")]
+
+
+def header_key(line: str) -> Optional[str]:
+    """Section key if ``line`` is a section header, else ``None``."""
+    match = _LINE_RE.match(line)
+    if match and match.group("emoji"):
+        return _key_for(match.group("emoji"))
+    return None
+
+
+@dataclass
+class Citation:
+    text: str
+    url: str
+
+
+@dataclass
+class Section:
+    key: Optional[str]
+    lines: List[str] = field(default_factory=list)
+    markdown: List[str] = field(default_factory=list)
+    citations: List[Citation] = field(default_factory=list)
+
+    @property
+    def value(self) -> str:
+        """Non-empty stripped lines, as stored in the persona JSON."""
+        return "\n".join(line for line in (l.strip() for l in self.lines) if line)
+
+    @property
+    def confidence(self) -> float:
+        return round(min(1.0, BASE_CONFIDENCE + CONFIDENCE_PER_CITATION * len(self.citations)), 2)
+
+
+@dataclass
+class PersonaTree:
+    """Sections of one persona; ``sections[0]`` may be a keyless preamble."""
+
+    sections: List[Section]
+
+    def to_text(self) -> str:
+        return "\n".join(line for section in self.sections for line in section.lines)
+
+    def to_markdown(self) -> str:
+        return "\n".join(line for section in self.sections for line in section.markdown)
+
+    def to_json(self) -> Dict[str, dict]:
+        """``{key: {"value", "confidence"}}``; a repeated section keeps the last copy."""
+        output = {}
+        for section in self.sections:
+            if section.key is not None and section.value:
+                output[section.key] = {"value": section.value, "confidence": section.confidence}
+        return output
+
+    def citation_count(self) -> int:
+        return sum(len(section.citations) for section in self.sections)
+
+
+def parse_persona(text: str) -> PersonaTree:
+    """Build the section/citation tree for ``text`` in one pass over its lines."""
+    current = Section(key=None)
+    sections = [current]
+
+    for line in text.splitlines():
+        match = _LINE_RE.match(line)
+        if match is None:
+            current.lines.append(line)
+            current.markdown.append(line)
+            continue
+
+        if match.group("emoji"):
+            key = _key_for(match.group("emoji"))
+            current = Section(key=key)
+            sections.append(current)
+            current.lines.append(line)
+            current.markdown.append(f"## {line.strip()}")
+            continue
+
+        before, url = match.group("before").strip(), match.group("url").strip()
+        current.citations.append(Citation(text=before, url=url))
+        current.lines.append(line)
+        if before:
+            current.markdown.append(f"- {before}  \n  **Source:** [{url}]({url})")
+        else:
+            current.markdown.append(f"  **Source:** [{url}]({url})")
+
+    if not sections[0].lines:
+        sections.pop(0)
+    return PersonaTree(sections)
@@ -6,44 +6,129 @@ Functions
 extract_username(url: str) -> str | None
     Extract the username from a Reddit profile URL.
 
-scrape_user_data(username: str, limit: int = 30)
-    Return the user's recent posts and comments.
+scrape_user_data(username: str, limit: int = 30, use_cache: bool = True)
+    Return the user's recent posts and comments, refreshing the on-disk
+    scrape cache incrementally.
+
+iter_user_activity(username: str, limit: int = 30, until=None, stop=None)
+    Stream posts and comments from both listings concurrently, with
+    early-stop predicates (``older_than``, ``tokens_exceed``).
 
 generate_persona(posts: list[dict], comments: list[dict]) -> str
     Use Google Gemini to build a persona with citations.
 
-def save_persona(username: str, persona: str, posts: List[dict], comments: List[dict]) -> None:
-    Persist the generated persona to a text file,md and json.
+generate_persona_structured(posts: list[dict], comments: list[dict]) -> dict | None
+    One schema-constrained Gemini call returning persona sections with
+    citations plus MBTI / Big Five.
+
+build_persona(posts: list[dict], comments: list[dict]) -> tuple[str, dict]
+    Persona text and framework mapping, from one call when possible.
+
+stream_persona(posts: list[dict], comments: list[dict]) -> Iterator[tuple[str | None, str]]
+    Stream the persona from Gemini, yielding each section once complete.
+
+save_persona_streaming(username, sections, posts, comments) -> tuple[str, dict]
+    Write .txt/.md section by section as a stream arrives.
+
+def save_persona(username: str, persona: str, posts: List[dict], comments: List[dict]) -> dict:
+    Persist the generated persona to a text file,md and json in the
+    artifact store (see ``artifact_store``).
+
+Parsing of the plain-text report (sections, citations, confidence) lives in
+``persona_parser``; ``parse_persona_to_json``, ``convert_to_markdown`` and
+``score_by_citations`` are thin wrappers over it.
 """
 
 from __future__ import annotations
 
+import hashlib
+import io
 import os
+import queue
 import re
-from typing import Tuple, List, Dict
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
 
 import json
-import google.generativeai as genai
-import praw
-from dotenv import load_dotenv
 from datetime import datetime
 
+import activity_dataset
+import artifact_store
+import clients
+import llm_cache
+import metrics
+import persona_index
+import subreddit_norms
+from env_loader import load_env
+from persona_parser import BIG_FIVE_TRAITS, PERSONA_SECTIONS, PersonaTree, header_key, parse_persona
+from scrape_cache import EXHAUSTED, ListingState, ScrapeCache
+from snippets import estimate_tokens, select_snippets
+
 # --------------------------------------------------------------------------- #
 # Environment & client setup
 # --------------------------------------------------------------------------- #
 
-load_dotenv()  # Loads GOOGLE_API_KEY, REDDIT_CLIENT_ID, etc.
-
-# Gemini
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-_GEMINI_MODEL = genai.GenerativeModel("models/gemini-1.5-flash")
-
-# Reddit (PRAW)
-_reddit = praw.Reddit(
-    client_id=os.getenv("REDDIT_CLIENT_ID"),
-    client_secret=os.getenv("REDDIT_CLIENT_SECRET"),
-    user_agent="persona-generator-script",
-)
+load_env()  # Loads GOOGLE_API_KEY, REDDIT_CLIENT_ID, etc.
+
+# Gemini and Reddit clients are built on first use (see clients.py), so
+# importing this module stays cheap and needs no credentials.
+
+# On-disk activity cache (see scrape_cache.py); SCRAPE_CACHE_DISABLED=1 turns
+# every scrape back into a full fetch.
+_SCRAPE_CACHE_ENABLED = os.getenv("SCRAPE_CACHE_DISABLED", "") != "1"
+_scrape_cache: ScrapeCache | None = None
+
+# Persistent LLM response cache (see llm_cache.py).
+_llm_cache: llm_cache.LLMCache | None = None
+# Both caches are created on first use, possibly from several worker threads.
+_cache_lock = threading.Lock()
+
+# Prompt sizing for generate_persona (see snippets.py).
+PERSONA_TOKEN_BUDGET = int(os.getenv("PERSONA_TOKEN_BUDGET", "6000"))
+PERSONA_SNIPPET_RANKING = os.getenv("PERSONA_SNIPPET_RANKING", "recency")
+# Add local style statistics (style_features.py) to the prompt; they stand in
+# for part of the raw text, so the snippet budget drops to
+# PERSONA_STYLE_TOKEN_BUDGET unless a budget is passed explicitly.
+PERSONA_STYLE_SUMMARY = os.getenv("PERSONA_STYLE_SUMMARY", "0") == "1"
+PERSONA_STYLE_TOKEN_BUDGET = int(os.getenv("PERSONA_STYLE_TOKEN_BUDGET", "4000"))
+
+# Ask for persona + frameworks as JSON in a single call (PERSONA_STRUCTURED=0
+# falls back to free text followed by a separate map_to_frameworks call).
+PERSONA_STRUCTURED = os.getenv("PERSONA_STRUCTURED", "1") != "0"
+
+_PERSONA_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "sections": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "key": {"type": "STRING"},
+                    "insights": {
+                        "type": "ARRAY",
+                        "items": {
+                            "type": "OBJECT",
+                            "properties": {
+                                "text": {"type": "STRING"},
+                                "source": {"type": "STRING"},
+                            },
+                            "required": ["text"],
+                        },
+                    },
+                },
+                "required": ["key", "insights"],
+            },
+        },
+        "MBTI": {"type": "STRING"},
+        "BigFive": {
+            "type": "OBJECT",
+            "properties": {trait: {"type": "NUMBER"} for trait in BIG_FIVE_TRAITS},
+            "required": list(BIG_FIVE_TRAITS),
+        },
+    },
+    "required": ["sections", "MBTI", "BigFive"],
+}
 
 # --------------------------------------------------------------------------- #
 # Public helpers
@@ -68,8 +153,274 @@ def extract_username(url: str) -> str | None:
     return match.group(1) if match else None
 
 
+def _submission_to_dict(submission) -> Dict[str, str]:
+    return {
+        "text": f"{submission.title}\n{submission.selftext}",
+        "url": f"https://reddit.com{submission.permalink}",
+        "created_utc": submission.created_utc,
+        "subreddit": str(submission.subreddit),
+        "score": submission.score,
+        "num_comments": submission.num_comments,
+    }
+
+
+def _comment_to_dict(comment) -> Dict[str, str]:
+    return {
+        "text": comment.body,
+        "url": f"https://reddit.com{comment.permalink}",
+        "created_utc": comment.created_utc,
+        "subreddit": str(comment.subreddit),
+        "score": comment.score,
+    }
+
+
+def _get_scrape_cache() -> ScrapeCache:
+    global _scrape_cache
+    with _cache_lock:
+        if _scrape_cache is None:
+            _scrape_cache = ScrapeCache()
+        return _scrape_cache
+
+
+_LISTINGS = (
+    ("posts", "submissions", _submission_to_dict),
+    ("comments", "comments", _comment_to_dict),
+)
+# Items buffered between the listing fetchers and the consumer (one page);
+# a slow consumer pauses the fetchers instead of letting them run ahead.
+_ACTIVITY_BUFFER = 100
+_END = object()
+
+
+def older_than(when: datetime | float) -> Callable[[str, Dict], bool]:
+    """``until`` predicate for ``iter_user_activity``: stop at items before ``when``."""
+    cutoff = when.timestamp() if isinstance(when, datetime) else float(when)
+    return lambda kind, item: item["created_utc"] < cutoff
+
+
+def tokens_exceed(budget: int) -> Callable[[str, Dict], bool]:
+    """``stop`` predicate for ``iter_user_activity``: stop once ``budget`` tokens were yielded."""
+    seen = 0
+
+    def stop(kind: str, item: Dict) -> bool:
+        nonlocal seen
+        seen += estimate_tokens(item["text"])
+        return seen >= budget
+
+    return stop
+
+
+def iter_user_activity(
+    username: str,
+    limit: int = 30,
+    until: Callable[[str, Dict], bool] | None = None,
+    stop: Callable[[str, Dict], bool] | None = None,
+) -> Iterator[Tuple[str, Dict[str, str]]]:
+    """
+    Stream a user's posts and comments as their pages arrive.
+
+    The submissions and comments listings are fetched concurrently, each on
+    a credential borrowed from the Reddit scheduler, and items are yielded
+    as ``("posts" | "comments", item)`` in arrival order (each listing
+    newest first). A listing is only asked for its next page once the
+    consumer has taken the previous one, so stopping early saves requests.
+
+    Parameters
+    ----------
+    username : str
+        Reddit username (without the ``u/`` prefix).
+    limit : int, optional
+        Maximum number of items per listing.
+    until : callable, optional
+        ``until(kind, item)`` ends that listing at the first item for which
+        it is true (the item is not yielded), e.g. ``older_than(start)``.
+    stop : callable, optional
+        ``stop(kind, item)`` is called after each yielded item; when true,
+        both listings stop, e.g. ``tokens_exceed(6000)``.
+
+    Yields
+    ------
+    tuple[str, dict]
+        The listing name and the item dict, as in ``scrape_user_data``.
+    """
+    scheduler = clients.get_reddit_scheduler()
+    buffer: queue.Queue = queue.Queue(maxsize=_ACTIVITY_BUFFER)
+    done = threading.Event()
+
+    def offer(entry) -> bool:
+        while not done.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fetch(kind: str, attribute: str, to_dict) -> None:
+        try:
+            with scheduler.reddit() as reddit:
+                for thing in getattr(reddit.redditor(username), attribute).new(limit=limit):
+                    item = to_dict(thing)
+                    if (until and until(kind, item)) or not offer((kind, item)):
+                        break
+        except Exception as e:
+            offer((kind, e))
+        finally:
+            offer((kind, _END))
+
+    for kind, attribute, to_dict in _LISTINGS:
+        threading.Thread(target=fetch, args=(kind, attribute, to_dict), daemon=True).start()
+
+    finished = 0
+    try:
+        while finished < len(_LISTINGS):
+            kind, item = buffer.get()
+            if item is _END:
+                finished += 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield kind, item
+                if stop and stop(kind, item):
+                    return
+    finally:
+        done.set()
+
+
+def _reaches(
+    cache: ScrapeCache, username: str, kind: str, state: ListingState, until: Callable[[str, Dict], bool]
+) -> bool:
+    """True if the contiguous cached part of a listing already goes past ``until``."""
+    if state.depth <= 0:
+        return False
+    items = cache.recent(username, kind, state.depth)
+    return len(items) == state.depth and until(kind, items[-1])
+
+
+def _refresh_listings(
+    username: str, limit: int, until: Callable[[str, Dict], bool] | None = None
+) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """
+    Bring both cached listings up to date and return their newest items.
+
+    If the cache already reaches ``limit`` items deep, only items newer than
+    the cached high-water mark are fetched; PRAW pages lazily, so stopping at
+    the first already-seen item usually costs a single request.
+
+    ``until`` limits the refresh to a window, as in ``iter_user_activity``
+    (e.g. ``older_than(start)``). The cache then also counts as complete
+    when its contiguous items already reach past the window, and only the
+    items inside the window are returned.
+    """
+    cache = _get_scrape_cache()
+    states = {kind: cache.state(username, kind) for kind, _, _ in _LISTINGS}
+    high_water = {
+        kind: state.high_water
+        for kind, state in states.items()
+        if state is not None and (state.covers(limit) or (until and _reaches(cache, username, kind, state, until)))
+    }
+    # The item that ended a listing at the window edge is cached as well, so
+    # the next run can tell from the cache alone that the window is covered.
+    boundary: Dict[str, Dict] = {}
+
+    def seen(kind: str, item: Dict) -> bool:
+        if kind in high_water and item["created_utc"] <= high_water[kind]:
+            return True
+        if until and until(kind, item):
+            boundary[kind] = item
+            return True
+        return False
+
+    fresh: Dict[str, List[Dict[str, str]]] = {kind: [] for kind in states}
+    for kind, item in iter_user_activity(username, limit, until=seen):
+        fresh[kind].append(item)
+
+    for kind, items in fresh.items():
+        if len(items) == limit:
+            # ``limit`` new items without reaching the cached ones leaves a
+            # gap, so only the freshly fetched window is known to be contiguous.
+            depth = limit
+        elif kind in boundary:
+            # The listing goes on past the window; only what was read is known.
+            items = items + [boundary[kind]]
+            depth = len(items)
+        elif kind in high_water:
+            depth = states[kind].depth
+        else:
+            depth = EXHAUSTED
+        cache.merge(username, kind, items, depth)
+
+    posts, comments = cache.recent(username, "posts", limit), cache.recent(username, "comments", limit)
+    if until:
+        posts = [item for item in posts if not until("posts", item)]
+        comments = [item for item in comments if not until("comments", item)]
+    return posts, comments
+
+
+def _get_llm_cache() -> llm_cache.LLMCache:
+    global _llm_cache
+    with _cache_lock:
+        if _llm_cache is None:
+            _llm_cache = llm_cache.LLMCache()
+        return _llm_cache
+
+
+def _generate_text(prompt: str, use_cache: bool = True, generation_config: dict | None = None) -> str:
+    """
+    Run ``prompt`` through Gemini, answering repeats from the response cache.
+
+    Pass ``use_cache=False`` (or set ``LLM_CACHE_DISABLED=1``) to force a
+    fresh call; the fresh response still replaces the cached one.
+    """
+    key = _text_cache_key(prompt, generation_config)
+    if use_cache and llm_cache.ENABLED:
+        cached = _get_llm_cache().get(key)
+        if cached is not None:
+            return cached
+
+    if generation_config:
+        response = clients.get_gemini_model().generate_content(prompt, generation_config=generation_config)
+    else:
+        response = clients.get_gemini_model().generate_content(prompt)
+    metrics.record_gemini_usage(response)
+    text = response.text
+    if llm_cache.ENABLED and text:
+        _get_llm_cache().put(key, clients.gemini_model_name(), text)
+    return text
+
+
+def _text_cache_key(prompt: str, generation_config: dict | None = None) -> str:
+    extra = json.dumps(generation_config, sort_keys=True) if generation_config else ""
+    return llm_cache.cache_key(clients.gemini_model_name(), prompt, extra)
+
+
+def _discard_cached_text(prompt: str, generation_config: dict | None = None) -> None:
+    """Forget a cached response that could not be used (e.g. invalid JSON)."""
+    if llm_cache.ENABLED:
+        _get_llm_cache().delete(_text_cache_key(prompt, generation_config))
+
+
+def _parse_json_response(text: str):
+    """Parse a JSON reply, tolerating markdown-style fences (```json ... ```)."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`")           # removes all backticks
+        text = re.sub(r'^json\n', '', text, flags=re.IGNORECASE)  # remove 'json' if present
+        text = text.strip()
+    return json.loads(text)
+
+
+def llm_cache_stats() -> dict:
+    """Hit/miss counters of the LLM response cache for this process."""
+    return _get_llm_cache().stats() if llm_cache.ENABLED else {}
+
+
 def scrape_user_data(
-    username: str, limit: int = 30
+    username: str,
+    limit: int = 30,
+    use_cache: bool | None = None,
+    until: Callable[[str, Dict], bool] | None = None,
+    source: str = activity_dataset.SCRAPE,
 ) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
     """
     Fetch a user's most recent posts and comments.
@@ -80,74 +431,72 @@ def scrape_user_data(
         Reddit username (without the ``u/`` prefix).
     limit : int, optional
         Maximum number of posts and comments to pull for each type.
+    use_cache : bool, optional
+        Refresh incrementally through the on-disk scrape cache. Defaults to
+        on unless ``SCRAPE_CACHE_DISABLED=1``.
+    until : callable, optional
+        Only fetch items inside a window, e.g. ``older_than(start)``; see
+        ``iter_user_activity``.
+    source : str, optional
+        ``source`` of the ``activity_dataset`` record, so a windowed scrape
+        (``activity_dataset.EVOLUTION``) does not stand in for a persona's.
 
     Returns
     -------
     tuple[list[dict], list[dict]]
-        Two lists containing post dicts and comment dicts respectively.
-    """
-    user = _reddit.redditor(username)
-
-    # posts = [
-    #     {
-    #         "text": f"{submission.title}\n{submission.selftext}",
-    #         "url": f"https://reddit.com{submission.permalink}",
-    #     }
-    #     for submission in user.submissions.new(limit=limit)
-    # ]
-
-    # comments = [
-    #     {
-    #         "text": comment.body,
-    #         "url": f"https://reddit.com{comment.permalink}",
-    #     }
-    #     for comment in user.comments.new(limit=limit)
-    # ]
-    posts = []
-    for submission in user.submissions.new(limit=limit):
-        posts.append({
-            "text": f"{submission.title}\n{submission.selftext}",
-            "url": f"https://reddit.com{submission.permalink}",
-            "created_utc": submission.created_utc,
-            "subreddit": str(submission.subreddit),
-            "score": submission.score,
-            "num_comments": submission.num_comments,
-        })
-
-    comments = []
-    for comment in user.comments.new(limit=limit):
-        comments.append({
-            "text": comment.body,
-            "url": f"https://reddit.com{comment.permalink}",
-            "created_utc": comment.created_utc,
-            "subreddit": str(comment.subreddit),
-            "score": comment.score,
-        })
+        Two lists containing post dicts and comment dicts respectively,
+        newest first.
 
+    Notes
+    -----
+    With ``ACTIVITY_RECORD_PATH`` set the result is also appended to that
+    dataset for later replay (see ``activity_dataset``).
+    """
+    if use_cache is None:
+        use_cache = _SCRAPE_CACHE_ENABLED
+
+    if use_cache:
+        posts, comments = _refresh_listings(username, limit, until)
+    else:
+        fetched: Dict[str, List[Dict[str, str]]] = {kind: [] for kind, _, _ in _LISTINGS}
+        for kind, item in iter_user_activity(username, limit, until=until):
+            fetched[kind].append(item)
+        posts, comments = fetched["posts"], fetched["comments"]
+    activity_dataset.record(username, posts, comments, source=source)
     return posts, comments
 
 
-def generate_persona(posts: List[Dict[str, str]], comments: List[Dict[str, str]]) -> str:
-    """
-    Build a persona description (with citations) via Gemini.
+NO_CONTENT_PERSONA = "No content available to generate a persona."
 
-    Notes
-    -----
-    To keep the token count manageable, the first 50 items are used.
 
-    Returns
-    -------
-    str
-        Formatted persona text.
-    """
-    # Flatten content into prompt snippets
-    snippets = [
-        f"{item['text']}\nSource: {item['url']}" for item in (posts + comments)
-    ][:50]
+def _build_snippets(posts, comments, token_budget: int | None, ranking: str | None) -> List[str]:
+    default_budget = PERSONA_STYLE_TOKEN_BUDGET if PERSONA_STYLE_SUMMARY else PERSONA_TOKEN_BUDGET
+    return select_snippets(
+        posts + comments,
+        token_budget=token_budget or default_budget,
+        ranking=ranking or PERSONA_SNIPPET_RANKING,
+    )
 
-    if not snippets:
-        return "No content available to generate a persona."    
-    prompt = f"""
+
+def _style_block(posts, comments) -> str:
+    """Prompt lines with the local style statistics (``PERSONA_STYLE_SUMMARY=1``), else ``""``."""
+    if not PERSONA_STYLE_SUMMARY:
+        return ""
+    import style_features
+
+    summary = style_features.summarize(style_features.extract_features(posts, comments))
+    if not summary:
+        return ""
+    lines = "\n".join(f"    {line}" for line in summary.splitlines())
+    return f"""
+    Writing-style statistics measured over all of their activity (use them for tone and style):
+{lines}
+"""
+
+
+def _persona_prompt(snippets: List[str], style: str = "") -> str:
+    """Free-text persona prompt shared by ``generate_persona`` and ``stream_persona``."""
+    return f"""
     You are an AI tasked with analyzing a Reddit user's personality based on their recent posts and comments.
 
     Generate a well-formatted TEXT-ONLY persona report (not markdown or HTML). Use plain formatting with:
@@ -168,18 +517,340 @@ def generate_persona(posts: List[Dict[str, str]], comments: List[Dict[str, str]]
     7. 🚫 Limitations
     8. 💬 Representative Quote (optional)
     9. ✅ Goals & Needs (optional)
+{style}
+    Here are their Reddit posts and comments:
+    {'=' * 80}
+    {chr(10).join(snippets)}
+    """
+
+
+def generate_persona(
+    posts: List[Dict[str, str]],
+    comments: List[Dict[str, str]],
+    token_budget: int | None = None,
+    ranking: str | None = None,
+) -> str:
+    """
+    Build a persona description (with citations) via Gemini.
 
+    Notes
+    -----
+    Posts and comments are ranked together and packed into the prompt until
+    ``token_budget`` (default ``PERSONA_TOKEN_BUDGET``) is reached; long
+    bodies are truncated and near-duplicates dropped. ``ranking`` is one of
+    ``snippets.RANKINGS`` (default ``PERSONA_SNIPPET_RANKING``).
+
+    Returns
+    -------
+    str
+        Formatted persona text.
+    """
+    snippets = _build_snippets(posts, comments, token_budget, ranking)
+
+    if not snippets:
+        return NO_CONTENT_PERSONA
+    prompt = _persona_prompt(snippets, _style_block(posts, comments))
+
+    return _generate_text(prompt)
+
+
+def generate_persona_structured(
+    posts: List[Dict[str, str]],
+    comments: List[Dict[str, str]],
+    token_budget: int | None = None,
+    ranking: str | None = None,
+) -> dict | None:
+    """
+    Build persona sections and MBTI / Big Five in one schema-constrained call.
+
+    Returns
+    -------
+    dict | None
+        ``{"sections": [{"key", "insights": [{"text", "source"}]}], "MBTI",
+        "BigFive"}``, or ``None`` if there is no content or the reply could
+        not be parsed.
+    """
+    snippets = _build_snippets(posts, comments, token_budget, ranking)
+    if not snippets:
+        return None
+
+    prompt = _structured_prompt(snippets, _style_block(posts, comments))
+    generation_config = {
+        "response_mime_type": "application/json",
+        "response_schema": _PERSONA_SCHEMA,
+    }
+
+    raw = None
+    try:
+        raw = _generate_text(prompt, generation_config=generation_config)
+        data = _parse_json_response(raw)
+        if not isinstance(data.get("sections"), list):
+            raise ValueError("missing sections")
+        return data
+    except Exception as e:
+        print("⚠️ Gemini structured persona failed:", e)
+        print("📝 Raw response was:", raw)
+        _discard_cached_text(prompt, generation_config)
+        return None
+
+
+def _structured_prompt(snippets: List[str], style: str = "") -> str:
+    """Prompt for ``generate_persona_structured`` (answered as ``_PERSONA_SCHEMA`` JSON)."""
+    section_list = "\n".join(
+        f"    - {key}: {emoji} {title}" for key, emoji, title in PERSONA_SECTIONS
+    )
+    return f"""
+    You are an AI tasked with analyzing a Reddit user's personality based on their recent posts and comments.
+
+    Return a JSON object with:
+    - "sections": one entry per section below, using the given key. Each
+      entry has "insights": short observations, each with the "source" URL
+      of the post or comment it is based on. Omit optional sections
+      (profession, leanings, quote, goals) when there is no evidence.
+    - "MBTI": the most likely MBTI type, e.g. "INTP".
+    - "BigFive": scores between 0 and 1 for {", ".join(BIG_FIVE_TRAITS)}.
+
+    Section keys:
+{section_list}
+{style}
     Here are their Reddit posts and comments:
     {'=' * 80}
     {chr(10).join(snippets)}
     """
 
-    response = _GEMINI_MODEL.generate_content(prompt)
-    return response.text 
 
-def save_persona(username: str, persona: str, posts: List[dict], comments: List[dict]) -> None:
+def render_persona_text(data: dict) -> str:
+    """
+    Render structured persona JSON as the plain-text report format.
+
+    The output uses the same emoji headers and ``Source:`` citation lines
+    as the free-text prompt, so ``parse_persona_to_json`` and
+    ``convert_to_markdown`` work on it unchanged.
+    """
+    by_key = {section.get("key"): section for section in data.get("sections", [])}
+    blocks = []
+    for key, emoji, title in PERSONA_SECTIONS:
+        insights = by_key.get(key, {}).get("insights") or []
+        if not insights:
+            continue
+        header = f"{emoji} {title}"
+        lines = [header, "-" * len(header)]
+        for insight in insights:
+            lines.append(f"• {insight.get('text', '').strip()}")
+            if insight.get("source"):
+                lines.append(f"  Source: {insight['source'].strip()}")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def build_persona(
+    posts: List[Dict[str, str]],
+    comments: List[Dict[str, str]],
+    structured: bool | None = None,
+) -> Tuple[str, dict]:
+    """
+    Return ``(persona_text, frameworks)`` for a user's activity.
+
+    In structured mode (default, see ``PERSONA_STRUCTURED``) both come from
+    a single Gemini call; if that reply is unusable this falls back to
+    ``generate_persona`` followed by ``map_to_frameworks``.
+    """
+    if structured is None:
+        structured = PERSONA_STRUCTURED
+
+    if structured:
+        data = generate_persona_structured(posts, comments)
+        if data is not None:
+            frameworks = {"MBTI": data.get("MBTI"), "BigFive": data.get("BigFive", {})}
+            return render_persona_text(data), frameworks
+
+    persona = generate_persona(posts, comments)
+    if persona == NO_CONTENT_PERSONA:
+        return persona, {}
+    return persona, map_to_frameworks(persona)
+
+
+def generation_fingerprint() -> str:
+    """
+    Hash of everything besides the activity itself that shapes ``build_persona``.
+
+    Covers the Gemini model, ``PERSONA_STRUCTURED``, the snippet budgets and
+    ranking, the style summary switch, the response schema and the prompt
+    templates, so caches of generated personas (``track_evolution``'s month
+    cache) can tell a result made under other settings from a current one.
+    """
+    settings = [
+        clients.gemini_model_name(),
+        PERSONA_STRUCTURED,
+        PERSONA_TOKEN_BUDGET,
+        PERSONA_SNIPPET_RANKING,
+        PERSONA_STYLE_SUMMARY,
+        PERSONA_STYLE_TOKEN_BUDGET,
+        _PERSONA_SCHEMA,
+        _persona_prompt(["{snippets}"], "{style}"),
+        _structured_prompt(["{snippets}"], "{style}"),
+        _frameworks_prompt("{persona}"),
+    ]
+    return hashlib.sha256(json.dumps(settings, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class PersonaStreamParser:
+    """
+    Incrementally split streamed persona text into sections.
+
+    ``feed`` takes raw text chunks (which may end mid-line) and returns the
+    sections completed by them as ``(key, text)`` pairs; a section is
+    complete once the next header arrives. ``close`` returns the last one.
+    Text before the first header is returned with key ``None``.
+    """
+
+    def __init__(self):
+        self._partial = ""
+        self._key: str | None = None
+        self._lines: List[str] = []
+
+    def _take_line(self, line: str) -> List[Tuple[str | None, str]]:
+        key = header_key(line)
+        if key is None:
+            self._lines.append(line)
+            return []
+        done = self._flush()
+        self._key, self._lines = key, [line.strip()]
+        return done
+
+    def _flush(self) -> List[Tuple[str | None, str]]:
+        text = "\n".join(self._lines).strip()
+        return [(self._key, text)] if text else []
+
+    def feed(self, chunk: str) -> List[Tuple[str | None, str]]:
+        *lines, self._partial = (self._partial + chunk).split("\n")
+        done: List[Tuple[str | None, str]] = []
+        for line in lines:
+            done.extend(self._take_line(line))
+        return done
+
+    def close(self) -> List[Tuple[str | None, str]]:
+        done = self._take_line(self._partial) if self._partial else []
+        self._partial = ""
+        done.extend(self._flush())
+        self._lines = []
+        return done
+
+
+def stream_persona(
+    posts: List[Dict[str, str]],
+    comments: List[Dict[str, str]],
+    token_budget: int | None = None,
+    ranking: str | None = None,
+) -> Iterator[Tuple[str | None, str]]:
+    """
+    Stream a free-text persona, yielding ``(key, section_text)`` as each
+    section completes.
+
+    Uses the same prompt as ``generate_persona``. A cached response is
+    replayed immediately; a fresh one is cached once the stream finishes.
+    """
+    snippets = _build_snippets(posts, comments, token_budget, ranking)
+    if not snippets:
+        yield None, NO_CONTENT_PERSONA
+        return
+
+    prompt = _persona_prompt(snippets, _style_block(posts, comments))
+    parser = PersonaStreamParser()
+    key = _text_cache_key(prompt)
+    cached = _get_llm_cache().get(key) if llm_cache.ENABLED else None
+    if cached is not None:
+        yield from parser.feed(cached)
+        yield from parser.close()
+        return
+
+    chunks: List[str] = []
+    chunk = None
+    for chunk in clients.get_gemini_model().generate_content(prompt, stream=True):
+        text = chunk.text or ""
+        chunks.append(text)
+        yield from parser.feed(text)
+    yield from parser.close()
+    if chunk is not None:
+        # The last chunk carries the usage totals for the whole stream.
+        metrics.record_gemini_usage(chunk)
+
+    if llm_cache.ENABLED and chunks:
+        _get_llm_cache().put(key, clients.gemini_model_name(), "".join(chunks))
+
+
+def save_persona_streaming(
+    username: str,
+    sections: Iterable[Tuple[str | None, str]],
+    posts: List[dict],
+    comments: List[dict],
+    frameworks: dict | None = None,
+    on_section: Callable[[str | None, str], None] | None = None,
+    snapshot: bool = False,
+) -> Tuple[str, Dict[str, str]]:
+    """
+    Write .txt and .md progressively as ``sections`` arrive, then the .json.
+
+    Each section is appended and flushed to disk as soon as it is yielded
+    (e.g. by ``stream_persona``) and handed to ``on_section`` for display.
+    The .json needs the whole persona, so it is written at the end. Stores
+    without a local path (S3) get the .txt/.md in one put once complete.
+    ``snapshot`` is as in ``save_persona``.
+
+    Returns
+    -------
+    tuple[str, dict[str, str]]
+        The full persona text and the written locations keyed by format.
+    """
+    store = artifact_store.get_store()
+    txt_key = artifact_store.persona_key(username, "persona.txt")
+    md_key = artifact_store.persona_key(username, "persona.md")
+    txt_path, md_path = store.local_path(txt_key), store.local_path(md_key)
+    parts: List[str] = []
+
+    if txt_path and md_path:
+        txt_handle = open(txt_path, "w", encoding="utf-8")
+        md_handle = open(md_path, "w", encoding="utf-8")
+    else:
+        txt_handle, md_handle = io.StringIO(), io.StringIO()
+
+    with txt_handle, md_handle:
+        txt_handle.write(f"👤 Reddit Username: {username}\n\n")
+        md_handle.write(f"# 👤 Reddit Username: {username}\n\n")
+        for key, text in sections:
+            parts.append(text)
+            txt_handle.write(f"{text}\n\n")
+            md_handle.write(f"{convert_to_markdown(text)}\n\n")
+            txt_handle.flush()
+            md_handle.flush()
+            if on_section is not None:
+                on_section(key, text)
+        if not (txt_path and md_path):
+            txt_path = store.put(txt_key, txt_handle.getvalue().encode("utf-8"))
+            md_path = store.put(md_key, md_handle.getvalue().encode("utf-8"))
+
+    persona = "\n\n".join(parts)
+    json_file = _write_persona_json(username, persona, posts, comments, frameworks, snapshot=snapshot)
+    print(f"✅ Persona saved as: {txt_path}, {md_path}, {json_file}")
+    return persona, {"txt": txt_path, "md": md_path, "json": json_file}
+
+def save_persona(
+    username: str,
+    persona: str,
+    posts: List[dict],
+    comments: List[dict],
+    frameworks: dict | None = None,
+    raw_data_ref: str | None = None,
+    snapshot: bool = False,
+) -> Dict[str, str]:
     """
-    Save the generated persona to .txt, .md, and .json formats.
+    Save the generated persona to .txt, .md, and compressed .json formats.
+
+    Files go to the configured ``artifact_store`` under the user's sharded
+    prefix. The scraped posts/comments are stored once, content-addressed,
+    and referenced from the JSON as ``raw_data_ref``. The user's summary
+    row in ``persona_index`` and their contribution to the per-subreddit
+    ``subreddit_norms`` are updated too, unless ``snapshot`` is set.
 
     Parameters
     ----------
@@ -187,38 +858,86 @@ def save_persona(username: str, persona: str, posts: List[dict], comments: List[
         Reddit username.
     persona : str
         Full text of the persona generated by Gemini.
+    frameworks : dict, optional
+        Precomputed MBTI / Big Five mapping. When omitted it is requested
+        from Gemini via ``map_to_frameworks``.
+    raw_data_ref : str, optional
+        Reference returned by ``artifact_store.put_raw_activity`` when the
+        caller already stored a superset of ``posts``/``comments`` (e.g.
+        ``track_evolution`` stores the full scrape once for every month).
+    snapshot : bool, optional
+        The persona is not the user's current one (``track_evolution``'s
+        monthly personas, ``replay`` runs): skip ``persona_index`` and
+        ``subreddit_norms``, and mark the JSON so their ``rebuild`` skips
+        it as well.
+
+    Returns
+    -------
+    dict[str, str]
+        Locations of the written files keyed by format (``txt``, ``md``,
+        ``json``): local paths, or ``s3://`` URLs for an S3 store.
     """
-    txt_file = f"{username}_persona.txt"
-    md_file = f"{username}_persona.md"
-    json_file = f"{username}_persona.json"
+    store = artifact_store.get_store()
+    tree = parse_persona(persona)  # one pass feeds all three formats
 
     # Save .json
-    structured = {
-    "username": username,
-    "generated_at": datetime.utcnow().isoformat() + "Z",
-    "persona": parse_persona_to_json(persona),
-    "personality_frameworks": map_to_frameworks(persona),
-    "raw_data": {
-        "posts": posts,       # <-- include scraped posts
-        "comments": comments  # <-- include scraped comments
-    }
-    }
-
-
-    with open(json_file, "w", encoding="utf-8") as json_handle:
-        json.dump(structured, json_handle, indent=2, ensure_ascii=False)
+    json_file = _write_persona_json(
+        username, persona, posts, comments, frameworks, tree=tree, raw_data_ref=raw_data_ref,
+        snapshot=snapshot,
+    )
 
     # Save .txt
-    with open(txt_file, "w", encoding="utf-8") as txt_handle:
-        txt_handle.write(f"👤 Reddit Username: {username}\n\n{persona}")
+    txt_file = store.put(
+        artifact_store.persona_key(username, "persona.txt"),
+        f"👤 Reddit Username: {username}\n\n{persona}".encode("utf-8"),
+    )
 
     # Save .md
-    markdown_version = convert_to_markdown(persona)
-    with open(md_file, "w", encoding="utf-8") as md_handle:
-        md_handle.write(f"# 👤 Reddit Username: {username}\n\n{markdown_version}")
+    markdown_version = tree.to_markdown()
+    md_file = store.put(
+        artifact_store.persona_key(username, "persona.md"),
+        f"# 👤 Reddit Username: {username}\n\n{markdown_version}".encode("utf-8"),
+    )
 
     print(f"✅ Persona saved as: {txt_file}, {md_file}, {json_file}")
+    return {"txt": txt_file, "md": md_file, "json": json_file}
+
+
+def _write_persona_json(
+    username: str,
+    persona: str,
+    posts: List[dict],
+    comments: List[dict],
+    frameworks: dict | None,
+    tree: PersonaTree | None = None,
+    raw_data_ref: str | None = None,
+    snapshot: bool = False,
+) -> str:
+    import style_features
+
+    tree = tree if tree is not None else parse_persona(persona)
+    if frameworks is None:
+        # Nothing to map for a user without content (as in build_persona).
+        frameworks = {} if persona == NO_CONTENT_PERSONA else map_to_frameworks(persona)
+    structured = {
+    "username": username,
+    "generated_at": datetime.utcnow().isoformat() + "Z",
+    "persona": tree.to_json(),
+    "personality_frameworks": frameworks,
+    # Stylometrics computed locally (style_features.py), no LLM involved.
+    "style": style_features.extract_features(posts, comments),
+    # Scraped posts/comments, stored once: artifact_store.load_raw_activity(ref)
+    "raw_data_ref": raw_data_ref or artifact_store.put_raw_activity(posts, comments),
+    }
+    if snapshot:
+        structured["snapshot"] = True
 
+    key = artifact_store.persona_key(username, "persona" + artifact_store.json_extension())
+    location = artifact_store.put_json(key, structured)
+    if not snapshot:
+        persona_index.get_index().add(structured, location)
+        subreddit_norms.get_norms().add(structured, posts, comments)
+    return location
 
 def convert_to_markdown(text: str) -> str:
     """
@@ -238,36 +957,14 @@ def convert_to_markdown(text: str) -> str:
     str
         A Markdown-formatted version of the persona.
     """
-    lines = text.splitlines()
-    md_lines: list[str] = []
-
-    section_emojis = (
-        "🎯", "🤔", "🗣️", "👨‍🎓", "😂", "🌎", "🚫", "💬", "✅"
-    )
-
-    for line in lines:
-        stripped = line.strip()
-
-        if any(stripped.startswith(emoji) for emoji in section_emojis):
-            md_lines.append(f"## {stripped}")
-        elif "Source:" in line:
-            parts = line.split("Source:")
-            text_part = parts[0].strip()
-            url_part = parts[1].strip()
-            md_lines.append(
-                f"- {text_part}  \n  **Source:** [{url_part}]({url_part})"
-            )
-        else:
-            md_lines.append(line)
-
-    return "\n".join(md_lines)
+    return parse_persona(text).to_markdown()
 
 def score_by_citations(text: str) -> float:
     """
     Simple heuristic: More citations = higher confidence.
-    Base score is 0.5, and each citation adds 0.1, capped at 1.0.
+    Base score is 0.5, and each ``Source:`` line adds 0.1, capped at 1.0.
     """
-    count = text.count("Citation:")
+    count = parse_persona(text).citation_count()
     return min(1.0, 0.5 + 0.1 * count)
 
 
@@ -280,52 +977,7 @@ def parse_persona_to_json(text: str) -> dict:
     dict
         Structured version of the persona with "value" and "confidence" per section.
     """
-    sections = {
-        "🎯": "interests",
-        "🤔": "personality_traits",
-        "🗣️": "tone_of_writing",
-        "👨‍🎓": "profession_or_education",
-        "😂": "humor_or_style",
-        "🌎": "political_or_social_leanings",
-        "🚫": "limitations",
-        "💬": "representative_quote",
-        "✅": "goals_and_needs",
-    }
-
-    output = {}
-    current_section = None
-    buffer = []
-
-    lines = text.splitlines()
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-
-        for emoji, key in sections.items():
-            if line.startswith(emoji):
-                # Save previous section if applicable
-                if current_section and buffer:
-                    section_text = "\n".join(buffer).strip()
-                    output[current_section] = {
-                        "value": section_text,
-                        "confidence": round(score_by_citations(section_text), 2)
-                    }
-                current_section = key
-                buffer = [line]
-                break
-        else:
-            buffer.append(line)
-
-    # Save the last section
-    if current_section and buffer:
-        section_text = "\n".join(buffer).strip()
-        output[current_section] = {
-            "value": section_text,
-            "confidence": round(score_by_citations(section_text), 2)
-        }
-
-    return output
+    return parse_persona(text).to_json()
 
 def map_to_frameworks(persona_text: str) -> dict:
     """
@@ -335,7 +987,21 @@ def map_to_frameworks(persona_text: str) -> dict:
     -------
     dict with keys: "MBTI", "BigFive", or {} on failure
     """
-    prompt = f"""
+    prompt = _frameworks_prompt(persona_text)
+
+    raw = None
+    try:
+        raw = _generate_text(prompt)
+        return _parse_json_response(raw)
+    except Exception as e:
+        print("⚠️ Gemini framework mapping failed:", e)
+        print("📝 Raw response was:", raw)
+        _discard_cached_text(prompt)
+        return {}
+
+
+def _frameworks_prompt(persona_text: str) -> str:
+    return f"""
     Analyze the following Reddit user persona and map it to psychological frameworks.
 
     Return only a JSON object in the format:
@@ -356,19 +1022,3 @@ def map_to_frameworks(persona_text: str) -> dict:
     ----------------
     {persona_text}
     """
-
-    try:
-        response = _GEMINI_MODEL.generate_content(prompt)
-        text = response.text.strip()
-         # Remove markdown-style fences (e.g. ```json ... ```)
-        if text.startswith("```"):
-            text = text.strip("`")           # removes all backticks
-            text = re.sub(r'^json\n', '', text, flags=re.IGNORECASE)  # remove 'json' if present
-            text = text.strip()
-        return json.loads(text)
-    except Exception as e:
-        print("⚠️ Gemini framework mapping failed:", e)
-        print("📝 Raw response was:", response.text)
-        return {}
-
-
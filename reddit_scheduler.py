@@ -0,0 +1,263 @@
+"""
+Rate-limit-aware scheduling of Reddit API requests over a credential pool.
+
+With a single ``praw.Reddit`` every scrape shares one OAuth client's budget,
+and PRAW's built-in limiter spaces *all* requests out to fit it, so one
+credential caps how many users a worker can process per minute.
+
+``RedditScheduler`` holds one ``praw.Reddit`` per credential and replaces
+each one's PRAW limiter with a token bucket:
+
+* The bucket is refilled at the rate the ``X-Ratelimit-Remaining`` /
+  ``X-Ratelimit-Reset`` headers allow (the remaining budget spread over the
+  time left in the window) and allows short bursts of ``REDDIT_BURST``.
+  At zero remaining it blocks until the window resets.
+* ``scheduler.reddit()`` lends out the credential with the most headroom
+  (tokens minus scrapes already in flight on it); every request made through
+  it then takes a token from that credential's bucket. Reservations are
+  made under a lock and the sleep happens outside it, so any number of
+  worker threads can share one scheduler.
+* ``stats()`` reports requests, queueing delay (mean/p50/p99/max) and the
+  last seen budget per credential; requests and delays are also exported
+  through ``metrics``.
+
+Credentials come from ``REDDIT_CREDENTIALS`` (``id:secret,id:secret,...``),
+falling back to ``REDDIT_CLIENT_ID`` / ``REDDIT_CLIENT_SECRET``.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+import metrics
+from env_loader import load_env
+
+load_env()  # the settings below may come from .env
+
+# Reddit's documented budget per OAuth client: 1000 requests per 10 minutes.
+DEFAULT_LIMIT = 1000
+DEFAULT_WINDOW = 600.0
+BURST = int(os.getenv("REDDIT_BURST", "10"))
+USER_AGENT = "persona-generator-script"
+
+# Queueing delays kept for percentiles.
+_DELAY_SAMPLES = 10000
+
+
+@dataclass(frozen=True)
+class Credential:
+    client_id: str
+    client_secret: str
+
+
+def credentials_from_env() -> List[Credential]:
+    """``REDDIT_CREDENTIALS`` pairs, or the single ``REDDIT_CLIENT_ID``/``SECRET``."""
+    pool = []
+    for pair in filter(None, (part.strip() for part in os.getenv("REDDIT_CREDENTIALS", "").split(","))):
+        client_id, _, client_secret = pair.partition(":")
+        pool.append(Credential(client_id, client_secret))
+    if not pool:
+        pool.append(Credential(os.getenv("REDDIT_CLIENT_ID") or "", os.getenv("REDDIT_CLIENT_SECRET") or ""))
+    return pool
+
+
+class TokenBucket:
+    """
+    Token bucket whose refill rate follows the server's rate-limit headers.
+
+    ``reserve`` takes a token immediately, going into debt if none is left,
+    and returns how long the caller must wait for it; concurrent callers
+    are thereby queued in order without holding the lock while they sleep.
+    Requests still in flight when a response's headers arrive are not yet
+    counted by the server, so they are subtracted from its ``remaining``.
+    """
+
+    def __init__(self, rate: float = DEFAULT_LIMIT / DEFAULT_WINDOW, capacity: int = BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.remaining: Optional[int] = None
+        self.used: Optional[int] = None
+        self.pending = 0
+        self._blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return self.tokens if now >= self._blocked_until else self.tokens - (self._blocked_until - now) * self.rate
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            self.pending += 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def settle(self) -> None:
+        """Mark a reserved request as answered (or failed)."""
+        with self._lock:
+            self.pending -= 1
+
+    def update(self, remaining: float, used: int, reset_seconds: float) -> None:
+        """Re-fit the bucket to ``X-Ratelimit-{Remaining,Used,Reset}``."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.remaining, self.used = int(remaining), used
+            reset_seconds = max(reset_seconds, 1.0)
+            remaining -= self.pending
+            if remaining < 1:
+                self._blocked_until = now + reset_seconds
+                self.tokens = min(self.tokens, 0.0)
+                self.rate = max(self.rate, 1.0 / reset_seconds)
+                return
+            self._blocked_until = 0.0
+            self.rate = remaining / reset_seconds
+            self.tokens = min(self.tokens, remaining)
+
+
+class _Slot:
+    """One credential: its PRAW client, bucket and counters."""
+
+    def __init__(self, credential: Credential, reddit_kwargs: dict):
+        self.credential = credential
+        self.bucket = TokenBucket()
+        self.in_flight = 0
+        self.requests = 0
+        self.waited = 0.0
+        self.max_wait = 0.0
+        self.reddit = self._build(reddit_kwargs)
+
+    def _build(self, reddit_kwargs: dict):
+        import praw
+
+        reddit = praw.Reddit(
+            client_id=self.credential.client_id,
+            client_secret=self.credential.client_secret,
+            **{"user_agent": USER_AGENT, **reddit_kwargs},
+        )
+        limiter = _BucketRateLimiter(self)
+        # prawcore sessions consult ``_rate_limiter`` before every request.
+        for core in {id(c): c for c in (reddit._core, reddit._read_only_core, reddit._authorized_core) if c}.values():
+            core._rate_limiter = limiter
+        return reddit
+
+
+class _BucketRateLimiter:
+    """Drop-in for ``prawcore.rate_limit.RateLimiter`` backed by a slot's bucket."""
+
+    def __init__(self, slot: _Slot):
+        self.slot = slot
+        self.scheduler: Optional["RedditScheduler"] = None
+
+    def call(self, *, method, request_function, set_header_callback, url, **kwargs):
+        self.delay()
+        kwargs["headers"] = set_header_callback()
+        try:
+            response = request_function(method, url, **kwargs)
+        except Exception:
+            metrics.REDDIT_PAGES.inc(status="error")
+            raise
+        finally:
+            self.slot.bucket.settle()
+        metrics.REDDIT_PAGES.inc(status=response.status_code)
+        self.update(response_headers=response.headers)
+        return response
+
+    def delay(self) -> None:
+        wait = self.slot.bucket.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        metrics.REDDIT_WAIT_SECONDS.observe(max(wait, 0.0))
+        if self.scheduler is not None:
+            self.scheduler._record(self.slot, wait)
+
+    def update(self, *, response_headers) -> None:
+        if "x-ratelimit-remaining" not in response_headers:
+            return
+        self.slot.bucket.update(
+            float(response_headers["x-ratelimit-remaining"]),
+            int(float(response_headers.get("x-ratelimit-used", 0))),
+            float(response_headers.get("x-ratelimit-reset", DEFAULT_WINDOW)),
+        )
+
+
+class RedditScheduler:
+    """Shares a pool of Reddit credentials between threads, one token bucket each."""
+
+    def __init__(self, credentials: List[Credential] | None = None, **reddit_kwargs):
+        """
+        ``reddit_kwargs`` go to every ``praw.Reddit`` (e.g. ``oauth_url`` and
+        ``reddit_url`` to point the pool at a local fake API).
+        """
+        self._slots = [_Slot(credential, reddit_kwargs) for credential in credentials or credentials_from_env()]
+        for slot in self._slots:
+            slot.reddit._core._rate_limiter.scheduler = self
+        self._lock = threading.Lock()
+        self._delays: deque = deque(maxlen=_DELAY_SAMPLES)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    @contextmanager
+    def reddit(self) -> Iterator:
+        """Lend the ``praw.Reddit`` whose credential has the most headroom."""
+        with self._lock:
+            slot = max(self._slots, key=lambda s: s.bucket.available() - s.in_flight)
+            slot.in_flight += 1
+        try:
+            yield slot.reddit
+        finally:
+            with self._lock:
+                slot.in_flight -= 1
+
+    def _record(self, slot: _Slot, wait: float) -> None:
+        with self._lock:
+            slot.requests += 1
+            slot.waited += wait
+            slot.max_wait = max(slot.max_wait, wait)
+            self._delays.append(wait)
+
+    def stats(self) -> Dict[str, object]:
+        """Request counts and queueing delay, overall and per credential."""
+        with self._lock:
+            delays = sorted(self._delays)
+            slots = [
+                {
+                    "client_id": slot.credential.client_id,
+                    "requests": slot.requests,
+                    "in_flight": slot.in_flight,
+                    "wait_total_s": round(slot.waited, 3),
+                    "wait_max_s": round(slot.max_wait, 3),
+                    "remaining": slot.bucket.remaining,
+                    "used": slot.bucket.used,
+                }
+                for slot in self._slots
+            ]
+
+        def pct(p: float) -> float:
+            return delays[min(len(delays) - 1, int(len(delays) * p / 100))] if delays else 0.0
+
+        return {
+            "requests": sum(slot["requests"] for slot in slots),
+            "wait_mean_s": sum(delays) / len(delays) if delays else 0.0,
+            "wait_p50_s": pct(50),
+            "wait_p99_s": pct(99),
+            "wait_max_s": delays[-1] if delays else 0.0,
+            "credentials": slots,
+        }
@@ -0,0 +1,77 @@
+"""
+When to regenerate a user's persona, and whether anything changed.
+
+Processed users come back to the queue at ``next_refresh_at`` (see
+``sql/claim_usernames.sql``) instead of never. The worker then:
+
+1. probes one page of each listing; if nothing is newer than the stored
+   ``newest_created_utc`` the user is rescheduled without a full scrape;
+2. otherwise scrapes and compares the ``content_fingerprint`` of what the
+   persona would be built from; only a changed fingerprint reaches Gemini.
+
+The next refresh is half the user's quiet time (time since their newest
+item), clamped to ``REFRESH_MIN_SECONDS`` .. ``REFRESH_MAX_SECONDS``: users
+who posted today are looked at again tomorrow, dormant ones monthly.
+
+A user that fails, on its first run or a refresh, is retried after
+``REFRESH_RETRY_SECONDS`` (15 minutes), doubling with every consecutive
+failure up to ``REFRESH_MAX_SECONDS``, so a user whose scrape keeps failing
+does not come straight back to the queue; ``worker.MAX_FAILURES`` in a row
+park it.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from persona_utils import iter_user_activity
+
+REFRESH_MIN_SECONDS = int(os.getenv("REFRESH_MIN_SECONDS", str(24 * 3600)))
+REFRESH_MAX_SECONDS = int(os.getenv("REFRESH_MAX_SECONDS", str(30 * 24 * 3600)))
+REFRESH_RETRY_SECONDS = int(os.getenv("REFRESH_RETRY_SECONDS", str(15 * 60)))
+
+
+def content_fingerprint(posts: List[Dict], comments: List[Dict]) -> str:
+    """
+    Hash the content a persona is built from.
+
+    Like ``track_evolution.month_cache_key`` this only uses fields that do
+    not drift on their own (scores and comment counts do), so an unchanged
+    fingerprint means the same prompt.
+    """
+    content = sorted((item["url"], item["text"], item["created_utc"]) for item in posts + comments)
+    return hashlib.sha256(json.dumps(content, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def newest_created_utc(posts: List[Dict], comments: List[Dict]) -> Optional[float]:
+    return max((item["created_utc"] for item in posts + comments), default=None)
+
+
+def has_new_activity(username: str, newest: float) -> bool:
+    """One-item page per listing: has the user posted since ``newest``?"""
+    def seen(kind: str, item: Dict) -> bool:
+        return item["created_utc"] <= newest
+
+    for _ in iter_user_activity(username, limit=1, until=seen):
+        return True
+    return False
+
+
+def next_refresh_at(newest: Optional[float], now: Optional[float] = None) -> datetime:
+    """Schedule the next look at a user from how recently they were active."""
+    now = time.time() if now is None else now
+    quiet = now - newest if newest is not None else REFRESH_MAX_SECONDS
+    delay = min(REFRESH_MAX_SECONDS, max(REFRESH_MIN_SECONDS, quiet / 2))
+    return datetime.fromtimestamp(now, timezone.utc) + timedelta(seconds=delay)
+
+
+def retry_refresh_at(failures: int, now: Optional[float] = None) -> datetime:
+    """Schedule the retry of a failed user; ``failures`` counts the earlier consecutive ones."""
+    now = time.time() if now is None else now
+    delay = min(REFRESH_MAX_SECONDS, REFRESH_RETRY_SECONDS * 2 ** min(failures, 32))
+    return datetime.fromtimestamp(now, timezone.utc) + timedelta(seconds=delay)
@@ -0,0 +1,182 @@
+"""
+Regenerate personas from a recorded activity dataset, without Reddit.
+
+Reads the newest record per user from a file written with
+``ACTIVITY_RECORD_PATH`` (see ``activity_dataset``) and runs generation and
+saving for each one in parallel, so a prompt or parser change can be tried
+on a fixed set of users and compared run to run.
+
+    $ python replay.py activity.jsonl.gz --workers 8
+    $ python replay.py activity.jsonl.gz --users alice bob --evolution 3
+
+Personas are saved as snapshots to their own store (``--store``, else
+``REPLAY_STORE``, else ``<dataset>.personas``), leaving the production
+store, persona index and subreddit norms untouched.
+
+Every finished user is appended to a progress file (default
+``<dataset>.progress.jsonl``); an interrupted run picks up where it stopped,
+and ``--restart`` starts over.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Dict, Set
+
+import activity_dataset
+import metrics
+from persona_utils import build_persona, save_persona
+
+DEFAULT_WORKERS = int(os.getenv("REPLAY_WORKERS", "4"))
+
+_progress_lock = threading.Lock()
+
+
+def load_done(progress_path: str) -> Set[str]:
+    """Users the progress file already records as processed."""
+    done: Set[str] = set()
+    if not os.path.exists(progress_path):
+        return done
+    with open(progress_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if entry.get("status") == "processed":
+                done.add(entry["username"].lower())
+    return done
+
+
+def _write_progress(progress_path: str, entry: Dict) -> None:
+    with _progress_lock, open(progress_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def replay_user(entry: Dict, evolution_months: int = 0) -> None:
+    """Generate and save one recorded user's persona (or monthly personas)."""
+    username, posts, comments = entry["username"], entry["posts"], entry["comments"]
+    if evolution_months:
+        # Imported here: track_evolution pulls in the artifact store.
+        from track_evolution import track_evolution
+
+        recorded_at = datetime.fromtimestamp(entry["scraped_at"], timezone.utc)
+        # Bypass the month cache: a replay is how prompt and parser changes
+        # are tried, so closed months must be generated again.
+        failed = track_evolution(
+            username, evolution_months, activity=(posts, comments), now=recorded_at, use_cache=False
+        )
+        if failed:
+            raise RuntimeError(
+                f"{len(failed)} months failed: "
+                + "; ".join(f"{label}: {error}" for label, error in sorted(failed.items()))
+            )
+        return
+    persona, frameworks = build_persona(posts, comments)
+    if not persona:
+        raise RuntimeError("Gemini returned no persona")
+    save_persona(username, persona, posts, comments, frameworks=frameworks, snapshot=True)
+
+
+def _run(entry: Dict, evolution_months: int, progress_path: str) -> bool:
+    started = time.perf_counter()
+    progress = {"username": entry["username"], "status": "processed"}
+    try:
+        replay_user(entry, evolution_months)
+    except Exception as e:
+        progress.update(status="failed", error=f"{type(e).__name__}: {e}")
+        print(f"❌ {entry['username']}: {e}")
+    progress["seconds"] = round(time.perf_counter() - started, 3)
+    _write_progress(progress_path, progress)
+    return progress["status"] == "processed"
+
+
+def replay(
+    dataset: str,
+    workers: int = DEFAULT_WORKERS,
+    progress_path: str | None = None,
+    restart: bool = False,
+    users: Set[str] | None = None,
+    evolution_months: int = 0,
+    store: str | None = None,
+) -> Dict[str, int]:
+    """
+    Regenerate every user in ``dataset`` that the progress file has not seen.
+
+    Records are streamed and at most ``2 * workers`` are held in memory, so
+    the dataset can be much larger than RAM. Personas go to ``store`` (see
+    ``activity_dataset.use_replay_store``). With ``evolution_months`` a
+    user's recorded evolution window is preferred over their persona scrape.
+
+    Returns
+    -------
+    dict
+        ``processed``, ``failed`` and ``skipped`` counts for this run.
+    """
+    progress_path = progress_path or f"{dataset}.progress.jsonl"
+    activity_dataset.use_replay_store(dataset, store)
+    sources = (activity_dataset.SCRAPE,)
+    if evolution_months:
+        sources = (activity_dataset.EVOLUTION,) + sources
+    if restart and os.path.exists(progress_path):
+        os.remove(progress_path)
+    done = load_done(progress_path)
+    wanted = {user.lower() for user in users} if users else None
+
+    counts = {"processed": 0, "failed": 0, "skipped": 0}
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="replay") as pool:
+        for entry in activity_dataset.iter_latest(dataset, sources):
+            name = entry["username"].lower()
+            if wanted is not None and name not in wanted:
+                continue
+            if name in done:
+                counts["skipped"] += 1
+                continue
+            if len(in_flight) >= 2 * workers:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    counts["processed" if future.result() else "failed"] += 1
+            in_flight.add(pool.submit(_run, entry, evolution_months, progress_path))
+        for future in wait(in_flight).done:
+            counts["processed" if future.result() else "failed"] += 1
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("dataset", help="file written with ACTIVITY_RECORD_PATH (.jsonl or .jsonl.gz)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="users generated in parallel")
+    parser.add_argument("--progress", help="progress file (default: <dataset>.progress.jsonl)")
+    parser.add_argument("--restart", action="store_true", help="ignore earlier progress and redo every user")
+    parser.add_argument("--users", nargs="+", help="only these users")
+    parser.add_argument("--evolution", type=int, default=0, metavar="MONTHS",
+                        help="monthly personas over MONTHS before each recording instead of one persona")
+    parser.add_argument("--store", metavar="DIR_OR_URL",
+                        help="where the personas go (default: REPLAY_STORE or <dataset>.personas)")
+    args = parser.parse_args()
+
+    print(f"🔁 Replaying {args.dataset} with {args.workers} workers...\n")
+    started = time.perf_counter()
+    counts = replay(
+        args.dataset,
+        workers=args.workers,
+        progress_path=args.progress,
+        restart=args.restart,
+        users=set(args.users) if args.users else None,
+        evolution_months=args.evolution,
+        store=args.store,
+    )
+    elapsed = time.perf_counter() - started
+    print(
+        f"\n✅ {counts['processed']} processed, {counts['failed']} failed, "
+        f"{counts['skipped']} already done in {elapsed:.1f}s "
+        f"(Gemini tokens: {metrics.GEMINI_TOKENS.value(kind='prompt'):.0f} prompt, "
+        f"{metrics.GEMINI_TOKENS.value(kind='response'):.0f} response)"
+    )
@@ -0,0 +1,126 @@
+"""
+Persistent per-user cache of scraped Reddit activity.
+
+Reddit listings are newest-first, so once we have seen a user's activity up
+to some ``created_utc`` (the high-water mark) a refresh only has to page
+until it reaches an item at or below that mark; everything older is already
+on disk. ``persona_utils.scrape_user_data`` uses this to turn a full re-scrape
+into a single API page for users who have posted little since last time.
+
+The cache is one SQLite file (``SCRAPE_CACHE_PATH``, default
+``.cache/scrape_cache.sqlite3``) shared by every process on the host.
+Items are stored as the same dicts ``scrape_user_data`` returns, keyed by
+their permalink, so re-fetched items (e.g. with a new score) overwrite the
+old copy.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from env_loader import load_env
+
+load_env()  # the settings below may come from .env
+
+CACHE_PATH = os.getenv("SCRAPE_CACHE_PATH", os.path.join(".cache", "scrape_cache.sqlite3"))
+
+# ``depth`` value meaning the whole listing has been read.
+EXHAUSTED = -1
+
+_SCHEMA = """
+create table if not exists items (
+    username    text not null,
+    kind        text not null,
+    url         text not null,
+    created_utc real not null,
+    data        text not null,
+    primary key (username, kind, url)
+);
+create index if not exists items_recent on items (username, kind, created_utc desc);
+create table if not exists listings (
+    username     text not null,
+    kind         text not null,
+    high_water   real not null,
+    depth        integer not null,
+    refreshed_at real not null,
+    primary key (username, kind)
+);
+"""
+
+
+@dataclass
+class ListingState:
+    """How much of one user listing ("posts" or "comments") is cached."""
+
+    high_water: float
+    depth: int
+    refreshed_at: float
+
+    def covers(self, limit: int) -> bool:
+        """True if the cached listing reaches at least ``limit`` items deep."""
+        return self.depth == EXHAUSTED or self.depth >= limit
+
+
+class ScrapeCache:
+    """SQLite-backed store of scraped posts/comments per user."""
+
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("pragma journal_mode=wal")
+        return conn
+
+    def state(self, username: str, kind: str) -> Optional[ListingState]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "select high_water, depth, refreshed_at from listings"
+                " where username = ? and kind = ?",
+                (username.lower(), kind),
+            ).fetchone()
+        return ListingState(*row) if row else None
+
+    def merge(self, username: str, kind: str, items: Iterable[Dict], depth: int) -> None:
+        """Upsert freshly fetched items and record the new listing state."""
+        username = username.lower()
+        rows = [
+            (username, kind, item["url"], item["created_utc"], json.dumps(item, ensure_ascii=False))
+            for item in items
+        ]
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "insert or replace into items (username, kind, url, created_utc, data)"
+                " values (?, ?, ?, ?, ?)",
+                rows,
+            )
+            # One write statement (no read first): a read would pin a WAL
+            # snapshot and the later write would fail with "database is
+            # locked" instead of waiting for concurrent writers.
+            conn.execute(
+                "insert or replace into listings (username, kind, high_water, depth, refreshed_at)"
+                " values (?, ?, (select coalesce(max(created_utc), 0) from items"
+                " where username = ? and kind = ?), ?, ?)",
+                (username, kind, username, kind, depth, time.time()),
+            )
+
+    def recent(self, username: str, kind: str, limit: int) -> List[Dict]:
+        """Return the newest ``limit`` cached items, newest first."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "select data from items where username = ? and kind = ?"
+                " order by created_utc desc limit ?",
+                (username.lower(), kind, limit),
+            ).fetchall()
+        return [json.loads(data) for (data,) in rows]
@@ -0,0 +1,141 @@
+"""
+Token-budgeted selection of prompt snippets for persona generation.
+
+``generate_persona`` used to format every post and comment and keep the
+first 50, so posts always crowded out comments and one long selftext could
+blow up the prompt. ``select_snippets`` instead ranks all items together,
+drops empty and near-duplicate text, truncates long bodies, and only formats
+the items it actually keeps, stopping once the token budget is spent.
+
+An item is a near-duplicate when at least ``NEAR_DUPLICATE_CONTAINMENT`` of
+its word 3-grams (shingles) already occur in one kept item: reposts that
+differ by a word or two, and comments quoting a kept post. Texts shorter
+than three words are only dropped as exact duplicates.
+
+Rankings
+--------
+``"recency"``   newest first (closest to the old behaviour).
+``"score"``     highest Reddit score first.
+``"diversity"`` round-robin across subreddits, best-scored items first in
+                each, so a single busy subreddit cannot fill the prompt.
+"""
+
+from __future__ import annotations
+
+import re
+from collections import Counter, defaultdict
+from typing import Dict, FrozenSet, Iterable, List
+
+# Rough English average for Gemini/GPT-style tokenizers.
+CHARS_PER_TOKEN = 4
+
+RANKINGS = ("recency", "score", "diversity")
+
+# Stop scanning once less than this is left; nothing useful fits.
+_MIN_USEFUL_TOKENS = 16
+
+# Share of an item's shingles found in one kept item that makes it redundant.
+NEAR_DUPLICATE_CONTAINMENT = 0.8
+_SHINGLE_WORDS = 3
+
+_URL_RE = re.compile(r"https?://\S+")
+_NON_WORD_RE = re.compile(r"[\W_]+", re.UNICODE)
+_EMPTY_BODIES = {"", "deleted", "removed"}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (no tokenizer round trip)."""
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def _normalize(text: str) -> str:
+    """Lower-case, URL- and punctuation-free form used to spot near-duplicates."""
+    text = _URL_RE.sub(" ", text.lower())
+    return _NON_WORD_RE.sub(" ", text).strip()
+
+
+def _shingles(key: str) -> FrozenSet[int]:
+    """Hashed word 3-grams of a normalized text (the whole text if shorter)."""
+    words = key.split()
+    if len(words) < _SHINGLE_WORDS:
+        return frozenset((hash(key),))
+    return frozenset(
+        hash(" ".join(words[i:i + _SHINGLE_WORDS])) for i in range(len(words) - _SHINGLE_WORDS + 1)
+    )
+
+
+def _rank(items: List[Dict], ranking: str) -> Iterable[Dict]:
+    if ranking == "recency":
+        return sorted(items, key=lambda item: item.get("created_utc", 0), reverse=True)
+    if ranking == "score":
+        return sorted(items, key=lambda item: item.get("score", 0), reverse=True)
+    if ranking == "diversity":
+        by_subreddit: Dict[str, List[Dict]] = defaultdict(list)
+        for item in sorted(items, key=lambda item: item.get("score", 0), reverse=True):
+            by_subreddit[item.get("subreddit", "")].append(item)
+        queues = list(by_subreddit.values())  # ordered by each subreddit's best item
+        ranked = []
+        for depth in range(max((len(q) for q in queues), default=0)):
+            ranked.extend(q[depth] for q in queues if depth < len(q))
+        return ranked
+    raise ValueError(f"Unknown snippet ranking {ranking!r}; expected one of {RANKINGS}")
+
+
+def select_snippets(
+    items: List[Dict],
+    token_budget: int = 6000,
+    max_item_tokens: int = 400,
+    ranking: str = "recency",
+) -> List[str]:
+    """
+    Pick and format snippets until ``token_budget`` is used up.
+
+    Parameters
+    ----------
+    items : list[dict]
+        Post and comment dicts from ``scrape_user_data`` (``text``, ``url``,
+        ``created_utc``, ``subreddit``, ``score``).
+    token_budget : int
+        Approximate total tokens for all returned snippets.
+    max_item_tokens : int
+        Bodies longer than this are truncated before costing.
+    ranking : str
+        One of ``RANKINGS``.
+
+    Returns
+    -------
+    list[str]
+        ``"<text>\\nSource: <url>"`` snippets in ranked order.
+    """
+    max_chars = max_item_tokens * CHARS_PER_TOKEN
+    # shingle -> indexes of the kept snippets containing it
+    kept_shingles: Dict[int, List[int]] = defaultdict(list)
+    snippets: List[str] = []
+    remaining = token_budget
+
+    for item in _rank(items, ranking):
+        text = item.get("text", "").strip()
+        key = _normalize(text)
+        if key in _EMPTY_BODIES:
+            continue
+        shingles = _shingles(key)
+        overlap = Counter(kept for shingle in shingles for kept in kept_shingles.get(shingle, ()))
+        if overlap and max(overlap.values()) >= NEAR_DUPLICATE_CONTAINMENT * len(shingles):
+            continue
+
+        if len(text) > max_chars:
+            text = text[:max_chars].rstrip() + " …"
+        snippet = f"{text}\nSource: {item['url']}"
+        cost = estimate_tokens(snippet)
+        if cost > remaining:
+            # A shorter item further down may still fit.
+            continue
+
+        for shingle in shingles:
+            kept_shingles[shingle].append(len(snippets))
+        snippets.append(snippet)
+        remaining -= cost
+        if remaining < _MIN_USEFUL_TOKENS:
+            break
+
+    return snippets
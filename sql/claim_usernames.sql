@@ -0,0 +1,110 @@
+-- Atomic, lease-based claiming for the username queue.
+--
+-- Apply once per database (Supabase SQL editor or `psql -f`). Safe to rerun.
+--
+-- Workers call claim_reddit_usernames() through the Supabase RPC endpoint.
+-- A single UPDATE ... WHERE id IN (SELECT ... FOR UPDATE SKIP LOCKED)
+-- hands out each row to exactly one caller, even with many workers polling
+-- at once, and costs one round trip per batch instead of SELECT + UPDATEs.
+--
+-- Every claim carries a lease. Workers renew it with
+-- renew_reddit_username_leases() while they are still busy; rows whose lease
+-- expired (crashed or hung worker) become claimable again automatically.
+--
+-- Processed rows are claimable again once next_refresh_at passes (see
+-- refresh_policy.py). Unprocessed rows go first, then the most overdue
+-- refreshes; active users get earlier next_refresh_at values, so the order
+-- covers both staleness and activity. An unprocessed row that failed also
+-- waits for its next_refresh_at (the retry backoff).
+
+create table if not exists reddit_usernames (
+    id         bigint generated by default as identity primary key,
+    username   text not null unique,
+    processed  boolean not null default false,
+    locked     boolean not null default false,
+    lock_id    text
+);
+
+alter table reddit_usernames
+    add column if not exists lease_expires_at timestamptz;
+
+alter table reddit_usernames
+    add column if not exists content_fingerprint text,
+    add column if not exists newest_created_utc double precision,
+    add column if not exists processed_at timestamptz,
+    add column if not exists next_refresh_at timestamptz;
+
+-- Consecutive failures, of first runs and refreshes alike; each one pushes
+-- next_refresh_at further out (refresh_policy.retry_refresh_at). Reset on
+-- success. After WORKER_MAX_FAILURES the worker sets parked_at and the row
+-- is no longer claimed; clear parked_at to retry it.
+alter table reddit_usernames
+    add column if not exists refresh_failures integer not null default 0,
+    add column if not exists parked_at timestamptz;
+
+-- Users processed before refresh scheduling: spread their first refresh
+-- over the next 30 days instead of making them all due at once.
+update reddit_usernames
+   set next_refresh_at = now() + random() * interval '30 days'
+ where processed = true
+   and next_refresh_at is null;
+
+create index if not exists reddit_usernames_claimable_idx
+    on reddit_usernames (id)
+    where processed = false;
+
+create index if not exists reddit_usernames_refresh_idx
+    on reddit_usernames (next_refresh_at)
+    where processed = true;
+
+
+create or replace function claim_reddit_usernames(
+    p_lock_id       text,
+    p_batch_size    integer default 2,
+    p_lease_seconds integer default 600
+)
+returns setof reddit_usernames
+language sql
+as $$
+    update reddit_usernames
+       set locked = true,
+           lock_id = p_lock_id,
+           lease_expires_at = now() + make_interval(secs => p_lease_seconds)
+     where id in (
+        select id
+          from reddit_usernames
+         where parked_at is null
+           and (
+                (processed = false and next_refresh_at is null)
+                or next_refresh_at <= now()
+           )
+           and (
+                locked = false
+                -- expired lease, or a row locked before leases existed
+                or lease_expires_at is null
+                or lease_expires_at < now()
+           )
+         order by processed, next_refresh_at nulls first, id
+         limit p_batch_size
+           for update skip locked
+     )
+    returning *;
+$$;
+
+
+create or replace function renew_reddit_username_leases(
+    p_lock_id       text,
+    p_lease_seconds integer default 600
+)
+returns integer
+language sql
+as $$
+    with renewed as (
+        update reddit_usernames
+           set lease_expires_at = now() + make_interval(secs => p_lease_seconds)
+         where lock_id = p_lock_id
+           and locked = true
+        returning 1
+    )
+    select count(*)::integer from renewed;
+$$;
@@ -0,0 +1,300 @@
+"""
+Running Big Five norms per subreddit.
+
+``save_persona`` folds each user's Big Five scores into a weighted running
+mean and variance for every subreddit they were active in, weighted by how
+many of their scraped items are there. The store (``PERSONA_NORMS_PATH``,
+default ``subreddit_norms.sqlite3`` inside the persona store) keeps each
+user's current contribution, so a re-generated persona replaces the old
+one instead of counting twice.
+
+Queries read one row per subreddit, never the persona files:
+
+    $ python subreddit_norms.py typical kojied AskReddit   # z-scores vs r/AskReddit
+    $ python subreddit_norms.py closest kojied 5           # communities most like the user
+    $ python subreddit_norms.py rebuild personas/          # from personas saved earlier
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import sqlite3
+import sys
+import threading
+from collections import Counter
+from contextlib import closing
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from artifact_store import STORE_DIR, load_json, load_raw_activity
+from env_loader import load_env
+from persona_parser import BIG_FIVE_TRAITS
+
+load_env()  # the settings below may come from .env
+
+NORMS_PATH = os.getenv("PERSONA_NORMS_PATH", os.path.join(STORE_DIR, "subreddit_norms.sqlite3"))
+
+# Standard deviations below this are treated as this, so communities with
+# one or two users do not produce huge z-scores.
+MIN_STD = 0.05
+# ``closest`` ignores communities with fewer contributing users.
+MIN_USERS = 3
+
+_SCHEMA = (
+    "create table if not exists contributions (\n"
+    "    username text not null,\n"
+    "    subreddit text not null,\n"
+    "    weight real not null,\n"
+    + "".join(f"    {trait} real not null,\n" for trait in BIG_FIVE_TRAITS)
+    + "    primary key (username, subreddit)\n);\n"
+    "create table if not exists norms (\n"
+    "    subreddit text primary key,\n"
+    "    users integer not null,\n"
+    "    weight real not null,\n"
+    + ",\n".join(f"    mean_{trait} real not null,\n    m2_{trait} real not null" for trait in BIG_FIVE_TRAITS)
+    + "\n);\n"
+)
+_NORM_COLUMNS = ("users", "weight") + tuple(
+    column for trait in BIG_FIVE_TRAITS for column in (f"mean_{trait}", f"m2_{trait}")
+)
+
+
+def big_five_vector(frameworks: dict) -> Optional[Tuple[float, ...]]:
+    """The five scores from a ``personality_frameworks`` mapping, or ``None`` if any is missing."""
+    traits = (frameworks or {}).get("BigFive") or {}
+    values = [traits.get(trait) for trait in BIG_FIVE_TRAITS]
+    if not all(isinstance(value, (int, float)) for value in values):
+        return None
+    return tuple(float(value) for value in values)
+
+
+def activity_weights(posts: Iterable[dict], comments: Iterable[dict]) -> Dict[str, float]:
+    """Items per subreddit: each user's weight in that community."""
+    counts = Counter(item.get("subreddit") for items in (posts, comments) for item in items)
+    counts.pop(None, None)
+    counts.pop("", None)
+    return {subreddit: float(count) for subreddit, count in counts.items()}
+
+
+def _add(norm: List[float], weight: float, values: Tuple[float, ...]) -> None:
+    """Weighted Welford update of one ``_NORM_COLUMNS`` row, in place."""
+    total = norm[1] + weight
+    for i, value in enumerate(values):
+        mean, m2 = norm[2 + 2 * i], norm[3 + 2 * i]
+        delta = value - mean
+        mean += delta * weight / total
+        norm[2 + 2 * i], norm[3 + 2 * i] = mean, m2 + weight * delta * (value - mean)
+    norm[0] += 1
+    norm[1] = total
+
+
+def _remove(norm: List[float], weight: float, values: Tuple[float, ...]) -> None:
+    """Inverse of ``_add``."""
+    total = norm[1] - weight
+    if norm[0] <= 1 or total <= 1e-9:
+        norm[:] = [0, 0.0] + [0.0] * (2 * len(BIG_FIVE_TRAITS))
+        return
+    for i, value in enumerate(values):
+        mean, m2 = norm[2 + 2 * i], norm[3 + 2 * i]
+        previous = (mean * norm[1] - weight * value) / total
+        norm[2 + 2 * i], norm[3 + 2 * i] = previous, max(0.0, m2 - weight * (value - previous) * (value - mean))
+    norm[0] -= 1
+    norm[1] = total
+
+
+class SubredditNorms:
+    """SQLite store of per-subreddit Big Five means and variances."""
+
+    def __init__(self, path: str = NORMS_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("pragma journal_mode=wal")
+        return conn
+
+    def update(self, username: str, frameworks: dict, weights: Dict[str, float]) -> int:
+        """
+        Replace ``username``'s contribution; returns the subreddits touched.
+
+        A persona without a complete Big Five only withdraws the user's
+        previous contribution.
+        """
+        values = big_five_vector(frameworks)
+        username = username.lower()
+        trait_columns = ", ".join(BIG_FIVE_TRAITS)
+        with closing(self._connect()) as conn:
+            # Take the write lock before reading, so concurrent savers queue
+            # instead of failing on a stale read snapshot.
+            conn.execute("begin immediate")
+            try:
+                previous = conn.execute(
+                    f"select subreddit, weight, {trait_columns} from contributions where username = ?", (username,)
+                ).fetchall()
+                touched = {row[0] for row in previous} | (set(weights) if values else set())
+                norms = self._load(conn, touched)
+                for subreddit, weight, *old in previous:
+                    _remove(norms[subreddit], weight, tuple(old))
+                conn.execute("delete from contributions where username = ?", (username,))
+                if values:
+                    for subreddit, weight in weights.items():
+                        _add(norms[subreddit], weight, values)
+                    conn.executemany(
+                        f"insert into contributions (username, subreddit, weight, {trait_columns})"
+                        f" values (?, ?, ?, {', '.join('?' for _ in BIG_FIVE_TRAITS)})",
+                        [(username, subreddit, weight, *values) for subreddit, weight in weights.items()],
+                    )
+                conn.executemany(
+                    f"insert or replace into norms (subreddit, {', '.join(_NORM_COLUMNS)})"
+                    f" values (?, {', '.join('?' for _ in _NORM_COLUMNS)})",
+                    [(subreddit, *norm) for subreddit, norm in norms.items() if norm[0] > 0],
+                )
+                empty = [(subreddit,) for subreddit, norm in norms.items() if norm[0] <= 0]
+                conn.executemany("delete from norms where subreddit = ?", empty)
+                conn.execute("commit")
+            except BaseException:
+                conn.execute("rollback")
+                raise
+        return len(touched)
+
+    def add(self, persona: dict, posts: Iterable[dict], comments: Iterable[dict]) -> int:
+        """Fold in a persona JSON document (as written by ``save_persona``)."""
+        return self.update(persona["username"], persona.get("personality_frameworks") or {},
+                           activity_weights(posts, comments))
+
+    @staticmethod
+    def _load(conn: sqlite3.Connection, subreddits: Iterable[str]) -> Dict[str, List[float]]:
+        norms = {subreddit: [0, 0.0] + [0.0] * (2 * len(BIG_FIVE_TRAITS)) for subreddit in subreddits}
+        for subreddit in norms:
+            row = conn.execute(
+                f"select {', '.join(_NORM_COLUMNS)} from norms where subreddit = ?", (subreddit,)
+            ).fetchone()
+            if row:
+                norms[subreddit] = list(row)
+        return norms
+
+    def norm(self, subreddit: str) -> Optional[Dict[str, object]]:
+        """``users``, total ``weight`` and per-trait ``mean`` / ``std`` for one subreddit."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                f"select {', '.join(_NORM_COLUMNS)} from norms where subreddit = ? collate nocase", (subreddit,)
+            ).fetchone()
+        if not row:
+            return None
+        users, weight = row[0], row[1]
+        return {
+            "subreddit": subreddit,
+            "users": users,
+            "weight": weight,
+            "mean": {trait: row[2 + 2 * i] for i, trait in enumerate(BIG_FIVE_TRAITS)},
+            "std": {trait: math.sqrt(max(row[3 + 2 * i], 0.0) / weight) for i, trait in enumerate(BIG_FIVE_TRAITS)},
+        }
+
+    def typicality(self, frameworks: dict, subreddit: str) -> Optional[Dict[str, object]]:
+        """
+        How typical a Big Five profile is for ``subreddit``.
+
+        Returns the per-trait z-scores against the community and their RMS
+        as ``distance`` (0 is the community's average member), or ``None``
+        if the subreddit or the scores are unknown.
+        """
+        values, norm = big_five_vector(frameworks), self.norm(subreddit)
+        if values is None or norm is None:
+            return None
+        z = {
+            trait: (value - norm["mean"][trait]) / max(norm["std"][trait], MIN_STD)
+            for trait, value in zip(BIG_FIVE_TRAITS, values)
+        }
+        distance = math.sqrt(sum(score * score for score in z.values()) / len(z))
+        return {"subreddit": subreddit, "users": norm["users"], "z": z, "distance": distance}
+
+    def closest(self, frameworks: dict, k: int = 5, min_users: int = MIN_USERS) -> List[Tuple[str, float]]:
+        """The ``k`` communities whose norms the profile is most typical of, as ``(subreddit, distance)``."""
+        import numpy as np
+
+        values = big_five_vector(frameworks)
+        if values is None:
+            return []
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"select subreddit, {', '.join(_NORM_COLUMNS)} from norms where users >= ?", (min_users,)
+            ).fetchall()
+        if not rows:
+            return []
+        names = [row[0] for row in rows]
+        data = np.array([row[1:] for row in rows], dtype=np.float64)
+        means = data[:, 2::2]
+        stds = np.maximum(np.sqrt(np.maximum(data[:, 3::2], 0) / data[:, 1:2]), MIN_STD)
+        distances = np.sqrt((((np.array(values) - means) / stds) ** 2).mean(axis=1))
+        order = np.argsort(distances)[:k]
+        return [(names[i], float(distances[i])) for i in order]
+
+    def __len__(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("select count(*) from norms").fetchone()[0]
+
+
+_norms: SubredditNorms | None = None
+_norms_lock = threading.Lock()
+
+
+def get_norms() -> SubredditNorms:
+    global _norms
+    with _norms_lock:
+        if _norms is None:
+            _norms = SubredditNorms()
+        return _norms
+
+
+def rebuild(directory: str, norms: SubredditNorms | None = None) -> int:
+    """Fold in every persona JSON under ``directory`` whose raw activity is stored (snapshots excepted)."""
+    norms = norms if norms is not None else get_norms()
+    users = 0
+    for parent, dirs, names in os.walk(directory):
+        if parent == directory and "raw" in dirs:
+            dirs.remove("raw")
+        for name in names:
+            if name.endswith((".json", ".json.gz", ".json.zst")):
+                persona = load_json(os.path.join(parent, name))
+                if persona.get("snapshot"):
+                    continue
+                if "personality_frameworks" in persona and persona.get("raw_data_ref"):
+                    raw = load_raw_activity(persona["raw_data_ref"])
+                    norms.add(persona, raw.get("posts", []), raw.get("comments", []))
+                    users += 1
+    return users
+
+
+def _frameworks_for(username: str) -> dict:
+    from persona_index import get_index
+
+    row = get_index().get(username)
+    if row is None:
+        sys.exit(f"❌ {username} is not in the persona index")
+    return {"BigFive": {trait: row[trait] for trait in BIG_FIVE_TRAITS}}
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) >= 2 else ""
+    if command == "rebuild":
+        directory = sys.argv[2] if len(sys.argv) >= 3 else STORE_DIR
+        print(f"✅ Folded {rebuild(directory)} personas from {directory} into {get_norms().path}")
+    elif command == "typical" and len(sys.argv) >= 4:
+        result = get_norms().typicality(_frameworks_for(sys.argv[2]), sys.argv[3])
+        if result is None:
+            sys.exit(f"❌ No norms for r/{sys.argv[3]}")
+        print(f"u/{sys.argv[2]} vs r/{sys.argv[3]} ({result['users']} users): distance {result['distance']:.2f}")
+        for trait, z in result["z"].items():
+            print(f"  {trait:<18}{z:+.2f}σ")
+    elif command == "closest" and len(sys.argv) >= 3:
+        k = int(sys.argv[3]) if len(sys.argv) >= 4 else 5
+        for subreddit, distance in get_norms().closest(_frameworks_for(sys.argv[2]), k):
+            print(f"r/{subreddit:<24}{distance:.2f}")
+    else:
+        print(f"{len(get_norms())} subreddits in {get_norms().path}")
+        print("Usage: python subreddit_norms.py [rebuild DIR | typical USER SUBREDDIT | closest USER [k]]")
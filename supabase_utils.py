@@ -1,51 +1,57 @@
 import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
+from clients import get_supabase
+from env_loader import load_env
 import uuid
 from typing import List, Optional
 
-load_dotenv()
+load_env()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# The Supabase client is created on first use (clients.get_supabase).
 
+LEASE_SECONDS = 600
 
-def fetch_usernames(batch_size: int = 2, lock_id: Optional[str] = None) -> List[dict]:
+
+def fetch_usernames(
+    batch_size: int = 2, lock_id: Optional[str] = None, lease_seconds: int = LEASE_SECONDS
+) -> List[dict]:
     """
-    Fetch a batch of unlocked usernames and lock them for processing.
+    Atomically claim a batch of usernames under a time-limited lease.
+
+    Uses the ``claim_reddit_usernames`` RPC from ``sql/claim_usernames.sql``,
+    so concurrent callers never receive the same row. Rows whose lease has
+    expired are handed out again.
     """
     lock_id = lock_id or str(uuid.uuid4())
-    response = (
-        supabase.table("reddit_usernames")
-        .select("*")
-        .eq("locked", False)
-        .limit(batch_size)
-        .execute()
-    )
-
-    users = response.data
-    if not users:
-        return []
+    response = get_supabase().rpc("claim_reddit_usernames", {
+        "p_lock_id": lock_id,
+        "p_batch_size": batch_size,
+        "p_lease_seconds": lease_seconds,
+    }).execute()
+    return response.data or []
 
-    # Lock the users
-    ids = [user["id"] for user in users]
-    supabase.table("reddit_usernames").update({
-        "locked": True,
-        "lock_id": lock_id
-    }).in_("id", ids).execute()
 
-    return users
+def renew_leases(lock_id: str, lease_seconds: int = LEASE_SECONDS) -> int:
+    """
+    Extend the lease on every row held by ``lock_id``; returns the row count.
+    """
+    response = get_supabase().rpc("renew_reddit_username_leases", {
+        "p_lock_id": lock_id,
+        "p_lease_seconds": lease_seconds,
+    }).execute()
+    return response.data or 0
 
 
 def unlock_usernames(lock_id: str):
     """
     Unlock previously locked usernames using the lock_id.
     """
-    supabase.table("reddit_usernames").update({
+    get_supabase().table("reddit_usernames").update({
         "locked": False,
-        "lock_id": None
+        "lock_id": None,
+        "lease_expires_at": None
     }).eq("lock_id", lock_id).execute()
 
 
@@ -53,6 +59,6 @@ def mark_username_processed(username: str):
     """
     Optionally mark a username as processed (e.g., store status/timestamp).
     """
-    supabase.table("reddit_usernames").update({
+    get_supabase().table("reddit_usernames").update({
         "processed": True
     }).eq("username", username).execute()
@@ -0,0 +1,23 @@
+"""
+Shared test setup.
+
+Every module reads its paths from the environment at import time, so they
+are pointed at a throwaway directory here, before any test imports them.
+No test talks to Reddit, Gemini, Supabase, GitHub or Qdrant.
+"""
+
+import os
+import tempfile
+
+_ROOT = tempfile.mkdtemp(prefix="redditmindmap-tests-")
+
+for _name, _value in {
+    "PERSONA_STORE_DIR": os.path.join(_ROOT, "personas"),
+    "SCRAPE_CACHE_PATH": os.path.join(_ROOT, "scrape_cache.sqlite3"),
+    "LLM_CACHE_PATH": os.path.join(_ROOT, "llm_cache.sqlite3"),
+    "EVOLUTION_CACHE_DIR": os.path.join(_ROOT, "evolution"),
+    "METRICS_PORT": "0",
+}.items():
+    os.environ.setdefault(_name, _value)
+for _name in ("ACTIVITY_RECORD_PATH", "METRICS_TRACE_PATH", "PERSONA_STORE_URL"):
+    os.environ.pop(_name, None)
@@ -0,0 +1,94 @@
+import gzip
+import json
+import multiprocessing
+
+import pytest
+
+import activity_dataset
+import artifact_store
+from activity_dataset import EVOLUTION, SCRAPE, find, iter_latest, iter_records, record
+
+POSTS = [{"url": "https://reddit.com/1", "text": "naïve line separator", "created_utc": 1.0}]
+
+
+@pytest.fixture(params=["activity.jsonl", "activity.jsonl.gz"])
+def path(request, tmp_path):
+    return str(tmp_path / request.param)
+
+
+def test_round_trip(path):
+    record("alice", POSTS, [], path=path)
+    record("bob", [], POSTS, path=path)
+    entries = list(iter_records(path))
+    assert [entry["username"] for entry in entries] == ["alice", "bob"]
+    assert entries[0]["posts"] == POSTS and entries[0]["source"] == SCRAPE
+    assert entries[1]["comments"] == POSTS
+
+
+def test_latest_record_per_user_and_source(path):
+    record("alice", POSTS, [], path=path)
+    record("bob", POSTS, [], path=path)
+    record("Alice", [], [], path=path)
+    record("alice", POSTS * 3, [], path=path, source=EVOLUTION)
+
+    assert [(e["username"], len(e["posts"])) for e in iter_latest(path)] == [("bob", 1), ("Alice", 0)]
+    assert find(path, "ALICE")["posts"] == []
+    assert len(find(path, "alice", sources=(EVOLUTION, SCRAPE))["posts"]) == 3
+    assert find(path, "bob", sources=(EVOLUTION,)) is None
+    latest = {e["username"].lower(): len(e["posts"]) for e in iter_latest(path, (EVOLUTION, SCRAPE))}
+    assert latest == {"alice": 3, "bob": 1}
+
+
+def test_records_without_source_count_as_scrapes(tmp_path):
+    path = tmp_path / "old.jsonl"
+    path.write_text(json.dumps({"username": "alice", "scraped_at": 1, "posts": [], "comments": []}) + "\n")
+    assert find(str(path), "alice") is not None
+
+
+@pytest.mark.parametrize("cut", [0.25, 0.5, 0.75])
+def test_torn_gzip_members_are_skipped(tmp_path, cut):
+    # Whether a torn member fails to decode depends on the bytes after it
+    # (gzip headers carry a timestamp), so try many variants.
+    for mtime in range(64):
+        path = str(tmp_path / f"activity{mtime}.jsonl.gz")
+        record("alice", POSTS, [], path=path)
+        torn = gzip.compress(json.dumps({"username": "mallory", "posts": POSTS * 50}).encode() + b"\n", mtime=mtime)
+        with open(path, "ab") as f:
+            f.write(torn[:int(len(torn) * cut)])  # a writer killed mid-append
+        record("bob", POSTS, [], path=path)
+        with open(path, "ab") as f:
+            f.write(torn[:10])
+
+        assert [entry["username"] for entry in iter_records(path)] == ["alice", "bob"], mtime
+
+
+def test_torn_plain_line_is_skipped(tmp_path):
+    path = str(tmp_path / "activity.jsonl")
+    record("alice", POSTS, [], path=path)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"username": "mallory", "pos')
+    assert [entry["username"] for entry in iter_records(path)] == ["alice"]
+
+
+def _append_many(path, worker):
+    for i in range(40):
+        record(f"user{worker}_{i}", POSTS * 20, POSTS * 20, path=path)
+
+
+def test_processes_appending_at_once_do_not_interleave(path):
+    processes = [multiprocessing.Process(target=_append_many, args=(path, worker)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert len({entry["username"] for entry in iter_records(path)}) == 160
+
+
+def test_replay_store_is_separate(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifact_store, "_store", None)
+    monkeypatch.setattr(activity_dataset, "REPLAY_STORE", None)
+    dataset = str(tmp_path / "activity.jsonl.gz")
+    assert activity_dataset.use_replay_store(dataset) == dataset + ".personas"
+    assert artifact_store.get_store().location("x") == str(tmp_path / "activity.jsonl.gz.personas" / "x")
+
+    assert activity_dataset.use_replay_store(dataset, str(tmp_path / "elsewhere")) == str(tmp_path / "elsewhere")
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+import artifact_store
+from artifact_store import ArtifactStore, LocalArtifactStore
+
+
+def test_store_interface_is_abstract():
+    with pytest.raises(TypeError):
+        ArtifactStore()
+
+    class Partial(ArtifactStore):
+        def put(self, key, data):
+            return key
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_local_store_round_trip(tmp_path):
+    store = LocalArtifactStore(str(tmp_path))
+    location = store.put("ab/cd/alice/persona.txt", b"hello")
+    assert location == os.path.join(str(tmp_path), "ab", "cd", "alice", "persona.txt")
+    assert store.exists("ab/cd/alice/persona.txt") and not store.exists("ab/cd/bob/persona.txt")
+    assert store.get("ab/cd/alice/persona.txt") == b"hello"
+    assert not [name for name in os.listdir(os.path.dirname(location)) if name.startswith(".tmp-")]
+
+
+def test_persona_keys_are_sharded_case_insensitively():
+    key = artifact_store.persona_key("Alice", "persona.txt")
+    assert key.endswith("/Alice/persona.txt")
+    assert key.split("/")[:2] == artifact_store.persona_key("alice", "x").split("/")[:2]
+    assert all(len(part) == 2 for part in key.split("/")[:2])
+
+
+def test_json_round_trip(tmp_path):
+    store = LocalArtifactStore(str(tmp_path))
+    location = artifact_store.put_json("x/persona" + artifact_store.json_extension(), {"a": "é"}, store)
+    assert artifact_store.load_json(location) == {"a": "é"}
+
+
+def test_raw_activity_is_stored_once(tmp_path):
+    store = LocalArtifactStore(str(tmp_path))
+    posts = [{"url": "u", "text": "t"}]
+    ref = artifact_store.put_raw_activity(posts, [], store)
+    assert artifact_store.put_raw_activity(list(posts), [], store) == ref
+    assert ref.startswith("sha256:")
+    assert artifact_store.load_raw_activity(ref, store) == {"posts": posts, "comments": []}
+    with pytest.raises(KeyError):
+        artifact_store.load_raw_activity("sha256:" + "0" * 64, store)
@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+import clients
+import llm_cache
+import persona_utils
+from persona_utils import NO_CONTENT_PERSONA, build_persona, parse_persona_to_json, render_persona_text
+
+POSTS = [{
+    "text": "Dialed in a new espresso grinder this weekend and finally got a sweet shot",
+    "url": "https://reddit.com/r/coffee/1", "created_utc": 1, "score": 10, "subreddit": "coffee",
+}]
+STRUCTURED = {
+    "sections": [
+        {"key": "interests", "insights": [{"text": "Espresso", "source": "https://reddit.com/r/coffee/1"}]},
+        {"key": "tone_of_writing", "insights": [{"text": "Upbeat"}]},
+        {"key": "leanings", "insights": []},
+    ],
+    "MBTI": "ISTP",
+    "BigFive": {"openness": 0.7},
+}
+FRAMEWORKS = {"MBTI": "ENFP", "BigFive": {"openness": 0.9}}
+FREE_TEXT = "🎯 Interests\n- Coffee\n  Source: https://reddit.com/r/coffee/1"
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """Answers ``generate_content`` with ``replies`` in order and records each call."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    def generate_content(self, prompt, generation_config=None):
+        self.calls.append((prompt, generation_config))
+        return FakeResponse(self.replies.pop(0))
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    monkeypatch.setattr(llm_cache, "ENABLED", False)
+
+    def install(*replies):
+        model = FakeModel(*replies)
+        monkeypatch.setattr(clients, "get_gemini_model", lambda: model)
+        return model
+
+    return install
+
+
+def test_structured_mode_makes_one_schema_constrained_call(gemini):
+    model = gemini(json.dumps(STRUCTURED))
+    persona, frameworks = build_persona(POSTS, [], structured=True)
+
+    (prompt, config), = model.calls
+    assert config["response_mime_type"] == "application/json"
+    assert config["response_schema"] == persona_utils._PERSONA_SCHEMA
+    assert "https://reddit.com/r/coffee/1" in prompt
+    assert frameworks == {"MBTI": "ISTP", "BigFive": {"openness": 0.7}}
+    assert persona == render_persona_text(STRUCTURED)
+
+
+def test_rendered_text_parses_like_the_free_text_format():
+    text = render_persona_text(STRUCTURED)
+    assert text.splitlines()[:4] == [
+        "🎯 Interests", "-" * len("🎯 Interests"), "• Espresso", "  Source: https://reddit.com/r/coffee/1",
+    ]
+    assert "Leanings" not in text  # sections without insights are left out
+    parsed = parse_persona_to_json(text)
+    assert "Espresso" in parsed["interests"]["value"]
+    assert parsed["interests"]["confidence"] == pytest.approx(0.6)
+    assert "Upbeat" in parsed["tone_of_writing"]["value"]
+
+
+def test_fenced_json_reply_is_accepted(gemini):
+    gemini("```json\n" + json.dumps(STRUCTURED) + "\n```")
+    assert build_persona(POSTS, [], structured=True)[1]["MBTI"] == "ISTP"
+
+
+@pytest.mark.parametrize("reply", ["not json", json.dumps({"MBTI": "ISTP"})])
+def test_unusable_structured_reply_falls_back_to_two_calls(gemini, reply):
+    model = gemini(reply, FREE_TEXT, json.dumps(FRAMEWORKS))
+    persona, frameworks = build_persona(POSTS, [], structured=True)
+
+    assert persona == FREE_TEXT and frameworks == FRAMEWORKS
+    assert [config for _, config in model.calls][1:] == [None, None]
+    assert FREE_TEXT in model.calls[2][0]
+
+
+def test_unstructured_mode_skips_the_structured_call(gemini):
+    model = gemini(FREE_TEXT, json.dumps(FRAMEWORKS))
+    assert build_persona(POSTS, [], structured=False) == (FREE_TEXT, FRAMEWORKS)
+    assert len(model.calls) == 2
+
+
+def test_no_content_makes_no_call(gemini):
+    model = gemini()
+    assert build_persona([], [], structured=True) == (NO_CONTENT_PERSONA, {})
+    assert model.calls == []
@@ -0,0 +1,107 @@
+"""
+The lease-based claim RPCs in ``sql/claim_usernames.sql``.
+
+The Postgres tests need a scratch database in ``TEST_DATABASE_URL`` (its
+``reddit_usernames`` table is truncated) and are skipped without one.
+"""
+
+import os
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+import worker
+
+SQL = (Path(__file__).resolve().parent.parent / "sql" / "claim_usernames.sql").read_text(encoding="utf-8")
+DSN = os.getenv("TEST_DATABASE_URL")
+
+
+def test_worker_updates_the_table_the_rpcs_claim_from():
+    assert f"returns setof {worker.USERNAME_TABLE}" in SQL
+    assert f"update {worker.USERNAME_TABLE}" in SQL
+
+
+@pytest.fixture
+def db():
+    if not DSN:
+        pytest.skip("TEST_DATABASE_URL not set")
+    psycopg = pytest.importorskip("psycopg")
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute(SQL)
+        conn.execute("truncate reddit_usernames restart identity")
+        conn.cursor().executemany(
+            "insert into reddit_usernames (username) values (%s)", [(f"user{i}",) for i in range(20)]
+        )
+        yield conn
+
+
+def claim(conn, lock_id, batch=5, lease=600):
+    rows = conn.execute(
+        "select username from claim_reddit_usernames(%s, %s, %s)", (lock_id, batch, lease)
+    ).fetchall()
+    return [username for (username,) in rows]
+
+
+def test_each_row_goes_to_one_claimer(db):
+    claimed = Counter()
+    lock = threading.Lock()
+    psycopg = pytest.importorskip("psycopg")
+
+    def claimer(i):
+        with psycopg.connect(DSN, autocommit=True) as conn:
+            while True:
+                usernames = claim(conn, f"worker{i}", batch=2)
+                if not usernames:
+                    return
+                with lock:
+                    claimed.update(usernames)
+
+    threads = [threading.Thread(target=claimer, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(claimed) == 20
+    assert set(claimed.values()) == {1}
+
+
+def test_expired_lease_is_claimable_again(db):
+    assert claim(db, "crashed", batch=20, lease=0) != []
+    time.sleep(0.01)
+    assert len(claim(db, "alive", batch=20)) == 20
+    assert claim(db, "late", batch=20) == []
+
+
+def test_renew_only_extends_own_leases(db):
+    claim(db, "a", batch=3)
+    claim(db, "b", batch=2)
+    renewed = db.execute("select renew_reddit_username_leases(%s, %s)", ("a", 600)).fetchone()[0]
+    assert renewed == 3
+
+
+def test_processed_rows_come_back_when_their_refresh_is_due(db):
+    db.execute(
+        "update reddit_usernames set processed = true,"
+        " next_refresh_at = case when id <= 5 then now() - interval '1 hour' else now() + interval '1 day' end"
+    )
+    assert sorted(claim(db, "w", batch=20)) == sorted(f"user{i}" for i in range(5))
+
+
+def test_failed_new_rows_wait_for_their_retry(db):
+    db.execute(
+        "update reddit_usernames set refresh_failures = 1,"
+        " next_refresh_at = case when id <= 5 then now() - interval '1 hour' else now() + interval '1 hour' end"
+        " where id <= 10"
+    )
+    # Never-tried rows go before due retries.
+    assert sorted(claim(db, "w", batch=10)) == sorted(f"user{i}" for i in range(10, 20))
+    assert sorted(claim(db, "w", batch=20)) == sorted(f"user{i}" for i in range(5))
+
+
+def test_parked_rows_are_not_claimed(db):
+    db.execute("update reddit_usernames set parked_at = now() where id <= 5")
+    assert sorted(claim(db, "w", batch=20)) == sorted(f"user{i}" for i in range(5, 20))
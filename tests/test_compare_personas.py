@@ -0,0 +1,77 @@
+import json
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+from compare_personas import bulk_compare, find_persona_files, load_personas, persona_matrices
+from persona_parser import BIG_FIVE_TRAITS
+
+
+def persona(username, mbti, big_five, **extra):
+    return {
+        "username": username,
+        "personality_frameworks": {"MBTI": mbti, "BigFive": dict(zip(BIG_FIVE_TRAITS, big_five))},
+        "persona": {"interests": {"value": "", "confidence": big_five[0]}},
+        **extra,
+    }
+
+
+def test_bulk_mode_skips_snapshots(tmp_path):
+    for name, extra in [("alice", {}), ("bob", {}), ("alice_2024-01", {"snapshot": True})]:
+        (tmp_path / f"{name}.json").write_text(json.dumps(persona(name, "INTJ", [0.5] * 5, **extra)))
+    loaded = load_personas(find_persona_files(str(tmp_path)))
+    assert sorted(p["username"] for p in loaded) == ["alice", "bob"]
+
+
+def brute_force(personas, top_k):
+    """Pair-by-pair reference for bulk_compare's aggregates and neighbours."""
+    traits = [np.array([p["personality_frameworks"]["BigFive"][t] for t in BIG_FIVE_TRAITS]) for p in personas]
+    columns = persona_matrices(personas)
+    confidence = columns["confidence"].astype(np.float64)
+    types = [p["personality_frameworks"]["MBTI"] for p in personas]
+    known = [i for i, mbti in enumerate(types) if mbti != "Unknown"]
+    pairs = list(combinations(range(len(personas)), 2))
+    shared = {
+        (i, j): sum(a == b for a, b in zip(types[i], types[j])) for i, j in combinations(known, 2)
+    }
+    neighbours = [
+        sorted((j for j in range(len(personas)) if j != i), key=lambda j: np.linalg.norm(traits[i] - traits[j]))[:top_k]
+        for i in range(len(personas))
+    ]
+    return {
+        "pairs": len(pairs),
+        "mean_big_five_distance": np.mean([np.linalg.norm(traits[i] - traits[j]) for i, j in pairs]),
+        "mean_confidence_distance": np.mean([np.linalg.norm(confidence[i] - confidence[j]) for i, j in pairs]),
+        "mean_trait_difference": {
+            trait: np.mean([abs(traits[i][col] - traits[j][col]) for i, j in pairs])
+            for col, trait in enumerate(BIG_FIVE_TRAITS)
+        },
+        "mbti_known": len(known),
+        "mbti_exact_match_rate": np.mean([count == 4 for count in shared.values()]),
+        "mbti_mean_shared_letters": np.mean(list(shared.values())),
+        "mbti_shared_letters_histogram": [list(shared.values()).count(n) for n in range(5)],
+        "neighbours": neighbours,
+    }
+
+
+@pytest.mark.parametrize("block_rows", [1, 7, 1024])
+def test_bulk_compare_matches_brute_force(block_rows):
+    rng = np.random.default_rng(0)
+    letters = ["INTJ", "ENFP", "ISTP", "ENTJ", "Unknown"]
+    # Distinct trait vectors, so the nearest neighbours are unambiguous.
+    personas = [
+        persona(f"user{i}", letters[rng.integers(len(letters))], rng.random(5).round(3).tolist())
+        for i in range(30)
+    ]
+    result = bulk_compare(persona_matrices(personas), top_k=3, block_rows=block_rows)
+    expected = brute_force(personas, top_k=3)
+
+    assert result["pairs"] == expected["pairs"]
+    assert result["mbti_known"] == expected["mbti_known"]
+    assert result["mbti_shared_letters_histogram"] == expected["mbti_shared_letters_histogram"]
+    for key in ("mean_big_five_distance", "mean_confidence_distance", "mbti_exact_match_rate", "mbti_mean_shared_letters"):
+        assert result[key] == pytest.approx(expected[key], rel=1e-5), key
+    for trait, value in expected["mean_trait_difference"].items():
+        assert result["mean_trait_difference"][trait] == pytest.approx(value, rel=1e-5), trait
+    assert result["neighbours"].tolist() == expected["neighbours"]
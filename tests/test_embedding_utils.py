@@ -0,0 +1,92 @@
+from collections import OrderedDict
+
+import pytest
+
+import clients
+import embedding_utils
+from embedding_utils import EmbeddingError, get_embedding, get_embeddings
+
+
+class FakeGenai:
+    """``embed_content`` stand-in: a text's vector is ``[len(text), batch index]``."""
+
+    def __init__(self, fail=False, drop=False):
+        self.batches = []
+        self.fail = fail
+        self.drop = drop
+
+    def embed_content(self, model, content, task_type):
+        self.batches.append(list(content))
+        if self.fail:
+            raise RuntimeError("quota exceeded")
+        vectors = [[float(len(text)), float(len(self.batches))] for text in content]
+        if self.drop:
+            vectors[-1] = []
+        return {"embedding": vectors}
+
+
+@pytest.fixture
+def genai(monkeypatch):
+    monkeypatch.setattr(embedding_utils, "_cache", OrderedDict())
+    monkeypatch.setattr(embedding_utils, "MAX_BATCH_SIZE", 3)
+
+    def install(**kwargs):
+        fake = FakeGenai(**kwargs)
+        monkeypatch.setattr(clients, "get_genai", lambda: fake)
+        return fake
+
+    return install
+
+
+def test_texts_are_sent_in_batches_of_max_batch_size(genai):
+    fake = genai()
+    texts = [f"text {i}" for i in range(7)]
+    vectors = get_embeddings(texts)
+    assert [len(batch) for batch in fake.batches] == [3, 3, 1]
+    assert vectors == [[6.0, 1.0]] * 3 + [[6.0, 2.0]] * 3 + [[6.0, 3.0]]
+
+
+def test_duplicates_and_cached_texts_are_embedded_once(genai):
+    fake = genai()
+    first = get_embeddings(["a", "bb", "a"])
+    assert fake.batches == [["a", "bb"]]
+    assert first[0] == first[2]
+
+    assert get_embeddings(["bb", "ccc", "a"]) == [first[1], [3.0, 2.0], first[0]]
+    assert fake.batches[1:] == [["ccc"]]
+
+
+def test_cache_is_keyed_by_task_type(genai):
+    fake = genai()
+    get_embedding("a")
+    get_embedding("a", task_type="RETRIEVAL_QUERY")
+    assert len(fake.batches) == 2
+
+
+def test_cache_evicts_least_recently_used(genai, monkeypatch):
+    monkeypatch.setattr(embedding_utils, "CACHE_SIZE", 2)
+    fake = genai()
+    get_embeddings(["a", "b"])
+    get_embedding("a")  # refresh "a"; "b" is now the oldest
+    get_embedding("c")
+    get_embeddings(["a", "b"])
+    assert fake.batches[-1] == ["b"]
+
+
+def test_failed_request_raises_embedding_error(genai):
+    genai(fail=True)
+    with pytest.raises(EmbeddingError, match="quota exceeded"):
+        get_embeddings(["a"])
+    assert embedding_utils._cache == {}
+
+
+def test_empty_vectors_raise_instead_of_being_returned(genai):
+    genai(drop=True)
+    with pytest.raises(EmbeddingError, match="1 usable vectors for 2 texts"):
+        get_embeddings(["a", "b"])
+
+
+def test_no_texts_makes_no_request(genai):
+    fake = genai()
+    assert get_embeddings([]) == []
+    assert fake.batches == []
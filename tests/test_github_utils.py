@@ -0,0 +1,140 @@
+import subprocess
+
+import pytest
+import requests
+
+from github_utils import BatchCommitter, GitHubBackend, LocalGitBackend, RetryableError
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._body = body or {}
+        self.text = str(body)
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error")
+
+
+class FakeSession:
+    """Answers GitHub Git Data API calls from a list of canned responses."""
+
+    def __init__(self, responses):
+        self.headers = {}
+        self.responses = list(responses)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url.rsplit("/repos/owner/repo", 1)[-1]))
+        return self.responses.pop(0)
+
+
+def backend(*responses):
+    return GitHubBackend("owner/repo", "token", session=FakeSession(responses))
+
+
+def test_403_without_rate_limit_headers_is_not_retried():
+    with pytest.raises(requests.HTTPError):
+        backend(FakeResponse(403, {"message": "Bad credentials"})).commit({"a": b"x"}, "m")
+
+
+def test_403_with_retry_after_is_a_rate_limit():
+    with pytest.raises(RetryableError) as error:
+        backend(FakeResponse(403, headers={"Retry-After": "7"})).commit({"a": b"x"}, "m")
+    assert error.value.retry_after == 7
+
+
+def test_403_with_exhausted_quota_waits_for_the_reset(monkeypatch):
+    monkeypatch.setattr("github_utils.time.time", lambda: 1000.0)
+    headers = {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "1060"}
+    with pytest.raises(RetryableError) as error:
+        backend(FakeResponse(403, headers=headers)).commit({"a": b"x"}, "m")
+    assert error.value.retry_after == 60
+
+
+def test_blob_memo_is_cleared_after_each_commit():
+    github = backend(
+        FakeResponse(200, {"object": {"sha": "head"}}),
+        FakeResponse(200, {"tree": {"sha": "base"}}),
+        FakeResponse(200, {"sha": "blob"}),
+        FakeResponse(200, {"sha": "tree"}),
+        FakeResponse(200, {"sha": "commit"}),
+        FakeResponse(200, {}),
+    )
+    assert github.commit({"persona.json.gz": b"\x1f\x8b\xff", "persona.txt": b"text"}, "m") == "commit"
+    assert ("POST", "/git/blobs") in github.session.calls
+    assert github._blob_shas == {}
+
+
+class FailingBackend:
+    def __init__(self, failures):
+        self.failures = failures
+        self.commits = []
+
+    def commit(self, files, message):
+        if self.failures:
+            self.failures -= 1
+            raise requests.HTTPError("401 Bad credentials")
+        self.commits.append(dict(files))
+        return "sha"
+
+
+@pytest.fixture
+def committer_for():
+    committers = []
+
+    def make(backend, **kwargs):
+        committer = BatchCommitter(backend, flush_files=100, flush_seconds=3600, **kwargs)
+        committers.append(committer)
+        return committer
+
+    yield make
+    for committer in committers:
+        committer._stop.set()
+        committer._pending.clear()  # nothing left for the atexit flush
+
+
+def test_failed_flush_is_retried_and_newer_content_wins(committer_for):
+    backend = FailingBackend(failures=1)
+    committer = committer_for(backend)
+    committer.add("alice", {"a/persona.txt": b"v1", "a/persona.md": b"md"})
+    assert committer.flush() == 0
+    committer.add("alice", {"a/persona.txt": b"v2"})
+    assert committer.flush() == 2
+    assert backend.commits == [{"a/persona.txt": b"v2", "a/persona.md": b"md"}]
+    assert committer._failures == {}
+
+
+def test_files_are_dropped_after_max_failed_flushes(committer_for, capsys):
+    committer = committer_for(FailingBackend(failures=100), max_failed_flushes=3)
+    committer.add("alice", {"a/persona.txt": b"v1"})
+    for _ in range(3):
+        committer.flush()
+    assert committer._pending == {} and committer._pending_bytes == 0
+    assert committer.dropped == 1
+    assert "Dropped 1 files for 1 users" in capsys.readouterr().out
+
+
+def test_requeued_files_are_capped(committer_for):
+    committer = committer_for(FailingBackend(failures=100), max_pending_files=2)
+    committer.add("alice", {f"a/{n}": b"x" for n in range(5)})
+    committer.flush()
+    assert len(committer._pending) == 2
+    assert committer.dropped == 3
+
+
+def test_local_backend_commits_on_top_of_the_branch(tmp_path):
+    repo = str(tmp_path / "personas.git")
+    local = LocalGitBackend(repo)
+    first = local.commit({"personas/a/persona.txt": b"hello"}, "first")
+    second = local.commit({"personas/b/persona.txt": b"bye"}, "second")
+    files = subprocess.run(
+        ["git", "--git-dir", repo, "ls-tree", "-r", "--name-only", second], capture_output=True, check=True,
+    ).stdout.decode().split()
+    assert files == ["personas/a/persona.txt", "personas/b/persona.txt"]
+    assert first != second
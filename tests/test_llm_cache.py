@@ -0,0 +1,99 @@
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import llm_cache
+import persona_utils
+from llm_cache import LLMCache, cache_key
+
+
+def last_used(cache, key):
+    with sqlite3.connect(cache.path) as conn:
+        return conn.execute("select last_used from responses where key = ?", (key,)).fetchone()[0]
+
+
+def test_cache_key_depends_on_model_prompt_and_options():
+    keys = {cache_key("m", "p"), cache_key("m2", "p"), cache_key("m", "p2"), cache_key("m", "p", "json")}
+    assert len(keys) == 4
+    assert cache_key("m", "p") == cache_key("m", "p")
+
+
+def test_hit_miss_and_expiry(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm.sqlite3"), ttl_seconds=3600)
+    assert cache.get("k") is None
+    cache.put("k", "model", "response")
+    assert cache.get("k") == "response"
+
+    cache.ttl_seconds = -1
+    assert cache.get("k") is None
+    assert cache.stats()["expired"] == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_lookups_only_touch_entries_older_than_the_interval(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm.sqlite3"), touch_seconds=600)
+    cache.put("k", "model", "response")
+    stored = last_used(cache, "k")
+    cache.get("k")
+    assert last_used(cache, "k") == stored
+
+    cache.touch_seconds = 0
+    time.sleep(0.01)
+    cache.get("k")
+    assert last_used(cache, "k") > stored
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm.sqlite3"), max_bytes=25, touch_seconds=0)
+    cache.put("a", "model", "x" * 10)
+    time.sleep(0.01)
+    cache.put("b", "model", "y" * 10)
+    time.sleep(0.01)
+    cache.get("a")
+    time.sleep(0.01)
+    cache.put("c", "model", "z" * 10)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "x" * 10 and cache.get("c") == "z" * 10
+    assert cache.stats()["evictions"] == 1
+
+
+def test_concurrent_lookups_and_writes(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm.sqlite3"), touch_seconds=0)
+    for i in range(10):
+        cache.put(f"k{i}", "model", f"r{i}")
+
+    def work(i):
+        if i % 4 == 0:
+            cache.put(f"new{i}", "model", "r")
+        return cache.get(f"k{i % 10}")
+
+    with ThreadPoolExecutor(16) as pool:
+        results = list(pool.map(work, range(200)))
+    assert results == [f"r{i % 10}" for i in range(200)]
+
+
+def test_lazy_caches_are_built_once_across_threads(monkeypatch):
+    monkeypatch.setattr(persona_utils, "_llm_cache", None)
+    monkeypatch.setattr(persona_utils, "_scrape_cache", None)
+    built = []
+    original = llm_cache.LLMCache.__init__
+
+    def slow_init(self, *args, **kwargs):
+        built.append(self)
+        time.sleep(0.05)
+        original(self, *args, **kwargs)
+
+    monkeypatch.setattr(llm_cache.LLMCache, "__init__", slow_init)
+    barrier = threading.Barrier(8)
+
+    def get(_):
+        barrier.wait()
+        return persona_utils._get_llm_cache(), persona_utils._get_scrape_cache()
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(get, range(8)))
+    assert len(built) == 1
+    assert len({id(llm) for llm, _ in results}) == 1
+    assert len({id(scrape) for _, scrape in results}) == 1
@@ -0,0 +1,49 @@
+import pytest
+
+import main
+
+
+def test_main_prints_where_the_persona_was_saved(monkeypatch, capsys):
+    posts = [{"url": "https://reddit.com/1", "text": "hello", "created_utc": 1.0, "subreddit": "python", "score": 1}]
+    monkeypatch.setattr(main.sys, "argv", ["main.py", "https://www.reddit.com/user/alice/"])
+    monkeypatch.setattr(main, "scrape_user_data", lambda username: (posts, []))
+    monkeypatch.setattr(main, "build_persona", lambda p, c: ("🎯 Interests:\n- Python", {"MBTI": "INTJ"}))
+
+    main.main()
+
+    out = capsys.readouterr().out
+    assert "_persona.txt" not in out
+    line = next(line for line in out.splitlines() if "Persona generated" in line)
+    assert "/alice/persona.txt" in line and "/alice/persona.json" in line
+
+
+def test_replay_saves_a_snapshot_to_its_own_store(tmp_path, monkeypatch):
+    import activity_dataset
+    import artifact_store
+    import persona_index
+
+    dataset = str(tmp_path / "activity.jsonl.gz")
+    posts = [{"url": "https://reddit.com/1", "text": "hello", "created_utc": 1.0, "subreddit": "python", "score": 1}]
+    activity_dataset.record("alice", posts, [], path=dataset)
+    monkeypatch.setattr(artifact_store, "_store", None)
+    monkeypatch.setattr(activity_dataset, "REPLAY_STORE", None)
+    monkeypatch.setattr(main.sys, "argv", ["main.py", "https://www.reddit.com/user/alice/", "--replay", dataset])
+    monkeypatch.setattr(main, "scrape_user_data", lambda username: pytest.fail("must not scrape"))
+    monkeypatch.setattr(main, "build_persona", lambda p, c: ("🎯 Interests:\n- Python", {"MBTI": "ENTP"}))
+    indexed = persona_index.get_index().get("alice")
+
+    main.main()
+
+    replay_store = dataset + ".personas"
+    assert artifact_store.get_store().location("").startswith(replay_store)
+    saved = [path for path in (tmp_path / "activity.jsonl.gz.personas").rglob("persona.json*")]
+    assert len(saved) == 1 and artifact_store.load_json(str(saved[0]))["snapshot"] is True
+    assert persona_index.get_index().get("alice") == indexed
+
+
+@pytest.mark.parametrize("argv", [["--replay"], ["https://www.reddit.com/user/alice/", "--replay"], ["--store", "x"]])
+def test_bad_options_are_rejected(argv, monkeypatch):
+    monkeypatch.setattr(main.sys, "argv", ["main.py", *argv])
+    with pytest.raises(SystemExit) as exit_info:
+        main.main()
+    assert exit_info.value.code == 2
@@ -0,0 +1,108 @@
+import json
+
+import pytest
+
+import metrics
+from metrics import Counter, Gauge, Histogram
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """A fresh registry, so the test's metrics are the only ones rendered."""
+    registry = []
+    monkeypatch.setattr(metrics, "_registry", registry)
+    return registry
+
+
+def test_text_format(registry):
+    pages = Counter("pages_total", "Pages fetched.")
+    pages.inc(kind="posts")
+    pages.inc(2, kind="comments")
+    depth = Gauge("queue_depth", "Queued users.")
+    depth.set(1.5)
+    weird = Counter("weird_total", "Escaping.")
+    weird.inc(name='a"b\\c\nd')
+
+    assert metrics.render() == "\n".join([
+        "# HELP pages_total Pages fetched.",
+        "# TYPE pages_total counter",
+        'pages_total{kind="comments"} 2',
+        'pages_total{kind="posts"} 1',
+        "# HELP queue_depth Queued users.",
+        "# TYPE queue_depth gauge",
+        "queue_depth 1.5",
+        "# HELP weird_total Escaping.",
+        "# TYPE weird_total counter",
+        'weird_total{name="a\\"b\\\\c\\nd"} 1',
+    ]) + "\n"
+
+
+def test_gauge_function_is_read_at_render_time(registry):
+    gauge = Gauge("lock_age_seconds", "Age.", function=lambda: 42)
+    assert gauge.value() == 0
+    assert "lock_age_seconds 42" in metrics.render()
+
+    gauge.function = lambda: 1 / 0  # a failing callback keeps the last value
+    assert "lock_age_seconds 42" in metrics.render()
+
+
+def test_histogram_buckets_are_cumulative_and_upper_inclusive(registry):
+    latency = Histogram("stage_seconds", "Latency.", buckets=(1, 0.5))
+    for value in (0.2, 0.5, 0.7, 3):
+        latency.observe(value, stage="scrape")
+
+    assert latency.render().splitlines()[2:] == [
+        'stage_seconds_bucket{stage="scrape",le="0.5"} 2',
+        'stage_seconds_bucket{stage="scrape",le="1"} 3',
+        'stage_seconds_bucket{stage="scrape",le="+Inf"} 4',
+        'stage_seconds_sum{stage="scrape"} 4.4',
+        'stage_seconds_count{stage="scrape"} 4',
+    ]
+
+
+def test_metric_types_must_define_samples(registry):
+    class Broken(metrics._Metric):
+        kind = "untyped"
+
+    with pytest.raises(TypeError):
+        Broken("broken", "No samples.")
+
+
+class Usage:
+    prompt_token_count = 100
+    candidates_token_count = 20
+
+
+class Response:
+    usage_metadata = Usage()
+
+
+def test_trace_records_stages_tokens_and_outcome(tmp_path, monkeypatch):
+    path = tmp_path / "trace.jsonl"
+    monkeypatch.setattr(metrics, "TRACE_PATH", str(path))
+    processed = metrics.USERS.value(status="processed")
+    failed = metrics.USERS.value(status="failed")
+
+    with metrics.trace_user("alice"):
+        with metrics.stage("scrape"):
+            pass
+        with metrics.stage("generate"):
+            metrics.record_gemini_usage(Response())
+            metrics.record_gemini_usage(Response())
+    with pytest.raises(ValueError):
+        with metrics.trace_user("bob"):
+            raise ValueError("no posts")
+
+    alice, bob = (json.loads(line) for line in path.read_text().splitlines())
+    assert alice["status"] == "processed" and set(alice["stages"]) == {"scrape", "generate"}
+    assert alice["gemini_tokens"] == {"prompt": 200, "response": 40}
+    assert bob["status"] == "failed" and bob["error"] == "ValueError: no posts"
+    assert metrics.USERS.value(status="processed") == processed + 1
+    assert metrics.USERS.value(status="failed") == failed + 1
+    assert metrics._current_trace() is None
+
+
+def test_tokens_outside_a_trace_only_reach_the_counters():
+    before = metrics.GEMINI_TOKENS.value(kind="prompt")
+    metrics.record_gemini_usage(Response())
+    assert metrics.GEMINI_TOKENS.value(kind="prompt") == before + 100
@@ -0,0 +1,88 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import artifact_store
+import persona_index
+import subreddit_norms
+from persona_index import PersonaIndex
+from persona_utils import save_persona
+from subreddit_norms import SubredditNorms
+
+PERSONA = "🎯 Interests:\n- coffee\n  Source: https://reddit.com/r/coffee/1\n"
+FRAMEWORKS = {
+    "MBTI": "intj",
+    "BigFive": {"openness": 0.8, "conscientiousness": 0.6, "extraversion": 0.3,
+                "agreeableness": 0.5, "neuroticism": 0.4},
+}
+POSTS = [{"title": "beans", "body": "", "subreddit": "coffee", "url": "https://reddit.com/r/coffee/1"}]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifact_store, "_store", artifact_store.LocalArtifactStore(str(tmp_path / "personas")))
+    monkeypatch.setattr(persona_index, "_index", PersonaIndex(str(tmp_path / "index.sqlite3")))
+    monkeypatch.setattr(subreddit_norms, "_norms", SubredditNorms(str(tmp_path / "norms.sqlite3")))
+    return tmp_path / "personas"
+
+
+def test_save_indexes_the_user_and_updates_norms(store):
+    files = save_persona("alice", PERSONA, POSTS, [], frameworks=FRAMEWORKS)
+    row = persona_index.get_index().get("alice")
+    assert row["mbti"] == "INTJ" and row["openness"] == pytest.approx(0.8)
+    assert row["location"] == files["json"]
+    assert row["conf_interests"] == pytest.approx(0.6)
+    assert subreddit_norms.get_norms().norm("coffee") is not None
+
+
+def test_snapshot_skips_index_and_norms(store):
+    files = save_persona("alice_2024-01", PERSONA, POSTS, [], frameworks=FRAMEWORKS, snapshot=True)
+    assert artifact_store.load_json(files["json"])["snapshot"] is True
+    assert len(persona_index.get_index()) == 0
+    assert len(subreddit_norms.get_norms()) == 0
+
+
+def test_rebuild_skips_snapshots(store, tmp_path):
+    save_persona("alice", PERSONA, POSTS, [], frameworks=FRAMEWORKS)
+    save_persona("alice_2024-01", PERSONA, POSTS, [], frameworks=FRAMEWORKS, snapshot=True)
+
+    index = PersonaIndex(str(tmp_path / "rebuilt.sqlite3"))
+    assert persona_index.rebuild(str(store), index) == 1
+    assert index.get("alice") is not None and index.get("alice_2024-01") is None
+
+    norms = SubredditNorms(str(tmp_path / "rebuilt_norms.sqlite3"))
+    assert subreddit_norms.rebuild(str(store), norms) == 1
+
+
+def test_find_filters_on_mbti_and_trait_ranges(tmp_path):
+    index = PersonaIndex(str(tmp_path / "index.sqlite3"))
+    for name, mbti, openness in [("a", "INTJ", 0.9), ("b", "INTJ", 0.2), ("c", "ENFP", 0.9)]:
+        frameworks = {"MBTI": mbti, "BigFive": {**FRAMEWORKS["BigFive"], "openness": openness}}
+        index.add({"username": name, "personality_frameworks": frameworks, "persona": {}})
+    assert index.find(mbti="intj", openness=(0.5, None)) == ["a"]
+    with pytest.raises(ValueError):
+        index.find(curiosity=(0, 1))
+
+
+def test_get_index_builds_one_index_across_threads(tmp_path, monkeypatch):
+    monkeypatch.setattr(persona_index, "_index", None)
+    built = []
+    original = PersonaIndex.__init__
+
+    def slow_init(self, path=None):
+        built.append(self)
+        time.sleep(0.05)
+        original(self, str(tmp_path / "index.sqlite3"))
+
+    monkeypatch.setattr(PersonaIndex, "__init__", slow_init)
+    barrier = threading.Barrier(8)
+
+    def get(_):
+        barrier.wait()
+        return persona_index.get_index()
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(get, range(8)))
+    assert len(built) == 1 and len({id(index) for index in results}) == 1
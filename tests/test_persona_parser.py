@@ -0,0 +1,59 @@
+from persona_parser import header_key, parse_persona
+
+REPORT = """Here is the persona.
+🎯 Interests:
+- Mechanical keyboards Source: https://reddit.com/a
+- Coffee
+Source: https://reddit.com/b
+🤔 Personality Traits:
+- Curious
+2. 🗣️ Tone of Writing:
+- Dry
+🗣 Tone of Writing:
+- Dry, repeated
+🚫 Limitations:
+"""
+
+
+def test_header_key_accepts_numbering_and_missing_variation_selector():
+    assert header_key("🗣️ Tone of Writing:") == "tone_of_writing"
+    assert header_key("🗣 Tone of Writing:") == "tone_of_writing"
+    assert header_key("3) 🎯 Interests") == "interests"
+    assert header_key("I like 🎯 darts") is None
+    assert header_key("- Source: https://x") is None
+
+
+def test_sections_citations_and_confidence():
+    tree = parse_persona(REPORT)
+    assert [section.key for section in tree.sections] == [
+        None, "interests", "personality_traits", "tone_of_writing", "tone_of_writing", "limitations",
+    ]
+    interests = tree.sections[1]
+    assert [(c.text, c.url) for c in interests.citations] == [
+        ("- Mechanical keyboards", "https://reddit.com/a"),
+        ("", "https://reddit.com/b"),
+    ]
+    assert interests.confidence == 0.7
+    assert tree.sections[2].confidence == 0.5
+    assert tree.citation_count() == 2
+
+
+def test_json_skips_the_preamble_and_keeps_the_last_repeat():
+    output = parse_persona(REPORT).to_json()
+    assert set(output) == {"interests", "personality_traits", "tone_of_writing", "limitations"}
+    assert output["limitations"] == {"value": "🚫 Limitations:", "confidence": 0.5}
+    assert output["tone_of_writing"]["value"] == "🗣 Tone of Writing:\n- Dry, repeated"
+
+
+def test_confidence_is_capped():
+    text = "🎯 Interests:\n" + "".join(f"- x Source: https://reddit.com/{i}\n" for i in range(10))
+    assert parse_persona(text).sections[0].confidence == 1.0
+
+
+def test_text_round_trips_and_markdown_links_citations():
+    tree = parse_persona(REPORT)
+    assert tree.to_text() == REPORT.rstrip("\n")
+    markdown = tree.to_markdown().splitlines()
+    assert "## 🎯 Interests:" in markdown
+    assert "- - Mechanical keyboards  " in markdown
+    assert "  **Source:** [https://reddit.com/b](https://reddit.com/b)" in markdown
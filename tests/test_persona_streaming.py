@@ -0,0 +1,35 @@
+import pytest
+
+import artifact_store
+import persona_utils
+from persona_utils import NO_CONTENT_PERSONA, PersonaStreamParser, save_persona_streaming, stream_persona
+
+
+@pytest.fixture
+def no_gemini(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("Gemini must not be called")
+
+    monkeypatch.setattr(persona_utils, "map_to_frameworks", fail)
+    monkeypatch.setattr(persona_utils.clients, "get_gemini_model", fail)
+
+
+def test_parser_splits_sections_across_chunk_boundaries():
+    parser = PersonaStreamParser()
+    sections = []
+    for chunk in ["Intro line\n🎯 Inter", "ests:\n- coffee\n", "🗣️ Tone of Writing:\n- dry", " humour"]:
+        sections.extend(parser.feed(chunk))
+    sections.extend(parser.close())
+    assert [key for key, _ in sections] == [None, "interests", "tone_of_writing"]
+    assert sections[2][1].endswith("- dry humour")
+
+
+def test_no_content_streams_the_placeholder_without_gemini(no_gemini):
+    assert list(stream_persona([], [])) == [(None, NO_CONTENT_PERSONA)]
+
+
+def test_saving_a_no_content_stream_skips_the_framework_call(no_gemini):
+    persona, files = save_persona_streaming("empty_user", stream_persona([], []), [], [])
+    assert persona == NO_CONTENT_PERSONA
+    stored = artifact_store.load_json(files["json"])
+    assert stored["personality_frameworks"] == {}
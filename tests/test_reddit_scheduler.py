@@ -0,0 +1,118 @@
+from types import SimpleNamespace
+
+import pytest
+
+import metrics
+import reddit_scheduler
+from reddit_scheduler import Credential, RedditScheduler, TokenBucket
+
+
+class FakeClock:
+    """Stands in for the ``time`` module: ``sleep`` only advances ``monotonic``."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(reddit_scheduler, "time", SimpleNamespace(monotonic=clock.monotonic, sleep=clock.sleep))
+    return clock
+
+
+class FakeResponse:
+    def __init__(self, status_code, remaining, reset=60.0):
+        self.status_code = status_code
+        self.headers = {"x-ratelimit-remaining": str(remaining), "x-ratelimit-used": "10",
+                        "x-ratelimit-reset": str(reset)}
+
+
+def test_bucket_allows_a_burst_then_paces_at_the_rate(clock):
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+
+
+def test_bucket_refills_up_to_capacity(clock):
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    for _ in range(3):
+        bucket.reserve()
+    clock.now += 1.0
+    assert bucket.available() == pytest.approx(2.0)
+    clock.now += 60.0
+    assert bucket.available() == pytest.approx(3.0)
+
+
+def test_headers_refit_the_rate_net_of_requests_in_flight(clock):
+    bucket = TokenBucket(rate=1.0, capacity=10)
+    bucket.reserve()
+    bucket.reserve()
+    bucket.settle()
+    bucket.update(remaining=31, used=969, reset_seconds=10)
+    assert bucket.remaining == 31 and bucket.used == 969
+    assert bucket.rate == pytest.approx(3.0)  # (31 - 1 pending) / 10 s
+
+
+def test_exhausted_budget_blocks_until_the_window_resets(clock):
+    bucket = TokenBucket(rate=10.0, capacity=10)
+    bucket.update(remaining=0, used=1000, reset_seconds=30)
+    assert bucket.reserve() == pytest.approx(30.0)
+    assert bucket.available() < 0
+    clock.now += 30.0
+    bucket.update(remaining=500, used=500, reset_seconds=600)
+    assert bucket.reserve() == 0.0
+
+
+@pytest.fixture
+def scheduler(clock):
+    return RedditScheduler([Credential("a", "secret"), Credential("b", "secret")])
+
+
+def client_id(reddit):
+    return reddit.config.client_id
+
+
+def test_scheduler_lends_the_credential_with_most_headroom(scheduler):
+    first_slot, second_slot = scheduler._slots
+    for _ in range(5):
+        first_slot.bucket.reserve()
+    with scheduler.reddit() as reddit:
+        assert client_id(reddit) == "b"
+
+
+def test_scheduler_spreads_concurrent_borrowers_over_credentials(scheduler):
+    with scheduler.reddit() as first, scheduler.reddit() as second:
+        assert {client_id(first), client_id(second)} == {"a", "b"}
+    assert [slot.in_flight for slot in scheduler._slots] == [0, 0]
+
+
+def test_429_blocks_the_credential_and_moves_borrowers_off_it(scheduler, clock):
+    slot = scheduler._slots[0]
+    limiter = slot.reddit._core._rate_limiter
+    throttled = metrics.REDDIT_PAGES.value(status=429)
+
+    response = limiter.call(
+        method="GET", url="https://oauth.reddit.com/user/alice/submitted",
+        request_function=lambda method, url, **kwargs: FakeResponse(429, remaining=0, reset=45),
+        set_header_callback=lambda: {},
+    )
+    assert response.status_code == 429
+    assert metrics.REDDIT_PAGES.value(status=429) == throttled + 1
+    assert slot.bucket.pending == 0 and slot.bucket.remaining == 0
+
+    with scheduler.reddit() as reddit:
+        assert client_id(reddit) == "b"
+
+    limiter.delay()  # the next request on "a" waits out the window
+    assert clock.slept[-1] == pytest.approx(45.0)
+    assert scheduler.stats()["credentials"][0]["requests"] == 2
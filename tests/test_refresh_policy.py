@@ -0,0 +1,96 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import refresh_policy
+import worker
+from refresh_policy import (
+    REFRESH_MAX_SECONDS, REFRESH_MIN_SECONDS, REFRESH_RETRY_SECONDS, next_refresh_at, retry_refresh_at,
+)
+
+NOW = 1_700_000_000.0
+DAY = 24 * 3600
+
+
+def delay(when: datetime) -> float:
+    return when.timestamp() - NOW
+
+
+def test_next_refresh_is_half_the_quiet_time():
+    assert delay(next_refresh_at(NOW - 10 * DAY, now=NOW)) == 5 * DAY
+
+
+def test_next_refresh_is_clamped():
+    assert delay(next_refresh_at(NOW - 60, now=NOW)) == REFRESH_MIN_SECONDS
+    assert delay(next_refresh_at(NOW - 365 * DAY, now=NOW)) == REFRESH_MAX_SECONDS
+    assert delay(next_refresh_at(None, now=NOW)) == REFRESH_MAX_SECONDS / 2  # no activity seen yet
+    assert next_refresh_at(None, now=NOW).tzinfo == timezone.utc
+
+
+def test_failed_refreshes_back_off_exponentially_up_to_the_maximum():
+    delays = [delay(retry_refresh_at(failures, now=NOW)) for failures in range(4)]
+    assert delays == [REFRESH_RETRY_SECONDS * 2 ** n for n in range(4)]
+    assert delay(retry_refresh_at(1000, now=NOW)) == REFRESH_MAX_SECONDS
+
+
+class FakeTable:
+    def __init__(self, updates):
+        self.updates = updates
+
+    def update(self, values):
+        self.updates.append(values)
+        return self
+
+    def eq(self, column, value):
+        return self
+
+    def execute(self):
+        return None
+
+
+@pytest.fixture
+def updates(monkeypatch):
+    updates = []
+
+    class FakeSupabase:
+        def table(self, name):
+            assert name == worker.USERNAME_TABLE
+            return FakeTable(updates)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("Reddit is down")
+
+    monkeypatch.setattr(worker, "get_supabase", FakeSupabase)
+    monkeypatch.setattr(worker, "has_new_activity", lambda username, newest: True)
+    monkeypatch.setattr(worker, "scrape_user_data", fail)
+    return updates
+
+
+def test_a_failed_refresh_is_pushed_back(updates):
+    worker.process_user({"id": 1, "username": "alice", "processed": True,
+                         "newest_created_utc": NOW, "refresh_failures": 2})
+    (update,) = updates
+    assert update["locked"] is False and update["refresh_failures"] == 3
+    retry_at = datetime.fromisoformat(update["next_refresh_at"])
+    assert retry_at.timestamp() - datetime.now(timezone.utc).timestamp() == pytest.approx(
+        4 * refresh_policy.REFRESH_RETRY_SECONDS, abs=60
+    )
+
+
+def test_a_failed_first_run_backs_off_too(updates):
+    worker.process_user({"id": 1, "username": "alice", "processed": False})
+    (update,) = updates
+    assert update["locked"] is False and update["refresh_failures"] == 1
+    retry_at = datetime.fromisoformat(update["next_refresh_at"])
+    assert retry_at.timestamp() - datetime.now(timezone.utc).timestamp() == pytest.approx(
+        refresh_policy.REFRESH_RETRY_SECONDS, abs=60
+    )
+    assert "parked_at" not in update
+
+
+def test_a_user_is_parked_after_max_failures(updates):
+    worker.process_user({"id": 1, "username": "alice", "processed": False,
+                         "refresh_failures": worker.MAX_FAILURES - 1})
+    (update,) = updates
+    assert update["refresh_failures"] == worker.MAX_FAILURES
+    assert update["parked_at"] is not None
@@ -0,0 +1,53 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+import activity_dataset
+import artifact_store
+import replay
+import track_evolution
+
+JANUARY = datetime(2024, 1, 15, tzinfo=timezone.utc).timestamp()
+FEBRUARY = datetime(2024, 2, 15, tzinfo=timezone.utc).timestamp()
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    path = str(tmp_path / "activity.jsonl")
+    posts = [{"url": f"https://reddit.com/{n}", "text": f"post {n}", "created_utc": t, "subreddit": "a", "score": 1}
+             for n, t in enumerate([JANUARY, FEBRUARY])]
+    recorded = datetime(2024, 3, 1, tzinfo=timezone.utc).timestamp()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"username": "alice", "scraped_at": recorded, "source": activity_dataset.EVOLUTION,
+                            "posts": posts, "comments": []}) + "\n")
+    monkeypatch.setattr(artifact_store, "_store", None)
+    monkeypatch.setattr(activity_dataset, "REPLAY_STORE", None)
+    monkeypatch.setattr(track_evolution, "CACHE_DIR", tmp_path / "evolution")
+    monkeypatch.setattr(track_evolution, "save_persona", lambda *args, **kwargs: {})
+    return path
+
+
+def test_a_failed_month_fails_the_user_and_is_retried(dataset, monkeypatch):
+    def flaky(posts, comments):
+        if posts[0]["created_utc"] == JANUARY:
+            raise RuntimeError("quota")
+        return "🎯 Interests:\n- posting", {"MBTI": "INTP"}
+
+    monkeypatch.setattr(track_evolution, "build_persona", flaky)
+    assert replay.replay(dataset, workers=1, evolution_months=3) == {"processed": 0, "failed": 1, "skipped": 0}
+    with open(dataset + ".progress.jsonl", encoding="utf-8") as f:
+        (progress,) = [json.loads(line) for line in f]
+    assert progress["status"] == "failed" and "2024-01" in progress["error"]
+
+    monkeypatch.setattr(track_evolution, "build_persona", lambda p, c: ("🎯 Interests:\n- posting", {"MBTI": "INTP"}))
+    assert replay.replay(dataset, workers=1, evolution_months=3) == {"processed": 1, "failed": 0, "skipped": 0}
+
+
+def test_replayed_months_skip_the_month_cache(dataset, monkeypatch):
+    calls = []
+    monkeypatch.setattr(track_evolution, "build_persona",
+                        lambda p, c: (calls.append(1), ("🎯 Interests:\n- posting", {"MBTI": "INTP"}))[1])
+    replay.replay(dataset, workers=1, evolution_months=3)
+    replay.replay(dataset, workers=1, evolution_months=3, restart=True)
+    assert len(calls) == 4
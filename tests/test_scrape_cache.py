@@ -0,0 +1,124 @@
+import threading
+
+import pytest
+
+import persona_utils
+from scrape_cache import EXHAUSTED, ListingState, ScrapeCache
+
+
+def item(n, score=0):
+    return {"url": f"https://reddit.com/{n}", "created_utc": float(n), "text": f"item {n}", "score": score}
+
+
+def test_merge_tracks_high_water_and_depth(tmp_path):
+    cache = ScrapeCache(str(tmp_path / "cache.sqlite3"))
+    assert cache.state("Alice", "posts") is None
+
+    cache.merge("Alice", "posts", [item(3), item(1), item(2)], depth=30)
+    state = cache.state("alice", "posts")
+    assert (state.high_water, state.depth) == (3.0, 30)
+
+    cache.merge("alice", "posts", [item(5)], depth=30)
+    assert cache.state("ALICE", "posts").high_water == 5.0
+    assert cache.state("alice", "comments") is None
+
+
+def test_merge_with_no_items_keeps_high_water(tmp_path):
+    cache = ScrapeCache(str(tmp_path / "cache.sqlite3"))
+    cache.merge("alice", "posts", [item(7)], depth=30)
+    cache.merge("alice", "posts", [], depth=EXHAUSTED)
+    state = cache.state("alice", "posts")
+    assert (state.high_water, state.depth) == (7.0, EXHAUSTED)
+
+
+def test_refetched_items_replace_the_cached_copy(tmp_path):
+    cache = ScrapeCache(str(tmp_path / "cache.sqlite3"))
+    cache.merge("alice", "posts", [item(1, score=1), item(2)], depth=30)
+    cache.merge("alice", "posts", [item(1, score=99)], depth=30)
+
+    recent = cache.recent("alice", "posts", 10)
+    assert [i["created_utc"] for i in recent] == [2.0, 1.0]
+    assert recent[1]["score"] == 99
+
+
+def test_recent_is_newest_first_and_limited(tmp_path):
+    cache = ScrapeCache(str(tmp_path / "cache.sqlite3"))
+    cache.merge("alice", "comments", [item(n) for n in range(10)], depth=EXHAUSTED)
+    assert [i["created_utc"] for i in cache.recent("alice", "comments", 3)] == [9.0, 8.0, 7.0]
+
+
+def test_covers():
+    assert ListingState(0, EXHAUSTED, 0).covers(1000)
+    assert ListingState(0, 30, 0).covers(30)
+    assert not ListingState(0, 30, 0).covers(100)
+
+
+def test_concurrent_merges_wait_instead_of_failing(tmp_path):
+    cache = ScrapeCache(str(tmp_path / "cache.sqlite3"))
+    errors = []
+
+    def writer(user):
+        try:
+            for n in range(20):
+                cache.merge(user, "posts", [item(n)] if n % 3 else [], depth=30)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(f"user{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert all(cache.state(f"user{i}", "posts").high_water == 19.0 for i in range(8))
+
+
+class FakeListings:
+    """Stands in for ``iter_user_activity``: newest-first listings, counting items read."""
+
+    def __init__(self, posts, comments=()):
+        self.listings = {"posts": list(posts), "comments": list(comments)}
+        self.read = 0
+
+    def __call__(self, username, limit=30, until=None, stop=None):
+        for kind, items in self.listings.items():
+            for entry in items[:limit]:
+                self.read += 1
+                if until and until(kind, entry):
+                    break
+                yield kind, entry
+
+
+@pytest.fixture
+def refresh(tmp_path, monkeypatch):
+    monkeypatch.setattr(persona_utils, "_scrape_cache", ScrapeCache(str(tmp_path / "cache.sqlite3")))
+
+    def run(listings, limit, until=None):
+        monkeypatch.setattr(persona_utils, "iter_user_activity", listings)
+        return persona_utils._refresh_listings("alice", limit, until)
+
+    return run
+
+
+def test_windowed_refresh_reuses_the_cache(refresh):
+    listings = FakeListings([item(n) for n in range(100, 0, -1)])
+    posts, comments = refresh(listings, 300, persona_utils.older_than(60))
+    assert [i["created_utc"] for i in posts] == [float(n) for n in range(100, 59, -1)] and comments == []
+    assert listings.read == 42  # the window plus the item that ended it
+
+    listings = FakeListings([item(101)] + [item(n) for n in range(100, 0, -1)])
+    posts, _ = refresh(listings, 300, persona_utils.older_than(60))
+    assert posts[0]["created_utc"] == 101.0 and len(posts) == 42
+    assert listings.read == 2  # only the new item and the cached high-water mark
+
+
+def test_windowed_refresh_does_not_leave_a_gap(refresh):
+    # Cached up to 10; since then 80 (outside the window) and 95 (inside).
+    refresh(FakeListings([item(10), item(5)]), 30)
+    listings = [item(95), item(80), item(10), item(5)]
+    posts, _ = refresh(FakeListings(listings), 300, persona_utils.older_than(90))
+    assert [i["created_utc"] for i in posts] == [95.0]
+
+    posts, _ = refresh(FakeListings(listings), 30)
+    assert [i["created_utc"] for i in posts] == [95.0, 80.0, 10.0, 5.0]
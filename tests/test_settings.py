@@ -0,0 +1,102 @@
+"""Settings that may live only in ``.env`` must be read after ``load_env()``."""
+
+import importlib
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import clients
+import env_loader
+
+
+@pytest.fixture
+def dotenv(monkeypatch):
+    """Pretend ``.env`` sets ``values``: they appear in the environment when ``load_env`` runs."""
+    def install(**values):
+        def load_env():
+            for name, value in values.items():
+                monkeypatch.setenv(name, value)
+            return {}
+
+        monkeypatch.setattr(env_loader, "load_env", load_env)
+        monkeypatch.setattr(clients, "load_env", load_env)
+        for name in values:
+            monkeypatch.delenv(name, raising=False)
+
+    return install
+
+
+def test_gemini_model_is_read_after_load_env(dotenv):
+    dotenv(GEMINI_MODEL="models/from-dotenv")
+    assert clients.gemini_model_name() == "models/from-dotenv"
+
+
+def test_qdrant_settings_are_read_when_the_client_is_built(dotenv, monkeypatch):
+    dotenv(QDRANT_HOST="qdrant.internal", QDRANT_PORT="7000")
+    seen = {}
+
+    class QdrantClient:
+        def __init__(self, host, port):
+            seen.update(host=host, port=port)
+
+    monkeypatch.setattr("qdrant_client.QdrantClient", QdrantClient)
+    monkeypatch.setattr(clients, "_clients", {})
+    clients.get_qdrant()
+    assert seen == {"host": "qdrant.internal", "port": 7000}
+
+
+@pytest.mark.parametrize("module, setting, name", [
+    ("llm_cache", "TTL_SECONDS", "LLM_CACHE_TTL_SECONDS"),
+    ("scrape_cache", "CACHE_PATH", "SCRAPE_CACHE_PATH"),
+])
+def test_cache_settings_are_read_after_load_env(dotenv, monkeypatch, module, setting, name):
+    dotenv(**{name: "123"})
+    cache = importlib.import_module(module)
+    try:
+        assert str(getattr(importlib.reload(cache), setting)) == "123"
+    finally:
+        monkeypatch.undo()
+        importlib.reload(cache)
+
+
+# module, setting, variable: read at import time, so checked in a fresh
+# interpreter where ``load_env`` is the only thing that sets the variable.
+IMPORT_TIME_SETTINGS = [
+    ("activity_dataset", "RECORD_PATH", "ACTIVITY_RECORD_PATH"),
+    ("activity_dataset", "REPLAY_STORE", "REPLAY_STORE"),
+    ("artifact_store", "STORE_DIR", "PERSONA_STORE_DIR"),
+    ("metrics", "TRACE_PATH", "METRICS_TRACE_PATH"),
+    ("persona_index", "INDEX_PATH", "PERSONA_INDEX_PATH"),
+    ("subreddit_norms", "NORMS_PATH", "PERSONA_NORMS_PATH"),
+    ("github_utils", "GITHUB_BRANCH", "GITHUB_BRANCH"),
+    ("embedding_utils", "EMBEDDING_MODEL", "EMBEDDING_MODEL"),
+    ("reddit_scheduler", "BURST", "REDDIT_BURST"),
+    ("vector_db", "COLLECTION_NAME", "COLLECTION_NAME"),
+]
+
+_PROBE = """
+import importlib, json, os, sys
+import env_loader
+values = json.loads(sys.argv[1])
+env_loader.load_env = lambda: os.environ.update(values) or {}
+settings = {}
+for module, setting, _ in json.loads(sys.argv[2]):
+    settings[f"{module}.{setting}"] = str(getattr(importlib.import_module(module), setting))
+print(json.dumps(settings))
+"""
+
+
+def test_import_time_settings_are_read_after_load_env(tmp_path):
+    values = {name: f"{index}" for index, (_, _, name) in enumerate(IMPORT_TIME_SETTINGS)}
+    env = {key: value for key, value in __import__("os").environ.items() if key not in values}
+    root = Path(__file__).resolve().parent.parent
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE, json.dumps(values), json.dumps(IMPORT_TIME_SETTINGS)],
+        cwd=root, env=env, capture_output=True, text=True, check=True,
+    )
+    settings = json.loads(result.stdout.strip().splitlines()[-1])
+    for module, setting, name in IMPORT_TIME_SETTINGS:
+        assert settings[f"{module}.{setting}"] == values[name], (module, setting)
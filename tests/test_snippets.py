@@ -0,0 +1,71 @@
+import pytest
+
+from snippets import estimate_tokens, select_snippets
+
+LONG = "I finally switched my home server from Ubuntu to Debian and the upgrade went smoothly this time"
+
+
+def item(n, text, score=0, subreddit="linux"):
+    return {"text": text, "url": f"https://reddit.com/{n}", "created_utc": n, "score": score, "subreddit": subreddit}
+
+
+def texts(snippets):
+    return [snippet.split("\nSource:")[0] for snippet in snippets]
+
+
+def test_exact_duplicates_empty_and_deleted_bodies_are_skipped():
+    items = [item(5, LONG), item(4, LONG.upper() + "!!"), item(3, "[deleted]"), item(2, "   "), item(1, "ok")]
+    assert texts(select_snippets(items)) == [LONG, "ok"]
+
+
+def test_reposts_that_differ_by_a_word_are_skipped():
+    repost = LONG.replace("smoothly", "perfectly")
+    assert texts(select_snippets([item(2, LONG), item(1, repost)])) == [LONG]
+
+
+def test_quotes_of_a_kept_item_are_skipped():
+    quote = "> " + LONG[:60]
+    assert texts(select_snippets([item(2, LONG), item(1, quote)])) == [LONG]
+
+
+def test_a_longer_item_containing_a_kept_one_is_kept():
+    longer = LONG + " but then the wifi driver broke again and I spent a whole weekend rebuilding the kernel"
+    assert texts(select_snippets([item(2, LONG), item(1, longer)])) == [LONG, longer]
+
+
+def test_short_texts_only_match_exactly():
+    assert texts(select_snippets([item(3, "so true"), item(2, "so false"), item(1, "So true.")])) == [
+        "so true", "so false",
+    ]
+
+
+def test_budget_is_respected_and_smaller_items_still_fit():
+    items = [item(3, "a" * 400), item(2, "b" * 4000), item(1, "c" * 40)]
+    snippets = select_snippets(items, token_budget=150, max_item_tokens=1000)
+    assert texts(snippets) == ["a" * 400, "c" * 40]
+    assert sum(estimate_tokens(s) for s in snippets) <= 150
+
+
+def test_long_bodies_are_truncated():
+    (snippet,) = select_snippets([item(1, "word " * 1000)], max_item_tokens=10)
+    assert texts([snippet])[0].endswith(" …")
+    assert len(texts([snippet])[0]) <= 10 * 4 + 2
+
+
+@pytest.mark.parametrize("ranking, expected", [
+    ("recency", ["new low", "mid other", "old high"]),
+    ("score", ["old high", "mid other", "new low"]),
+    ("diversity", ["old high", "mid other", "new low"]),
+])
+def test_rankings(ranking, expected):
+    items = [
+        item(1, "old high", score=50),
+        item(3, "new low", score=1),
+        item(2, "mid other", score=10, subreddit="python"),
+    ]
+    assert texts(select_snippets(items, ranking=ranking)) == expected
+
+
+def test_unknown_ranking():
+    with pytest.raises(ValueError):
+        select_snippets([item(1, "x")], ranking="random")
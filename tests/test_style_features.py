@@ -0,0 +1,66 @@
+import random
+import re
+
+import numpy as np
+import pytest
+
+import style_features
+from style_features import extract_features, summarize
+
+THURSDAY_MIDNIGHT = 0  # the Unix epoch
+POSTS = [{"text": "Hello world. How are you?", "created_utc": THURSDAY_MIDNIGHT, "subreddit": "a", "score": 5}]
+COMMENTS = [{"text": "I love it! 😀", "created_utc": 25 * 3600, "subreddit": "b", "score": -1}]
+# Per-item reference regexes for the single-pass tokenizer.
+WORD_RE = re.compile(r"[^\W\d_]+(?:['’][^\W\d_]+)*")
+SENTENCE_END_RE = re.compile(r"[.!?]+(?=\s|$)|\n+")
+
+
+def test_small_profile_by_hand():
+    features = extract_features(POSTS, COMMENTS)
+    assert (features["items"], features["posts"], features["comments"], features["words"]) == (2, 1, 1, 8)
+    assert features["sentence_length"]["mean"] == pytest.approx(8 / 3, abs=1e-3)
+    assert features["sentence_length"]["max"] == 3
+    assert features["vocabulary"] == {"distinct": 8, "type_token_ratio": 1.0, "root_ttr": 2.828, "hapax_ratio": 1.0}
+    rates = features["rates"]
+    assert rates["emoji_per_100_words"] == 12.5 and rates["items_with_emoji"] == 0.5
+    assert rates["questions_per_sentence"] == rates["exclamations_per_sentence"] == 0.3333
+    hours, weekdays = features["posting_hours_utc"], features["posting_weekdays"]
+    assert hours[0] == hours[1] == 0.5 and sum(hours) == 1
+    assert weekdays[3] == weekdays[4] == 0.5  # Thursday, Friday
+    assert features["subreddits"]["entropy_bits"] == 1.0
+    assert features["scores"]["posts"]["mean"] == 5 and features["scores"]["comments"]["negative_share"] == 1.0
+
+
+def test_no_items():
+    features = extract_features([], [])
+    assert features["words"] == 0 and features["sentence_length"]["mean"] == 0.0
+    assert sum(features["posting_hours_utc"]) == 0 and features["subreddits"]["entropy_bits"] == 0.0
+    assert summarize(features) == ""
+
+
+def test_one_pass_tokenizer_matches_per_item_regexes():
+    rng = random.Random(7)
+    vocabulary = ["cat", "dog", "it's", "don’t", "naïve", "x2", "42", "ok.", "why?", "wow!!", "\n", "...", "a_b"]
+    texts = [" ".join(rng.choice(vocabulary) for _ in range(rng.randint(0, 40))) for _ in range(50)]
+
+    words, word_item, sentence_lengths = style_features._tokenize(texts)
+
+    expected_words, expected_lengths = [], []
+    for text in texts:
+        item_words = WORD_RE.findall(text.lower())
+        expected_words.extend(item_words)
+        for sentence in SENTENCE_END_RE.split(text.lower()):
+            count = len(WORD_RE.findall(sentence))
+            if count:
+                expected_lengths.append(count)
+    assert list(words) == expected_words
+    assert np.bincount(word_item, minlength=len(texts)).tolist() == [
+        len(WORD_RE.findall(text.lower())) for text in texts
+    ]
+    assert sorted(sentence_lengths.tolist()) == sorted(expected_lengths)
+
+
+def test_summary_mentions_the_main_numbers():
+    summary = summarize(extract_features(POSTS, COMMENTS))
+    assert "1 posts, 1 comments, 8 words" in summary
+    assert "r/a 50%" in summary and "00h" in summary
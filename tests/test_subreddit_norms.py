@@ -0,0 +1,104 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import subreddit_norms
+from persona_parser import BIG_FIVE_TRAITS
+from subreddit_norms import SubredditNorms, _add, _remove, activity_weights
+
+
+def profile(rng):
+    return {"BigFive": {trait: rng.random() for trait in BIG_FIVE_TRAITS}}
+
+
+def brute_force(contributions, subreddit):
+    """Weighted mean and population std of the users currently in ``subreddit``."""
+    rows = [(weights[subreddit], frameworks) for weights, frameworks in contributions.values() if subreddit in weights]
+    weights = np.array([weight for weight, _ in rows])
+    values = np.array([[frameworks["BigFive"][trait] for trait in BIG_FIVE_TRAITS] for _, frameworks in rows])
+    mean = (weights[:, None] * values).sum(axis=0) / weights.sum()
+    std = np.sqrt((weights[:, None] * (values - mean) ** 2).sum(axis=0) / weights.sum())
+    return len(rows), mean, std
+
+
+def test_add_then_remove_restores_the_row():
+    norm = [0, 0.0] + [0.0] * (2 * len(BIG_FIVE_TRAITS))
+    _add(norm, 2.0, (0.1, 0.2, 0.3, 0.4, 0.5))
+    before = list(norm)
+    _add(norm, 3.0, (0.9, 0.8, 0.7, 0.6, 0.5))
+    _remove(norm, 3.0, (0.9, 0.8, 0.7, 0.6, 0.5))
+    assert norm == pytest.approx(before)
+    _remove(norm, 2.0, (0.1, 0.2, 0.3, 0.4, 0.5))
+    assert norm == [0, 0.0] + [0.0] * (2 * len(BIG_FIVE_TRAITS))
+
+
+def test_running_norms_match_brute_force_after_updates(tmp_path):
+    rng = random.Random(3)
+    norms = SubredditNorms(str(tmp_path / "norms.sqlite3"))
+    subreddits = ["a", "b", "c", "d"]
+    contributions = {}
+    for step in range(120):
+        username = f"user{rng.randrange(25)}"  # many re-saves replace earlier contributions
+        weights = {name: float(rng.randint(1, 9)) for name in rng.sample(subreddits, rng.randint(1, 3))}
+        frameworks = profile(rng)
+        norms.update(username, frameworks, weights)
+        contributions[username] = (weights, frameworks)
+
+    for subreddit in subreddits:
+        users, mean, std = brute_force(contributions, subreddit)
+        stored = norms.norm(subreddit)
+        assert stored["users"] == users
+        assert [stored["mean"][trait] for trait in BIG_FIVE_TRAITS] == pytest.approx(mean, abs=1e-9)
+        assert [stored["std"][trait] for trait in BIG_FIVE_TRAITS] == pytest.approx(std, abs=1e-6)
+
+
+def test_incomplete_profile_only_withdraws_the_user(tmp_path):
+    norms = SubredditNorms(str(tmp_path / "norms.sqlite3"))
+    norms.update("alice", profile(random.Random(1)), {"a": 1.0})
+    norms.update("bob", profile(random.Random(2)), {"a": 1.0, "b": 1.0})
+    norms.update("Bob", {"BigFive": {"openness": 0.5}}, {"a": 1.0})
+    assert norms.norm("a")["users"] == 1
+    assert norms.norm("b") is None
+
+
+def test_typicality_and_closest(tmp_path):
+    rng = random.Random(5)
+    norms = SubredditNorms(str(tmp_path / "norms.sqlite3"))
+    for i in range(5):
+        norms.update(f"low{i}", {"BigFive": {t: 0.1 + 0.02 * rng.random() for t in BIG_FIVE_TRAITS}}, {"low": 1.0})
+        norms.update(f"high{i}", {"BigFive": {t: 0.9 + 0.02 * rng.random() for t in BIG_FIVE_TRAITS}}, {"high": 1.0})
+    someone = {"BigFive": {trait: 0.88 for trait in BIG_FIVE_TRAITS}}
+    assert [name for name, _ in norms.closest(someone, k=2)] == ["high", "low"]
+    assert norms.typicality(someone, "HIGH")["distance"] < norms.typicality(someone, "low")["distance"]
+    assert norms.typicality(someone, "missing") is None
+
+
+def test_activity_weights_count_items_per_subreddit():
+    posts = [{"subreddit": "a"}, {"subreddit": "a"}, {"subreddit": ""}]
+    assert activity_weights(posts, [{"subreddit": "b"}, {}]) == {"a": 2.0, "b": 1.0}
+
+
+def test_get_norms_builds_one_store_across_threads(tmp_path, monkeypatch):
+    monkeypatch.setattr(subreddit_norms, "_norms", None)
+    built = []
+    original = SubredditNorms.__init__
+
+    def slow_init(self, path=None):
+        built.append(self)
+        time.sleep(0.05)
+        original(self, str(tmp_path / "norms.sqlite3"))
+
+    monkeypatch.setattr(SubredditNorms, "__init__", slow_init)
+    barrier = threading.Barrier(8)
+
+    def get(_):
+        barrier.wait()
+        return subreddit_norms.get_norms()
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(get, range(8)))
+    assert len(built) == 1 and len({id(norms) for norms in results}) == 1
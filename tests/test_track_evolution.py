@@ -0,0 +1,74 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import persona_utils
+import track_evolution
+from track_evolution import get_month_date_ranges, month_cache_key, process_month
+
+POSTS = [{"url": "https://reddit.com/1", "text": "hello", "created_utc": 1.0, "score": 3}]
+
+
+def test_month_ranges_across_the_new_year():
+    ranges = get_month_date_ranges(3, datetime(2025, 1, 10, tzinfo=timezone.utc))
+    assert [start.strftime("%Y-%m") for start, _ in ranges] == ["2024-11", "2024-12", "2025-01"]
+    december_start, december_end = ranges[1]
+    assert december_start == datetime(2024, 12, 1, tzinfo=timezone.utc)
+    assert december_end == datetime(2024, 12, 31, 23, 59, 59, tzinfo=timezone.utc)
+    assert ranges[2][1] == datetime(2025, 1, 31, 23, 59, 59, tzinfo=timezone.utc)
+
+
+def test_month_ranges_in_december():
+    ranges = get_month_date_ranges(2, datetime(2024, 12, 31, 23, 0, tzinfo=timezone.utc))
+    assert ranges[-1] == (datetime(2024, 12, 1, tzinfo=timezone.utc),
+                          datetime(2024, 12, 31, 23, 59, 59, tzinfo=timezone.utc))
+    assert ranges[0][0] == datetime(2024, 11, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def months(tmp_path, monkeypatch):
+    calls = []
+
+    def build_persona(posts, comments):
+        calls.append(len(posts))
+        return "🎯 Interests:\n- hello", {"MBTI": "INTP"}
+
+    monkeypatch.setattr(track_evolution, "CACHE_DIR", tmp_path / "evolution")
+    monkeypatch.setattr(track_evolution, "build_persona", build_persona)
+    monkeypatch.setattr(track_evolution, "save_persona", lambda *args, **kwargs: {})
+    return calls
+
+
+def test_closed_months_are_cached(months):
+    assert process_month("alice", "2024-01", POSTS, [], closed=True) == "✅"
+    assert process_month("alice", "2024-01", POSTS, [], closed=True) == "✅ (cached)"
+    assert months == [1]
+
+
+def test_open_months_and_failed_mappings_are_not_cached(months, monkeypatch):
+    process_month("alice", "2024-02", POSTS, [], closed=False)
+    process_month("alice", "2024-02", POSTS, [], closed=False)
+    monkeypatch.setattr(track_evolution, "build_persona", lambda p, c: (months.append(0), ("text", {}))[1])
+    process_month("alice", "2024-03", POSTS, [], closed=True)
+    assert process_month("alice", "2024-03", POSTS, [], closed=True) == "✅"
+    assert len(months) == 4
+
+
+def test_scores_do_not_change_the_key():
+    rescored = [{**POSTS[0], "score": 99}]
+    assert month_cache_key("2024-01", POSTS, []) == month_cache_key("2024-01", rescored, [])
+    assert month_cache_key("2024-01", POSTS, []) != month_cache_key("2024-02", POSTS, [])
+
+
+@pytest.mark.parametrize("change", [
+    lambda mp: mp.setattr(persona_utils, "PERSONA_STRUCTURED", not persona_utils.PERSONA_STRUCTURED),
+    lambda mp: mp.setattr(persona_utils, "PERSONA_TOKEN_BUDGET", 1234),
+    lambda mp: mp.setenv("GEMINI_MODEL", "some-other-model"),
+    lambda mp: mp.setattr(persona_utils, "_persona_prompt", lambda snippets, style="": "new prompt"),
+])
+def test_generation_settings_change_the_key(change, months, monkeypatch):
+    process_month("alice", "2024-01", POSTS, [], closed=True)
+    before = month_cache_key("2024-01", POSTS, [])
+    change(monkeypatch)
+    assert month_cache_key("2024-01", POSTS, []) != before
+    assert process_month("alice", "2024-01", POSTS, [], closed=True) == "✅"
@@ -0,0 +1,174 @@
+import logging
+
+import numpy as np
+import pytest
+
+import metrics
+import vector_db
+from vector_db import InMemoryPersonaIndex, VectorWriter, persona_point_id
+
+
+@pytest.fixture
+def index(monkeypatch):
+    index = InMemoryPersonaIndex()
+    monkeypatch.setattr(vector_db, "VECTOR_BACKEND", "memory")
+    monkeypatch.setattr(vector_db, "_memory_index", index)
+    return index
+
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    """``get_embeddings`` stand-in that fails while ``state["fail"]`` is true."""
+    state = {"fail": False, "calls": 0}
+
+    def get_embeddings(texts):
+        state["calls"] += 1
+        if state["fail"]:
+            raise RuntimeError("503 embedding service unavailable")
+        return [[float(len(text)), 1.0] for text in texts]
+
+    monkeypatch.setattr(vector_db, "get_embeddings", get_embeddings)
+    return state
+
+
+@pytest.fixture
+def writer():
+    writer = VectorWriter(flush_count=100, flush_seconds=3600, max_attempts=3)
+    yield writer
+    writer._stop.set()
+
+
+def test_point_ids_are_deterministic_per_user_and_version():
+    assert persona_point_id("Alice") == persona_point_id("alice")
+    assert persona_point_id("alice", "v1") != persona_point_id("alice", "v2")
+
+
+def test_payload_flattens_mbti_and_top_subreddits():
+    items = [{"subreddit": "python"}] * 3 + [{"subreddit": "rust"}]
+    payload = vector_db.persona_payload({"MBTI": "intj"}, items, [], top_subreddits=1)
+    assert payload["mbti"] == "INTJ" and payload["subreddits"] == ["python"]
+
+
+def test_flush_upserts_the_latest_version_of_each_point(index, embeddings, writer):
+    writer.add("alice", "old", {})
+    writer.add("alice", "newer text", {})
+    writer.add("bob", "hi", {})
+    assert writer.flush() == 2
+    assert embeddings["calls"] == 1
+    assert index.retrieve(persona_point_id("alice"))[1]["username"] == "alice"
+    assert len(index) == 2
+
+
+def test_failed_flush_keeps_points_queued(index, embeddings, writer):
+    writer.add("alice", "text", {})
+    embeddings["fail"] = True
+    assert writer.flush() == 0
+    assert len(index) == 0
+
+    embeddings["fail"] = False
+    assert writer.flush() == 1
+    assert len(index) == 1
+    assert writer._failures == {}
+
+
+def test_newer_version_queued_during_a_failed_flush_wins(index, embeddings, writer, monkeypatch):
+    writer.add("alice", "first", {"mbti": "INTJ"})
+
+    def fail_after_new_add(texts):
+        writer.add("alice", "second", {"mbti": "ENFP"})
+        raise RuntimeError("timeout")
+
+    monkeypatch.setattr(vector_db, "get_embeddings", fail_after_new_add)
+    writer.flush()
+    assert writer._pending[persona_point_id("alice")][1] == "second"
+
+    monkeypatch.setattr(vector_db, "get_embeddings", lambda texts: [[1.0, 0.0] for _ in texts])
+    writer.flush()
+    assert index.retrieve(persona_point_id("alice"))[1]["mbti"] == "ENFP"
+
+
+def test_points_are_dropped_after_max_attempts(index, embeddings, writer, caplog):
+    dropped = metrics.VECTOR_DROPPED.value()
+    writer.add("alice", "text", {})
+    embeddings["fail"] = True
+    for _ in range(writer.max_attempts):
+        writer.flush()
+    assert writer._pending == {} and writer._failures == {}
+    assert metrics.VECTOR_DROPPED.value() == dropped + 1
+    (record,) = [record for record in caplog.records if "Dropped" in record.message]
+    assert record.levelno == logging.ERROR
+    assert "Dropped 1 personas after 3 failed vector DB pushes: alice" in record.message
+
+
+def random_points(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    types = ["INTJ", "ENFP", "ISTP"]
+    return [
+        vector_db.MemoryPoint(
+            id=f"p{i}",
+            vector=rng.normal(size=8).tolist(),
+            payload={
+                "username": f"user{i}",
+                "mbti": types[i % 3],
+                "subreddits": ["python", "rust"][: 1 + i % 2],
+                "traits": {"BigFive": {"openness": float(rng.random())}} if i % 5 else {},
+            },
+        )
+        for i in range(n)
+    ]
+
+
+def brute_force_knn(points, query, k, keep=lambda payload: True, exclude=None):
+    def cosine(vector):
+        vector = np.asarray(vector)
+        return float(vector @ query / (np.linalg.norm(vector) * np.linalg.norm(query)))
+
+    hits = [(cosine(p.vector), p.payload["username"]) for p in points if keep(p.payload) and p.id != exclude]
+    return [username for _, username in sorted(hits, reverse=True)[:k]]
+
+
+def openness(payload):
+    return payload["traits"].get("BigFive", {}).get("openness")
+
+
+@pytest.mark.parametrize("filters, keep", [
+    (None, lambda payload: True),
+    ({"mbti": "INTJ"}, lambda payload: payload["mbti"] == "INTJ"),
+    ({"mbti": ["ENFP", "ISTP"]}, lambda payload: payload["mbti"] != "INTJ"),
+    ({"subreddits": "rust"}, lambda payload: "rust" in payload["subreddits"]),
+    ({"traits.BigFive.openness": (0.3, 0.6)}, lambda payload: openness(payload) is not None and 0.3 <= openness(payload) <= 0.6),
+    ({"traits.BigFive.openness": (None, 0.5), "mbti": "ENFP"},
+     lambda payload: payload["mbti"] == "ENFP" and openness(payload) is not None and openness(payload) <= 0.5),
+])
+def test_memory_search_matches_brute_force(filters, keep):
+    points = random_points()
+    index = InMemoryPersonaIndex()
+    index.upsert(points)
+    query = np.random.default_rng(1).normal(size=8)
+    hits = index.search(query, k=10, filters=filters)
+    assert [hit["username"] for hit in hits] == brute_force_knn(points, query, 10, keep)
+    assert [hit["score"] for hit in hits] == sorted((hit["score"] for hit in hits), reverse=True)
+
+
+def test_memory_search_excludes_the_query_point_and_sees_updates():
+    points = random_points(50)
+    index = InMemoryPersonaIndex()
+    index.upsert(points)
+    assert [hit["username"] for hit in index.search(points[0].vector, k=5, exclude_id="p0")] == \
+        brute_force_knn(points, np.asarray(points[0].vector), 5, exclude="p0")
+
+    moved = vector_db.MemoryPoint(id="p1", vector=points[0].vector, payload={**points[1].payload, "mbti": "ENTJ"})
+    index.upsert([moved])
+    assert len(index) == 50
+    (hit,) = index.search(points[0].vector, k=1, filters={"mbti": "ENTJ"})
+    assert hit["username"] == "user1" and hit["score"] == pytest.approx(1.0)
+
+
+def test_memory_search_edge_cases():
+    index = InMemoryPersonaIndex()
+    assert index.search([1.0, 0.0], k=3) == []
+    index.upsert(random_points(5)[:2])
+    assert len(index.search(np.ones(8), k=10)) == 2
+    assert index.search(np.ones(8), k=3, filters={"mbti": "ESFJ"}) == []
+    with pytest.raises(ValueError, match="Cannot filter on 'karma'"):
+        index.search(np.ones(8), k=3, filters={"karma": 1})
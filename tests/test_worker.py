@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+
+import worker
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    """Ten unclaimed users; ``process_user`` takes 50 ms each and records overlap."""
+    users = [{"id": i, "username": f"user{i}"} for i in range(10)]
+    state = {"active": 0, "peak": 0, "done": [], "claims": []}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def fetch_usernames(limit):
+        with lock:
+            state["claims"].append(limit)
+            batch, users[:] = users[:limit], users[limit:]
+        return batch
+
+    def process_user(user):
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        time.sleep(0.05)
+        with lock:
+            state["active"] -= 1
+            state["done"].append(user["username"])
+            if len(state["done"]) == 10:
+                stop.set()
+
+    monkeypatch.setattr(worker, "fetch_usernames", fetch_usernames)
+    monkeypatch.setattr(worker, "process_user", process_user)
+    monkeypatch.setattr(worker, "queue_depth", lambda: 0)
+    monkeypatch.setattr(worker, "SLEEP_SECONDS", 0.01)
+    monkeypatch.setattr(worker, "MAX_IN_FLIGHT", 4)
+    return state, stop
+
+
+def _run(stop):
+    thread = threading.Thread(target=worker.main, args=(stop,), daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive(), "worker did not stop"
+
+
+def test_users_are_processed_concurrently_up_to_the_limit(queue):
+    state, stop = queue
+    started = time.perf_counter()
+    _run(stop)
+
+    assert sorted(state["done"]) == sorted(f"user{i}" for i in range(10))
+    assert state["peak"] == worker.MAX_IN_FLIGHT
+    # 10 users x 50 ms with 4 at a time is 3 rounds, not 10.
+    assert time.perf_counter() - started < 0.4
+
+
+def test_claims_never_exceed_free_slots(queue):
+    state, stop = queue
+    _run(stop)
+
+    assert state["claims"][0] == worker.MAX_IN_FLIGHT
+    assert all(0 < limit <= worker.MAX_IN_FLIGHT for limit in state["claims"])
+
+
+def test_a_failing_user_does_not_stop_the_others(queue, monkeypatch):
+    state, stop = queue
+    process_user = worker.process_user
+
+    def flaky(user):
+        if user["id"] == 3:
+            raise RuntimeError("unlock failed")
+        process_user(user)
+
+    monkeypatch.setattr(worker, "process_user", flaky)
+    state["done"].append("user3")  # the failed user still counts towards stopping
+    _run(stop)
+
+    assert len(state["done"]) == 10
+    assert worker._in_flight_count() == 0
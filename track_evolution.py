@@ -1,23 +1,44 @@
 import os
 import json
-from datetime import datetime, timedelta
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import List
+from typing import Dict, List
 
+import activity_dataset
+from artifact_store import put_raw_activity
 from persona_utils import (
     scrape_user_data,
-    generate_persona,
+    older_than,
+    build_persona,
+    generation_fingerprint,
     save_persona,
 )
 
+# Months generated at once; each month is one Gemini round trip (two with
+# PERSONA_STRUCTURED=0).
+EVOLUTION_CONCURRENCY = int(os.getenv("EVOLUTION_CONCURRENCY", "4"))
+# Personas for closed months, keyed by the content they were built from.
+CACHE_DIR = Path(os.getenv("EVOLUTION_CACHE_DIR", os.path.join(".cache", "evolution")))
 
-def get_month_date_ranges(months_back: int) -> List[tuple[datetime, datetime]]:
-    today = datetime.utcnow()
+
+def get_month_date_ranges(months_back: int, now: datetime | None = None) -> List[tuple[datetime, datetime]]:
+    """
+    Return calendar-month (start, end) pairs in UTC, earliest first.
+
+    The last entry is the current month; ``end`` is the last second of the
+    month, so boundaries are stable from one run to the next.
+    """
+    now = now or datetime.now(timezone.utc)
+    year, month = now.year, now.month
     ranges = []
-    for i in range(months_back):
-        month_start = (today.replace(day=1) - timedelta(days=30 * i)).replace(day=1)
-        month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(seconds=1)
+    for _ in range(months_back):
+        month_start = datetime(year, month, 1, tzinfo=timezone.utc)
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        month_end = datetime(next_year, next_month, 1, tzinfo=timezone.utc) - timedelta(seconds=1)
         ranges.append((month_start, month_end))
+        year, month = (year - 1, 12) if month == 1 else (year, month - 1)
     return list(reversed(ranges))  # earliest to latest
 
 
@@ -25,38 +46,169 @@ def filter_by_month(posts_or_comments: list, start: datetime, end: datetime):
     return [item for item in posts_or_comments if start.timestamp() <= item["created_utc"] <= end.timestamp()]
 
 
-def track_evolution(username: str, months_back: int = 3):
+def month_cache_key(label: str, posts: list, comments: list) -> str:
+    """
+    Hash the content a month's persona is built from, and how it is built.
+
+    Only fields that cannot change once posted are used; scores and comment
+    counts keep moving long after a month closes and would defeat the cache.
+    ``generation_fingerprint`` changes with the model, prompts and budgets,
+    so a prompt change regenerates closed months instead of reusing them.
+    """
+    content = [
+        (item["url"], item["text"], item["created_utc"])
+        for item in posts + comments
+    ]
+    payload = [label, generation_fingerprint(), content]
+    digest = hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _load_cached_month(key: str) -> dict | None:
+    path = CACHE_DIR / f"{key}.json"
+    if not path.is_file():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _store_cached_month(key: str, result: dict) -> None:
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = CACHE_DIR / f"{key}.json.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+    os.replace(tmp, CACHE_DIR / f"{key}.json")
+
+
+def process_month(
+    username: str,
+    label: str,
+    posts: list,
+    comments: list,
+    closed: bool,
+    raw_data_ref: str | None = None,
+    use_cache: bool = True,
+) -> str:
+    """Generate (or reuse) and save one month's persona; returns a status string."""
+    key = month_cache_key(label, posts, comments) if closed and use_cache else None
+    cached = _load_cached_month(key) if key else None
+
+    if cached is not None:
+        persona, frameworks = cached["persona"], cached["frameworks"]
+        status = "✅ (cached)"
+    else:
+        persona, frameworks = build_persona(posts, comments)
+        # An empty mapping means the framework call failed; don't pin that.
+        if key and frameworks:
+            _store_cached_month(key, {"persona": persona, "frameworks": frameworks})
+        status = "✅"
+
+    save_persona(
+        f"{username}_{label}", persona, posts, comments,
+        frameworks=frameworks, raw_data_ref=raw_data_ref, snapshot=True,
+    )
+    return status
+
+
+def track_evolution(
+    username: str,
+    months_back: int = 3,
+    activity: tuple[list, list] | None = None,
+    now: datetime | None = None,
+    use_cache: bool = True,
+) -> Dict[str, Exception]:
+    """
+    Generate and save one persona per calendar month.
+
+    ``activity`` is ``(posts, comments)`` to use instead of scraping, e.g.
+    from a recorded ``activity_dataset``; pass its ``scraped_at`` as ``now``
+    so the months are the ones before the recording. ``use_cache=False``
+    regenerates closed months instead of reusing their cached personas
+    (Gemini's own response cache still applies).
+
+    Returns
+    -------
+    dict[str, Exception]
+        The months that failed, by label; empty when all succeeded.
+    """
     print(f"📆 Tracking evolution for {username} over {months_back} months...\n")
-    all_posts, all_comments = scrape_user_data(username, limit=300)
-
-    month_ranges = get_month_date_ranges(months_back)
-
-    for start, end in month_ranges:
-        label = start.strftime("%Y-%m")
-        print(f"🔹 Processing {label}...", end=" ")
-
-        posts = filter_by_month(all_posts, start, end)
-        comments = filter_by_month(all_comments, start, end)
-
-        if not posts and not comments:
-            print("No data.")
-            continue
+    now = now or datetime.now(timezone.utc)
+    month_ranges = get_month_date_ranges(months_back, now)
 
-        persona = generate_persona(posts, comments)
-        save_persona(f"{username}_{label}", persona, posts, comments)
-        print("✅")
-
-    print("\n✅ All months processed.")
+    if activity is not None:
+        all_posts, all_comments = activity
+    else:
+        # Both listings are read newest first, so each one stops at the first
+        # item older than the window instead of paging through all 300, and
+        # a repeat run through the scrape cache only fetches what is new.
+        all_posts, all_comments = scrape_user_data(
+            username, limit=300, until=older_than(month_ranges[0][0]), source=activity_dataset.EVOLUTION,
+        )
+    # Every month references the same stored scrape instead of its own copy.
+    raw_data_ref = put_raw_activity(all_posts, all_comments)
+
+    with ThreadPoolExecutor(max_workers=EVOLUTION_CONCURRENCY) as pool:
+        jobs = []
+        for start, end in month_ranges:
+            label = start.strftime("%Y-%m")
+            posts = filter_by_month(all_posts, start, end)
+            comments = filter_by_month(all_comments, start, end)
+
+            if not posts and not comments:
+                jobs.append((label, None))
+                continue
+
+            future = pool.submit(
+                process_month, username, label, posts, comments, end < now, raw_data_ref, use_cache
+            )
+            jobs.append((label, future))
+
+        failed: Dict[str, Exception] = {}
+        for label, future in jobs:
+            if future is None:
+                print(f"🔹 {label}: No data.")
+                continue
+            try:
+                print(f"🔹 {label}: {future.result()}")
+            except Exception as e:
+                failed[label] = e
+                print(f"🔹 {label}: ❌ {e}")
+
+    if failed:
+        print(f"\n❌ {len(failed)} of {len(month_ranges)} months failed.")
+    else:
+        print("\n✅ All months processed.")
+    return failed
 
 
 if __name__ == "__main__":
+    import argparse
     import sys
 
-    if len(sys.argv) < 2:
-        username = input("Enter Reddit username: ").strip()
-    else:
-        username = sys.argv[1]
-
-    months = int(sys.argv[2]) if len(sys.argv) >= 3 else 3
-
-    track_evolution(username, months_back=months)
+    parser = argparse.ArgumentParser(description="Generate and save one persona per calendar month.")
+    parser.add_argument("username", nargs="?", help="Reddit username (asked for when omitted)")
+    parser.add_argument("months", nargs="?", type=int, default=3, help="months back, including this one")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="months from recorded activity (activity_dataset) instead of Reddit")
+    parser.add_argument("--store", metavar="DIR_OR_URL",
+                        help="where replayed personas go (default: REPLAY_STORE or FILE.personas)")
+    args = parser.parse_args()
+    if args.store and not args.replay:
+        parser.error("--store only applies with --replay")
+
+    username = args.username or input("Enter Reddit username: ").strip()
+
+    activity, now = None, None
+    if args.replay:
+        # The evolution window if one was recorded, else the persona scrape.
+        entry = activity_dataset.find(
+            args.replay, username, sources=(activity_dataset.EVOLUTION, activity_dataset.SCRAPE)
+        )
+        if entry is None:
+            sys.exit(f"❌ {username} is not in {args.replay}")
+        activity = (entry["posts"], entry["comments"])
+        now = datetime.fromtimestamp(entry["scraped_at"], timezone.utc)
+        print(f"🗂️ Saving to {activity_dataset.use_replay_store(args.replay, args.store)}")
+
+    if track_evolution(username, months_back=args.months, activity=activity, now=now):
+        sys.exit(1)
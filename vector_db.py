@@ -1,34 +1,406 @@
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import PointStruct, VectorParams, Distance
+import atexit
+import logging
+import threading
+import time
 import uuid
-from embedding_utils import get_embedding  # you will define this
+from typing import NamedTuple
+import numpy as np
+from embedding_utils import embedding_dimension, get_embedding, get_embeddings
+from clients import get_qdrant
+import metrics
+from persona_parser import BIG_FIVE_TRAITS
+from env_loader import load_env
 import os
-# Initialize client (use your real Qdrant host/API key if using cloud)
-client = QdrantClient(host="localhost", port=6333)
+
+load_env()  # the settings below may come from .env
+
+# The Qdrant client (QDRANT_HOST / QDRANT_PORT) and its models are imported
+# on first use; see clients.py.
 COLLECTION_NAME = os.getenv("COLLECTION_NAME")
 
+# "qdrant" (default) or "memory": keep points in an in-process NumPy index
+# instead, for tests and offline use.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant")
+
+# Payload fields find_similar_personas can filter on, and their index type.
+KEYWORD_FIELDS = ("username", "mbti", "subreddits")
+RANGE_FIELDS = tuple(f"traits.BigFive.{trait}" for trait in BIG_FIVE_TRAITS)
+
+# Bump when the persona format changes so new points don't overwrite old ones.
+PERSONA_VERSION = os.getenv("PERSONA_VERSION", "v1")
+# Buffered points are flushed when this many are queued or this many seconds
+# have passed since the last flush, whichever comes first.
+FLUSH_COUNT = int(os.getenv("VECTOR_FLUSH_COUNT", "64"))
+FLUSH_SECONDS = float(os.getenv("VECTOR_FLUSH_SECONDS", "5"))
+# Failed flushes keep their points queued for the next one; a point that
+# failed this many flushes in a row is dropped, logged as an error and
+# counted in metrics.VECTOR_DROPPED.
+MAX_ATTEMPTS = int(os.getenv("VECTOR_MAX_ATTEMPTS", "5"))
+
+_POINT_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "redditmindmap/personas")
+
+
+def persona_point_id(username: str, version: str = PERSONA_VERSION) -> str:
+    """Deterministic point ID, so reprocessing a user overwrites their point."""
+    return str(uuid.uuid5(_POINT_NAMESPACE, f"{username.lower()}:{version}"))
+
+
+def persona_payload(frameworks: dict, posts: list, comments: list, top_subreddits: int = 10) -> dict:
+    """
+    Filterable payload for a persona point.
+
+    ``traits`` keeps the full framework mapping; ``mbti`` and ``subreddits``
+    (the user's most active communities) are flattened out for filtering.
+    """
+    counts = {}
+    for item in posts + comments:
+        subreddit = item.get("subreddit")
+        if subreddit:
+            counts[subreddit] = counts.get(subreddit, 0) + 1
+    subreddits = sorted(counts, key=counts.get, reverse=True)[:top_subreddits]
+    return {
+        "traits": frameworks,
+        "mbti": (frameworks.get("MBTI") or "").upper() or None,
+        "subreddits": subreddits,
+    }
+
+
 def init_vector_db():
+    """Create the collection and payload indexes if missing; existing points are kept."""
+    if VECTOR_BACKEND == "memory":
+        return
+    from qdrant_client.http.models import Distance, PayloadSchemaType, VectorParams
+
+    client = get_qdrant()
     try:
-        client.recreate_collection(
-            collection_name=COLLECTION_NAME,
-            vectors_config=VectorParams(size=1536, distance=Distance.COSINE),
-        )
+        if not client.collection_exists(COLLECTION_NAME):
+            client.create_collection(
+                collection_name=COLLECTION_NAME,
+                vectors_config=VectorParams(size=embedding_dimension(), distance=Distance.COSINE),
+            )
+        for field in KEYWORD_FIELDS:
+            client.create_payload_index(COLLECTION_NAME, field, field_schema=PayloadSchemaType.KEYWORD)
+        for field in RANGE_FIELDS:
+            client.create_payload_index(COLLECTION_NAME, field, field_schema=PayloadSchemaType.FLOAT)
     except Exception as e:
         print("[!] Could not init collection:", str(e))
 
-def push_to_vector_db(username: str, persona_text: str, metadata: dict):
-    try:
-        # Get vector embedding
-        vector = get_embedding(persona_text)  # should return a list of floats
 
-        point = PointStruct(
-            id=str(uuid.uuid4()),
-            vector=vector,
-            payload={**metadata, "username": username}
-        )
+def _payload_value(payload: dict, dotted_key: str):
+    value = payload
+    for part in dotted_key.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
 
-        client.upsert(collection_name=COLLECTION_NAME, points=[point])
-        print(f"[✓] Pushed embedding for {username} to vector DB")
 
-    except Exception as e:
-        print(f"[X] Failed to push {username} to vector DB:", e)
+class MemoryPoint(NamedTuple):
+    """The ``PointStruct`` fields ``InMemoryPersonaIndex`` uses, without importing qdrant_client."""
+
+    id: str
+    vector: list
+    payload: dict
+
+
+class InMemoryPersonaIndex:
+    """
+    Brute-force cosine kNN over persona vectors with the same payload filters.
+
+    Vectors are kept L2-normalised in one float32 matrix, so a query is a
+    single matrix-vector product plus ``argpartition``. Keyword fields have
+    inverted indexes and range fields dense float columns, so filters become
+    boolean masks instead of per-point Python checks.
+    """
+
+    def __init__(self):
+        self._ids = []
+        self._rows = {}
+        self._vectors = []
+        self._payloads = []
+        self._matrix = None
+        self._columns = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def upsert(self, points) -> None:
+        with self._lock:
+            for point in points:
+                vector = np.asarray(point.vector, dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                vector = vector / norm if norm else vector
+                row = self._rows.get(point.id)
+                if row is None:
+                    self._rows[point.id] = len(self._ids)
+                    self._ids.append(point.id)
+                    self._vectors.append(vector)
+                    self._payloads.append(point.payload)
+                else:
+                    self._vectors[row] = vector
+                    self._payloads[row] = point.payload
+            self._matrix = None
+            self._columns = None
+
+    def retrieve(self, point_id):
+        row = self._rows.get(point_id)
+        return None if row is None else (self._vectors[row], self._payloads[row])
+
+    def _build(self):
+        if self._matrix is None:
+            self._matrix = np.vstack(self._vectors) if self._vectors else np.zeros((0, 0), np.float32)
+            keywords = {field: {} for field in KEYWORD_FIELDS}
+            ranges = {field: np.full(len(self._ids), np.nan) for field in RANGE_FIELDS}
+            for row, payload in enumerate(self._payloads):
+                for field in KEYWORD_FIELDS:
+                    values = _payload_value(payload, field)
+                    for value in values if isinstance(values, list) else [values]:
+                        if value is not None:
+                            keywords[field].setdefault(value, []).append(row)
+                for field in RANGE_FIELDS:
+                    value = _payload_value(payload, field)
+                    if isinstance(value, (int, float)):
+                        ranges[field][row] = value
+            self._columns = (keywords, ranges)
+        return self._matrix, self._columns
+
+    def _mask(self, filters: dict, columns, n: int):
+        keywords, ranges = columns
+        mask = np.ones(n, dtype=bool)
+        for key, condition in (filters or {}).items():
+            if key in RANGE_FIELDS:
+                low, high = condition
+                column = ranges[key]
+                with np.errstate(invalid="ignore"):
+                    if low is not None:
+                        mask &= column >= low
+                    if high is not None:
+                        mask &= column <= high
+            elif key in KEYWORD_FIELDS:
+                wanted = condition if isinstance(condition, (list, tuple, set)) else [condition]
+                hits = np.zeros(n, dtype=bool)
+                for value in wanted:
+                    hits[keywords[key].get(value, [])] = True
+                mask &= hits
+            else:
+                raise ValueError(f"Cannot filter on {key!r}; indexed fields are {KEYWORD_FIELDS + RANGE_FIELDS}")
+        return mask
+
+    def search(self, vector, k: int, filters: dict | None = None, exclude_id=None) -> list[dict]:
+        with self._lock:
+            matrix, columns = self._build()
+            if not len(self._ids):
+                return []
+            query = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(query)
+            scores = matrix @ (query / norm if norm else query)
+            mask = self._mask(filters, columns, len(self._ids))
+            if exclude_id in self._rows:
+                mask[self._rows[exclude_id]] = False
+            candidates = np.flatnonzero(mask)
+            if not len(candidates):
+                return []
+            k = min(k, len(candidates))
+            top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            top = top[np.argsort(-scores[top])]
+            return [
+                {"username": self._payloads[row].get("username"), "score": float(scores[row]), "payload": self._payloads[row]}
+                for row in top
+            ]
+
+
+_memory_index = InMemoryPersonaIndex()
+
+
+def _qdrant_filter(filters: dict | None):
+    if not filters:
+        return None
+    from qdrant_client.http.models import FieldCondition, Filter, MatchAny, MatchValue, Range
+
+    conditions = []
+    for key, condition in filters.items():
+        if key in RANGE_FIELDS:
+            low, high = condition
+            conditions.append(FieldCondition(key=key, range=Range(gte=low, lte=high)))
+        elif key in KEYWORD_FIELDS:
+            if isinstance(condition, (list, tuple, set)):
+                conditions.append(FieldCondition(key=key, match=MatchAny(any=list(condition))))
+            else:
+                conditions.append(FieldCondition(key=key, match=MatchValue(value=condition)))
+        else:
+            raise ValueError(f"Cannot filter on {key!r}; indexed fields are {KEYWORD_FIELDS + RANGE_FIELDS}")
+    return Filter(must=conditions)
+
+
+def find_similar_personas(username_or_text: str, k: int = 10, filters: dict | None = None) -> list[dict]:
+    """
+    Return the ``k`` personas closest to a stored user or to free text.
+
+    Parameters
+    ----------
+    username_or_text : str
+        A username already in the collection (its stored vector is used and
+        the user is excluded from the results), or any text to embed.
+    k : int
+        Number of neighbours to return.
+    filters : dict, optional
+        Payload conditions, all of which must hold. Keyword fields
+        (``mbti``, ``subreddits``, ``username``) take a value or a list of
+        accepted values; Big Five fields such as
+        ``"traits.BigFive.openness"`` take a ``(min, max)`` tuple where
+        either bound may be ``None``.
+
+    Returns
+    -------
+    list[dict]
+        ``{"username", "score", "payload"}`` dicts, most similar first.
+    """
+    point_id = persona_point_id(username_or_text)
+
+    if VECTOR_BACKEND == "memory":
+        stored = _memory_index.retrieve(point_id)
+        if stored is not None:
+            vector, exclude = stored[0], point_id
+        else:
+            vector, exclude = get_embedding(username_or_text, task_type="RETRIEVAL_QUERY"), None
+        return _memory_index.search(vector, k, filters, exclude_id=exclude)
+
+    client = get_qdrant()
+    stored = client.retrieve(COLLECTION_NAME, ids=[point_id], with_vectors=True)
+    if stored:
+        vector, exclude = stored[0].vector, point_id
+    else:
+        vector, exclude = get_embedding(username_or_text, task_type="RETRIEVAL_QUERY"), None
+
+    hits = client.query_points(
+        collection_name=COLLECTION_NAME,
+        query=vector,
+        query_filter=_qdrant_filter(filters),
+        limit=k + (1 if exclude else 0),
+        with_payload=True,
+    ).points
+    return [
+        {"username": hit.payload.get("username"), "score": hit.score, "payload": hit.payload}
+        for hit in hits
+        if str(hit.id) != exclude
+    ][:k]
+
+
+class VectorWriter:
+    """
+    Collects persona points and upserts them in bulk.
+
+    Texts are embedded with one batched ``get_embeddings`` call per flush and
+    written with a single ``client.upsert``. A background thread flushes
+    every ``flush_seconds``; ``close()`` (also registered with ``atexit``)
+    flushes whatever is left on shutdown. A failed flush puts its points
+    back in the queue unless a newer version was queued meanwhile, and gives
+    up on a point after ``max_attempts`` failures.
+    """
+
+    def __init__(
+        self, flush_count: int = FLUSH_COUNT, flush_seconds: float = FLUSH_SECONDS, max_attempts: int = MAX_ATTEMPTS
+    ):
+        self.flush_count = flush_count
+        self.flush_seconds = flush_seconds
+        self.max_attempts = max_attempts
+        self._pending = {}  # point id -> (username, text, payload); last write wins
+        self._failures = {}  # point id -> failed flushes of the queued version
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._stop = threading.Event()
+        self._timer = threading.Thread(target=self._run_timer, daemon=True, name="vector-flush")
+        self._timer.start()
+        atexit.register(self.close)
+
+    def add(self, username: str, persona_text: str, metadata: dict) -> None:
+        payload = {**metadata, "username": username, "persona_version": PERSONA_VERSION}
+        point_id = persona_point_id(username)
+        with self._lock:
+            self._pending[point_id] = (username, persona_text, payload)
+            self._failures.pop(point_id, None)
+            full = len(self._pending) >= self.flush_count
+        if full:
+            self.flush()
+
+    def _run_timer(self) -> None:
+        while not self._stop.wait(min(1.0, self.flush_seconds)):
+            if time.monotonic() - self._last_flush >= self.flush_seconds:
+                self.flush()
+
+    def flush(self) -> int:
+        """Embed and upsert everything queued so far; returns the point count."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+            if not batch:
+                return 0
+
+            usernames = [username for username, _, _ in batch.values()]
+            if VECTOR_BACKEND == "memory":
+                PointStruct = MemoryPoint
+            else:
+                from qdrant_client.http.models import PointStruct
+
+            try:
+                vectors = get_embeddings([text for _, text, _ in batch.values()])
+                points = [
+                    PointStruct(id=point_id, vector=vector, payload=payload)
+                    for (point_id, (_, _, payload)), vector in zip(batch.items(), vectors)
+                ]
+                if VECTOR_BACKEND == "memory":
+                    _memory_index.upsert(points)
+                else:
+                    get_qdrant().upsert(collection_name=COLLECTION_NAME, points=points)
+                with self._lock:
+                    for point_id in batch:
+                        self._failures.pop(point_id, None)
+                print(f"[✓] Pushed {len(points)} embeddings to vector DB")
+                return len(points)
+            except Exception as e:
+                print(f"[X] Failed to push {len(usernames)} personas to vector DB ({', '.join(usernames)}), will retry:", e)
+                dropped = []
+                with self._lock:
+                    for point_id, entry in batch.items():
+                        if point_id in self._pending:
+                            continue  # a newer version was queued meanwhile
+                        attempts = self._failures.get(point_id, 0) + 1
+                        if attempts >= self.max_attempts:
+                            self._failures.pop(point_id, None)
+                            dropped.append(entry[0])
+                        else:
+                            self._failures[point_id] = attempts
+                            self._pending[point_id] = entry
+                if dropped:
+                    metrics.VECTOR_DROPPED.inc(len(dropped))
+                    logging.error(
+                        f"Dropped {len(dropped)} personas after {self.max_attempts} failed vector DB pushes: "
+                        f"{', '.join(dropped)}"
+                    )
+                return 0
+
+    def close(self) -> None:
+        self._stop.set()
+        self.flush()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> VectorWriter:
+    """Process-wide writer, created (and the collection ensured) on first use."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            init_vector_db()
+            _writer = VectorWriter()
+        return _writer
+
+
+def push_to_vector_db(username: str, persona_text: str, metadata: dict):
+    """Queue a persona for the next bulk upsert (see ``VectorWriter``)."""
+    get_writer().add(username, persona_text, metadata)
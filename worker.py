@@ -2,10 +2,17 @@ import os
 import time
 import uuid
 import logging
-from supabase import create_client, Client
-from persona_utils import scrape_user_data, generate_persona
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import metrics
+from clients import get_supabase
+from persona_utils import scrape_user_data, build_persona, save_persona
 from github_utils import push_to_github
-from vector_db import push_to_vector_db
+from vector_db import persona_payload, push_to_vector_db
+from refresh_policy import (
+    content_fingerprint, has_new_activity, newest_created_utc, next_refresh_at, retry_refresh_at,
+)
 from env_loader import load_env
 
 config = load_env()
@@ -19,82 +26,210 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 GITHUB_REPO =  os.getenv("GITHUB_REPO")  # e.g. "username/repo"
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
-REDDIT_TABLE = os.getenv("REDDIT_TABLE")
+USERNAME_TABLE = "reddit_usernames"
 LOCK_ID = str(uuid.uuid4())
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 logging.basicConfig(level=logging.INFO)
 
 BATCH_SIZE = 2
 SLEEP_SECONDS = 5
-
-def fetch_usernames():
-    response = (
-        supabase.table(f"{REDDIT_TABLE}")
-        .select("*")
-        .eq("processed", False)
-        .eq("locked", False)
-        .limit(BATCH_SIZE)
-        .execute()
-    )
+# Users processed concurrently by one worker process. Each user is almost
+# entirely I/O wait (Reddit, Gemini, GitHub, Qdrant), so threads are enough.
+MAX_IN_FLIGHT = int(os.getenv("WORKER_CONCURRENCY", "16"))
+# Claimed rows are leased; a crashed worker's rows become claimable again
+# once the lease runs out. Live workers renew every LEASE_SECONDS / 3.
+LEASE_SECONDS = int(os.getenv("LEASE_SECONDS", "600"))
+# How often the unprocessed-queue size is counted for the queue depth gauge.
+QUEUE_DEPTH_INTERVAL = int(os.getenv("QUEUE_DEPTH_INTERVAL", "30"))
+# Consecutive failures after which a user is parked (parked_at set) and no
+# longer claimed; clear parked_at to put it back in the queue.
+MAX_FAILURES = int(os.getenv("WORKER_MAX_FAILURES", "8"))
+
+# id -> monotonic time the user was claimed, for the lock age gauge.
+_claimed_at = {}
+_claimed_lock = threading.Lock()
+
+def fetch_usernames(limit=BATCH_SIZE):
+    """Atomically claim up to `limit` users (see sql/claim_usernames.sql)."""
+    response = get_supabase().rpc("claim_reddit_usernames", {
+        "p_lock_id": LOCK_ID,
+        "p_batch_size": limit,
+        "p_lease_seconds": LEASE_SECONDS,
+    }).execute()
     return response.data if response.data else []
 
-def lock_user(user):
-    supabase.table(f"{REDDIT_TABLE}").update({
-        "locked": True,
-        "lock_id": LOCK_ID
-    }).eq("id", user["id"]).execute()
-
-def unlock_user(user):
-    supabase.table(f"{REDDIT_TABLE}").update({
+def renew_leases():
+    response = get_supabase().rpc("renew_reddit_username_leases", {
+        "p_lock_id": LOCK_ID,
+        "p_lease_seconds": LEASE_SECONDS,
+    }).execute()
+    return response.data or 0
+
+def queue_depth():
+    response = get_supabase().table(USERNAME_TABLE).select("id", count="exact").eq("processed", False).is_("parked_at", "null").limit(1).execute()
+    return response.count or 0
+
+def _oldest_lock_age():
+    with _claimed_lock:
+        oldest = min(_claimed_at.values(), default=None)
+    return time.monotonic() - oldest if oldest is not None else 0.0
+
+def _in_flight_count():
+    with _claimed_lock:
+        return len(_claimed_at)
+
+def reschedule_failed(user):
+    # A failed user would be the first claimable row again (unprocessed
+    # rows go first, a due refresh is still due), so unlocking alone would
+    # hand it straight back. Back off instead, and park it for good after
+    # MAX_FAILURES in a row.
+    failures = (user.get("refresh_failures") or 0) + 1
+    update = {
         "locked": False,
-        "lock_id": None
-    }).eq("id", user["id"]).execute()
-
-def mark_processed(user):
-    supabase.table(f"{REDDIT_TABLE}").update({
+        "lock_id": None,
+        "lease_expires_at": None,
+        "refresh_failures": failures,
+        "next_refresh_at": retry_refresh_at(failures - 1).isoformat(),
+    }
+    if failures >= MAX_FAILURES:
+        logging.error(f"Parking {user['username']} after {failures} consecutive failures")
+        update["parked_at"] = datetime.now(timezone.utc).isoformat()
+    get_supabase().table(USERNAME_TABLE).update(update).eq("id", user["id"]).eq("lock_id", LOCK_ID).execute()
+
+def mark_processed(user, newest_created_utc=None, fingerprint=None):
+    # Also schedules the next refresh; fingerprint=None keeps the stored one
+    # (the persona was not regenerated).
+    newest_created_utc = newest_created_utc if newest_created_utc is not None else user.get("newest_created_utc")
+    update = {
         "processed": True,
         "locked": False,
-        "lock_id": None
-    }).eq("id", user["id"]).execute()
+        "lock_id": None,
+        "lease_expires_at": None,
+        "newest_created_utc": newest_created_utc,
+        "processed_at": datetime.now(timezone.utc).isoformat(),
+        "next_refresh_at": next_refresh_at(newest_created_utc).isoformat(),
+        "refresh_failures": 0,
+    }
+    if fingerprint is not None:
+        update["content_fingerprint"] = fingerprint
+    get_supabase().table(USERNAME_TABLE).update(update).eq("id", user["id"]).eq("lock_id", LOCK_ID).execute()
+
+def _heartbeat(stop, in_flight_count):
+    while not stop.wait(LEASE_SECONDS / 3):
+        try:
+            renewed = renew_leases()
+            if renewed < in_flight_count():
+                logging.warning(f"Renewed {renewed} leases for {in_flight_count()} users in flight; some leases were lost")
+        except Exception as e:
+            logging.warning(f"Lease renewal failed: {str(e)}")
 
 def process_user(user):
     username = user["username"]
     try:
-        logging.info(f"Scraping data for {username}...")
-        scraped_data = scrape_user_data(username)
-
-        logging.info(f"Generating persona for {username}...")
-        persona_files = generate_persona(scraped_data, username)
-        # persona_files = { "json": path, "md": path, "txt": path }
-
-        logging.info(f"Pushing files to GitHub for {username}...")
-        push_to_github(persona_files, username, GITHUB_REPO, GITHUB_TOKEN)
-
-        logging.info(f"Pushing to vector DB for {username}...")
-        
-        push_to_vector_db(username, scraped_data["summary"], metadata={"traits": scraped_data["traits"]})
-
-        mark_processed(user)
+        with metrics.trace_user(username) as trace:
+            newest = user.get("newest_created_utc")
+            if user.get("processed") and newest is not None:
+                # Refresh: one page per listing decides whether to rescrape.
+                with metrics.stage("probe"):
+                    changed = has_new_activity(username, newest)
+                if not changed:
+                    logging.info(f"No new activity for {username}; rescheduling.")
+                    _skip_refresh(user, trace, "probe")
+                    return
+
+            logging.info(f"Scraping data for {username}...")
+            with metrics.stage("scrape"):
+                posts, comments = scrape_user_data(username)
+            newest = newest_created_utc(posts, comments)
+            fingerprint = content_fingerprint(posts, comments)
+            if fingerprint == user.get("content_fingerprint"):
+                logging.info(f"Content unchanged for {username}; skipping persona generation.")
+                _skip_refresh(user, trace, "fingerprint", newest)
+                return
+
+            logging.info(f"Generating persona for {username}...")
+            with metrics.stage("generate"):
+                persona, frameworks = build_persona(posts, comments)
+            with metrics.stage("save"):
+                persona_files = save_persona(username, persona, posts, comments, frameworks=frameworks)
+            # persona_files = { "json": path, "md": path, "txt": path }
+
+            logging.info(f"Pushing files to GitHub for {username}...")
+            with metrics.stage("github"):
+                push_to_github(persona_files, username, GITHUB_REPO, GITHUB_TOKEN)
+
+            logging.info(f"Pushing to vector DB for {username}...")
+            with metrics.stage("vector"):
+                push_to_vector_db(username, persona, metadata=persona_payload(frameworks, posts, comments))
+
+            mark_processed(user, newest, fingerprint)
         logging.info(f"Done: {username}")
     except Exception as e:
         logging.error(f"Error processing {username}: {str(e)}")
-        unlock_user(user)
-
-def main():
-    logging.info("Starting RedditMindMap worker...")
-    while True:
-        users = fetch_usernames()
-        if not users:
-            logging.info("No usernames to process. Sleeping...")
-            time.sleep(SLEEP_SECONDS)
-            continue
-
-        for user in users:
-            lock_user(user)
-            process_user(user)
-
-        time.sleep(SLEEP_SECONDS)
+        reschedule_failed(user)
+
+def _skip_refresh(user, trace, reason, newest_created_utc=None):
+    metrics.REFRESH_SKIPS.inc(reason=reason)
+    trace["skipped"] = reason
+    mark_processed(user, newest_created_utc)
+
+def _run_user(user):
+    """Process one claimed user; never lets an error reach the pool."""
+    try:
+        process_user(user)
+    except Exception as e:
+        # process_user handles its own failures; this catches unlock
+        # errors so one bad row cannot take down the other users in flight.
+        logging.error(f"Unhandled error for {user.get('username')}: {str(e)}")
+    finally:
+        with _claimed_lock:
+            _claimed_at.pop(user.get("id"), None)
+
+def main(stop=None):
+    """Claim and process users until ``stop`` (a ``threading.Event``) is set, i.e. forever by default."""
+    logging.info(f"Starting RedditMindMap worker ({MAX_IN_FLIGHT} users in flight)...")
+    if os.getenv("REDDIT_TABLE", USERNAME_TABLE) != USERNAME_TABLE:
+        logging.warning(f"REDDIT_TABLE is no longer used; the queue is always the {USERNAME_TABLE} table")
+    metrics.IN_FLIGHT.function = _in_flight_count
+    metrics.LOCK_AGE.function = _oldest_lock_age
+    if metrics.start_http_server():
+        logging.info(f"Serving metrics on http://{metrics.METRICS_HOST}:{metrics.METRICS_PORT}/metrics")
+    depth_polled = 0.0
+    in_flight = set()
+    stop = stop or threading.Event()
+    threading.Thread(
+        target=_heartbeat, args=(stop, lambda: len(in_flight)), daemon=True, name="lease-heartbeat"
+    ).start()
+    with ThreadPoolExecutor(max_workers=MAX_IN_FLIGHT, thread_name_prefix="persona") as pool:
+        while not stop.is_set():
+            free_slots = MAX_IN_FLIGHT - len(in_flight)
+            users = fetch_usernames(free_slots) if free_slots else []
+
+            for user in users:
+                with _claimed_lock:
+                    _claimed_at[user.get("id")] = time.monotonic()
+                in_flight.add(pool.submit(_run_user, user))
+
+            if time.monotonic() - depth_polled >= QUEUE_DEPTH_INTERVAL:
+                depth_polled = time.monotonic()
+                try:
+                    metrics.QUEUE_DEPTH.set(queue_depth())
+                except Exception as e:
+                    logging.warning(f"Queue depth poll failed: {str(e)}")
+
+            if not in_flight:
+                logging.info("No usernames to process. Sleeping...")
+                time.sleep(SLEEP_SECONDS)
+                continue
+
+            if users and len(in_flight) < MAX_IN_FLIGHT:
+                # The queue still had work; try to fill the remaining slots.
+                continue
+
+            # Either every slot is busy or the queue is drained: wait for a
+            # slot to free up, polling the queue again at least every
+            # SLEEP_SECONDS.
+            _, in_flight = wait(in_flight, timeout=SLEEP_SECONDS, return_when=FIRST_COMPLETED)
 
 if __name__ == "__main__":
     main()